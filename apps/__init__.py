@@ -1 +1,2 @@
 from .login_app import LoginWindow
+from .watchdog import UiWatchdog
@@ -1,27 +1,38 @@
 import os
 import json
+import uuid
 import threading
+import psutil
 import pyautogui
 import webbrowser
 
-from contextlib import suppress
+from contextlib import suppress, nullcontext
 from PyQt5 import QtWidgets, QtGui, QtCore
 from selenium.common.exceptions import WebDriverException, NoSuchWindowException, InvalidSessionIdException
 
-from log_api import logger
+from log_api import logger, log_context, trace_flow, profiler, metrics
 from database.db import DbConnection
+from database.catalog import MarketCatalog
 from config import ICON_PATH, INFO_ICON_PATH, NAME
 from web_driver.wd import WebDriver, AuthException
 
 
+LAUNCHES = metrics.counter('proxybrowser_launches_total', "Запуски браузера", ('marketplace', 'auto'))
+# Значения даёт окно BrowserApp (firefox_metrics), пока оно открыто
+FIREFOX = metrics.gauge('proxybrowser_firefox', "Открытые браузеры: число экземпляров и память (RSS, байт) по маркетплейсам",
+                        ('marketplace', 'stat'))
+
+
 class BrowserApp(QtWidgets.QWidget):
     """Окно программы"""
 
     # Сигналы для обновления интерфейса из потоков
     browser_loaded = QtCore.pyqtSignal(bool)
     error_message = QtCore.pyqtSignal(str)
+    catalog_synced = QtCore.pyqtSignal()
+    db_state = QtCore.pyqtSignal(str)
 
-    def __init__(self, user: str, group: str, db_conn: DbConnection) -> None:
+    def __init__(self, user: str, group: str, db_conn: DbConnection, key: str) -> None:
         super().__init__()
         self.info_icon = None
         self.auto_checkbox = None
@@ -46,15 +57,35 @@ class BrowserApp(QtWidgets.QWidget):
 
         self.web_drivers = []  # Список активных браузеров
         self.db_conn = db_conn
-        self.markets = self.db_conn.info(group)  # Загрузка доступных маркетов из БД
+
+        # Доступные маркеты из локальной копии каталога, сверка с БД — в фоне после показа окна.
+        # Без локальной копии (первый запуск) каталог загружается из БД сразу
+        self.catalog = MarketCatalog(group, key)
+        cached = self.catalog.stamp is not None
+        if not cached:
+            self.catalog.sync(self.db_conn)
+        self.markets = self.catalog.snapshots()
 
         # Подключение сигналов
         self.browser_loaded.connect(self.on_browser_loaded)
         self.error_message.connect(self.on_error_message)
+        self.catalog_synced.connect(self.on_catalog_synced)
+        self.db_state.connect(self.on_db_state)
+        self.db_conn.breaker.listeners.append(self.db_state.emit)
 
         self.init_ui()
         self.load_credentials()
 
+        if cached:
+            threading.Thread(target=self.sync_catalog, daemon=True).start()
+
+        # Скрытые действия диагностики: Ctrl+Shift+P — старт/стоп профилирования, Ctrl+Shift+M — снимок памяти
+        profiler.describe = self.profile_description
+
+        FIREFOX.callback = self.firefox_metrics
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+P"), self, activated=profiler.toggle)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+M"), self, activated=profiler.memory_snapshot)
+
     def init_ui(self) -> None:
         """Инициализация интерфейса"""
 
@@ -165,6 +196,30 @@ class BrowserApp(QtWidgets.QWidget):
         self.market_select.clear()
         self.market_select.addItems(filtered_companies)
 
+    def sync_catalog(self) -> None:
+        """Сверка локального каталога рынков с БД (в отдельном потоке)"""
+
+        try:
+            if self.catalog.sync(self.db_conn):
+                self.catalog_synced.emit()
+        except Exception as e:
+            logger.error(user=self.user, description=f"Ошибка обновления списка рынков. {str(e).splitlines()[0]}")
+
+    def on_catalog_synced(self) -> None:
+        """Обновление списков после сверки каталога с БД, выбранные маркетплейс и рынок сохраняются"""
+
+        self.markets = self.catalog.snapshots()
+        marketplace, company = self.marketplace_select.currentText(), self.market_select.currentText()
+
+        self.marketplace_select.blockSignals(True)
+        self.marketplace_select.clear()
+        self.marketplace_select.addItems(sorted({m.marketplace for m in self.markets}))
+        self.marketplace_select.setCurrentText(marketplace)
+        self.marketplace_select.blockSignals(False)
+
+        self.update_markets()
+        self.market_select.setCurrentText(company)
+
     def launch_browser(self) -> None:
         """Обработка запуска браузера (в отдельном потоке)"""
 
@@ -210,43 +265,53 @@ class BrowserApp(QtWidgets.QWidget):
 
         self.cleanup_inactive_drivers()
 
-        browser_id = f"{market.connect_info.phone}_{market.marketplace.lower()}"
+        browser_id = f"{market.phone}_{market.marketplace.lower()}"
         log_startswith = f"{market.marketplace} - {market.name_company}: "
+        LAUNCHES.inc(market.marketplace, str(auto).lower())
+
+        # Все записи этого запуска помечаются маркетплейсом, компанией и идентификатором потока авторизации.
+        # Успешный вход уходит на сервер одной итоговой записью, неуспешный — со всеми шагами.
+        # При LOG_TRACE интервалы шагов сохраняются в log/traces/ (открываются в Perfetto).
+        # Поток авторизации открывается только при запуске браузера: повторное нажатие для уже открытого
+        # браузера авторизацию не начинает и не должно попадать в метрики как незавершённый вход
+        with log_context(marketplace=market.marketplace, company=market.name_company, flow_id=uuid.uuid4().hex), \
+                trace_flow(log_startswith.rstrip(': ')):
+            try:
+                with suppress(NoSuchWindowException, InvalidSessionIdException):
+                    # Проверка, не открыт ли уже браузер с этим аккаунтом
+                    if browser_id not in [driver.browser_id for driver in self.web_drivers]:
+                        with logger.auth_flow(log_startswith) if auto else nullcontext():
+                            # Запуск браузера
+                            web_driver = WebDriver(market=market, user=self.user, auto=auto, clear=clear,
+                                                   db_conn=self.db_conn)
+                            self.web_drivers.append(web_driver)
+
+                            url = market.link
+
+                            web_driver.load_url(url=url)
+
+            except WebDriverException as e:
+                # Обработка ошибок драйвера Chrome
+                if "session not created" in str(e):
+                    logger.error(user=self.user, description="Неудалось запустить сессию")
+                    self.error_message.emit("Неудалось запустить сессию.\n\nВозможно открыта ещё одна версия программы")
+                else:
+                    logger.error(user=self.user, description=f"{log_startswith}Ошибка WebDriver. {str(e).splitlines()[0]}")
+                    self.error_message.emit(str(e))
 
-        try:
-            with suppress(NoSuchWindowException, InvalidSessionIdException):
-                # Проверка, не открыт ли уже браузер с этим аккаунтом
-                if browser_id not in [driver.browser_id for driver in self.web_drivers]:
-                    # Запуск браузера
-                    web_driver = WebDriver(market=market, user=self.user, auto=auto, clear=clear, db_conn=self.db_conn)
-                    self.web_drivers.append(web_driver)
-
-                    url = market.marketplace_info.link
-
-                    web_driver.load_url(url=url)
-
-        except WebDriverException as e:
-            # Обработка ошибок драйвера Chrome
-            if "session not created" in str(e):
-                logger.error(user=self.user, description="Неудалось запустить сессию")
-                self.error_message.emit("Неудалось запустить сессию.\n\nВозможно открыта ещё одна версия программы")
-            else:
-                logger.error(user=self.user, description=f"{log_startswith}Ошибка WebDriver. {str(e).splitlines()[0]}")
+            except AuthException as e:
+                # Обработка кастомной ошибки
                 self.error_message.emit(str(e))
 
-        except AuthException as e:
-            # Обработка кастомной ошибки
-            self.error_message.emit(str(e))
-
-        except Exception as e:
-            # Обработка не предвиденной ошибки
-            if 'Отказано в доступе' in str(e).splitlines()[0]:
-                logger.error(user=self.user,
-                             description=f"{log_startswith}Ошибка браузера. {str(e).splitlines()[0]}\n\n"
-                                         f"Убедитесь что файл приложения расположен в отдельной папке,"
-                                         f" и эта папка не находится в системной директории.")
-            else:
-                logger.error(user=self.user, description=f"{log_startswith}Ошибка браузера. {str(e).splitlines()[0]}")
+            except Exception as e:
+                # Обработка не предвиденной ошибки
+                if 'Отказано в доступе' in str(e).splitlines()[0]:
+                    logger.error(user=self.user,
+                                 description=f"{log_startswith}Ошибка браузера. {str(e).splitlines()[0]}\n\n"
+                                             f"Убедитесь что файл приложения расположен в отдельной папке,"
+                                             f" и эта папка не находится в системной директории.")
+                else:
+                    logger.error(user=self.user, description=f"{log_startswith}Ошибка браузера. {str(e).splitlines()[0]}")
 
         self.browser_loaded.emit(True)
 
@@ -256,6 +321,12 @@ class BrowserApp(QtWidgets.QWidget):
         self.launch_button.setEnabled(True)
         self.auto_text_button()
 
+    def on_db_state(self, state: str) -> None:
+        """Состояние подключения к БД в заголовке окна (предохранитель DbConnection.breaker)"""
+
+        titles = {'open': f"{NAME} — база данных недоступна", 'half_open': f"{NAME} — проверка подключения к базе данных"}
+        self.setWindowTitle(titles.get(state, NAME))
+
     @staticmethod
     def on_error_message(text) -> None:
         """Обработка сигнала ошибки"""
@@ -263,10 +334,41 @@ class BrowserApp(QtWidgets.QWidget):
         if text:
             QtWidgets.QMessageBox.critical(None, 'Ошибка автоматизации', text)
 
+    def profile_description(self) -> tuple[str, list[str], int]:
+        """Пользователь, открытые рынки и число браузеров — для имён файлов профилирования"""
+
+        markets = [f"{driver.marketplace.marketplace}-{driver.name_company}" for driver in self.web_drivers]
+        return self.user, markets, len(self.web_drivers)
+
+    def firefox_metrics(self) -> dict:
+        """Число браузеров и суммарная память процессов geckodriver и Firefox по маркетплейсам"""
+
+        values = {}
+        for driver in list(self.web_drivers):
+            process = getattr(driver.service, 'process', None)
+            if process is None or process.poll() is not None:
+                continue
+            rss = 0
+            with suppress(psutil.Error):
+                root = psutil.Process(process.pid)
+                for proc in [root, *root.children(recursive=True)]:
+                    with suppress(psutil.Error):
+                        rss += proc.memory_info().rss
+            marketplace = driver.marketplace.marketplace
+            values[(marketplace, 'instances')] = values.get((marketplace, 'instances'), 0) + 1
+            values[(marketplace, 'rss_bytes')] = values.get((marketplace, 'rss_bytes'), 0) + rss
+        return values
+
     def cleanup_inactive_drivers(self):
         """Удаление неактивных драйверов из памяти"""
 
-        self.web_drivers = [driver for driver in self.web_drivers if driver.is_browser_active()]
+        active = []
+        for driver in self.web_drivers:
+            if driver.is_browser_active():
+                active.append(driver)
+            else:
+                driver.release()  # Браузер закрыт пользователем: токен телеметрии и расширение больше не нужны
+        self.web_drivers = active
 
     def save_credentials(self) -> None:
         """Сохранение выбора маркетплейса, компании и режима авторизации"""
@@ -12,7 +12,7 @@ from packaging import version
 from PyQt5 import QtWidgets, QtGui, QtCore
 from cryptography.fernet import Fernet, InvalidToken
 
-from log_api import logger
+from log_api import logger, clock
 from .browser_app import BrowserApp
 from database.db import DbConnection
 from config import ICON_PATH, VERSION, INFO_ICON_PATH, NAME
@@ -130,6 +130,7 @@ class LoginWindow(QtWidgets.QWidget):
 
         try:
             self.db_conn = DbConnection()
+            clock.set_db_source(self.db_conn.get_server_time)
             self.key = self.db_conn.get_key()
             actual_version = self.db_conn.get_version()
 
@@ -214,7 +215,7 @@ class LoginWindow(QtWidgets.QWidget):
     def open_browser_app(self, login: str, group: str) -> None:
         """Переход в BrowserApp"""
 
-        self.browser_app = BrowserApp(user=login, group=group, db_conn=self.db_conn)
+        self.browser_app = BrowserApp(user=login, group=group, db_conn=self.db_conn, key=self.key)
         self.browser_app.show()
         self.close()
 
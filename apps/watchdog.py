@@ -0,0 +1,88 @@
+import os
+import re
+import sys
+import time
+import threading
+import traceback
+
+from PyQt5 import QtCore
+
+from log_api import logger, metrics
+
+# Пакеты приложения: место зависания ищется среди их кадров, а не в библиотеках
+APP_PARTS = {'apps', 'database', 'email_api', 'log_api', 'web_driver', 'main.py'}
+
+UI_STALLS = metrics.histogram('proxybrowser_ui_stall_seconds', "Зависания цикла событий Qt дольше порога",
+                              buckets=(0.2, 0.5, 1, 2, 5, 10, 30, 60))
+
+
+class UiWatchdog:
+    """
+    Сторож отзывчивости интерфейса.
+
+    Таймер в главном потоке Qt отмечается каждые interval секунд. Отдельный поток следит за отметками:
+    если цикл событий не провернулся дольше threshold, снимается стек главного потока (sys._current_frames),
+    а после восстановления пишется запись "Зависание интерфейса" с длительностью: полный стек — в локальный лог,
+    место зависания — на сервер логов.
+    """
+
+    def __init__(self, threshold: float = 0.2, interval: float = 0.05) -> None:
+        self.threshold = threshold
+        self.interval = interval
+
+        self._beat_at = time.monotonic()
+        self._main = threading.main_thread().ident  # Цикл событий Qt работает в главном потоке
+        self._stop = threading.Event()
+
+        self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self._beat)
+
+        self._thread = threading.Thread(target=self._run, name="UiWatchdog", daemon=True)
+
+    def start(self) -> None:
+        """Запуск из главного потока (таймер привязывается к потоку, в котором создан)"""
+
+        self._beat_at = time.monotonic()
+        self.timer.start()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.timer.stop()
+
+    def _beat(self) -> None:
+        self._beat_at = time.monotonic()
+
+    def _run(self) -> None:
+        stalled_beat, stack = None, None
+        while not self._stop.wait(self.interval):
+            beat_at = self._beat_at
+            if stalled_beat is None:
+                if time.monotonic() - beat_at - self.interval >= self.threshold:
+                    stalled_beat, stack = beat_at, self._main_stack()
+            elif beat_at != stalled_beat:
+                # Цикл событий ожил: длительность — разрыв между отметками сверх обычного интервала
+                self._report(beat_at - stalled_beat - self.interval, stack)
+                stalled_beat, stack = None, None
+
+    def _main_stack(self) -> list[traceback.FrameSummary]:
+        frame = sys._current_frames().get(self._main)
+        return traceback.extract_stack(frame) if frame is not None else []
+
+    @staticmethod
+    def _where(stack: list[traceback.FrameSummary]) -> str:
+        """Самый глубокий кадр кода приложения (не библиотек)"""
+
+        for frame in reversed(stack):
+            if 'site-packages' not in frame.filename and APP_PARTS & set(re.split(r'[\\/]', frame.filename)):
+                return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+        return f"{os.path.basename(stack[-1].filename)}:{stack[-1].lineno} {stack[-1].name}" if stack else '?'
+
+    def _report(self, duration: float, stack: list[traceback.FrameSummary]) -> None:
+        UI_STALLS.observe(duration)
+        where = self._where(stack)
+        logger.logger.warning(f"Зависание интерфейса {duration * 1000:.0f} мс: {where}\n"
+                              f"{''.join(traceback.format_list(stack))}")
+        logger.waring(description=f"Зависание интерфейса {duration * 1000:.0f} мс: {where}")
@@ -12,6 +12,19 @@ VERSION = "1.0.0"
 NAME = 'ProxyBrowser ' + VERSION
 
 LOG_SERVER_URL = "your_api_server_log"  # "http://<host>:<port>/log"
+LOG_TRANSPORT = "http"  # "http" — через LOG_SERVER_URL, "db" — напрямую в таблицу log по DB_URL
+LOG_HTTP_BATCH = False  # True — пакеты gzip JSON-массивом (сервер должен поддерживать), False — запись на запрос
+LOG_QUEUE_SIZE = 5000  # Максимум записей в очереди отправки логов
+LOG_QUEUE_POLICY = "coalesce"  # При переполнении: "drop_oldest" | "drop_newest" | "coalesce"
+LOG_JSONL = True  # Дополнительно писать структурированный лог log/YYYY-MM-DD.jsonl (для query_logs.py)
+LOG_FLOW_SAMPLING = True  # Успешная авторизация уходит на сервер одной итоговой записью, неуспешная — полностью
+LOG_TRACE = False  # Трассировка шагов авторизации в log/traces/*.json (формат Chrome trace, Perfetto)
+WD_PROFILE = False  # Профилирование команд WebDriver и пауз, отчёт сессии в log/profiles/webdriver_*.json
+
+PROXY_TELEMETRY = False  # Время и трафик запросов браузера по прокси и хостам (метрики и log/network/*.jsonl)
+UI_STALL_MS = 200  # Порог зависания интерфейса (мс), после которого пишется запись со стеком главного потока
+METRICS_PORT = None  # Порт метрик Prometheus на 127.0.0.1 (например, 9466), None — выключено
+METRICS_TEXTFILE_DIR = None  # Каталог textfile-коллектора node-exporter/windows_exporter, None — выключено
 
 if hasattr(sys, '_MEIPASS'):
     ICON_PATH = os.path.join(sys._MEIPASS, 'chrome.png')
@@ -4,6 +4,8 @@ from cryptography.fernet import Fernet
 
 from config import DB_URL
 from database.models import Base, SecretKey, Version, Marketplace, Group
+from database.maintenance import is_log_partitioned, ensure_log_partitions, install_log_rollups
+from database.migrations import migrate
 
 
 def create_tables() -> None:
@@ -13,6 +15,18 @@ def create_tables() -> None:
     Base.metadata.create_all(engine)
     print("✅ Таблицы успешно созданы (если их не было).")
 
+    # Таблица log секционирована по месяцам, счётчики log_daily_stats обновляются триггером
+    if is_log_partitioned(engine):
+        ensure_log_partitions(engine)
+        install_log_rollups(engine)
+        print("🧩 Созданы секции log и триггер суточных счётчиков")
+    else:
+        print("⚠️ Таблица log не секционирована. Для перевода выполните: python maintenance.py log-convert")
+
+    # Версионные шаги схемы: триггеры, новые столбцы существующих таблиц, индексы (CONCURRENTLY)
+    applied = migrate(engine)
+    print(f"🧱 Применено шагов схемы: {len(applied)}" if applied else "🧱 Схема в актуальной версии")
+
     with Session(engine) as session:
         # SecretKey
         if not session.query(SecretKey).first():
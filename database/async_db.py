@@ -0,0 +1,369 @@
+import time
+import asyncio
+import logging
+
+from typing import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event, select, delete, func as f
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from config import DB_URL
+from log_api import traced
+from database.models import *
+from database.db import DbConnection, retry_on_exception, ENGINES, POOL_CHECKOUTS, POOL_WAIT
+from database.notify import CHANNEL, PhoneMessageListener
+from database.snapshot import MarketSnapshot
+from database.resilience import CircuitBreaker
+
+
+class MeteredAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений asyncio с учётом времени ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+async def wait_event(event: asyncio.Event, timeout: float) -> None:
+    """Ожидание события не дольше timeout секунд (без исключения по таймауту)"""
+
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+class AsyncPhoneMessageListener(PhoneMessageListener):
+    """
+    LISTEN phone_message для AsyncDbConnection.
+
+    Подписки, пробуждение ожидающих и разбор уведомлений — как у PhoneMessageListener, но ожидающие получают
+    asyncio.Event, а прослушивание идёт задачей в цикле событий на отдельном соединении asyncpg вне пула.
+    """
+
+    def __init__(self, engine: AsyncEngine, retry_interval: float = 30, ping_interval: float = 30) -> None:
+        super().__init__(engine.sync_engine, retry_interval)
+        self.ping_interval = ping_interval
+        self._task = None
+
+    def start(self) -> None:
+        """Запуск задачи прослушивания в текущем цикле событий (повторный вызов ничего не делает)"""
+
+        if self._task is not None or self.engine.dialect.name != 'postgresql':
+            return
+        self._task = asyncio.get_running_loop().create_task(self._listen(), name="PhoneMessageListener")
+
+    def stop(self) -> None:
+        super().stop()
+        if self._task is not None:
+            self._task.cancel()
+
+    def subscribe(self, key: tuple) -> asyncio.Event:
+        """Подписка до проверки таблицы, чтобы не пропустить уведомление между проверкой и ожиданием"""
+
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(event)
+        return event
+
+    async def _listen(self) -> None:
+        import asyncpg  # Драйвер нужен только при работе: модуль импортируется и без него
+
+        dsn = self.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+        while not self._stop.is_set():
+            connection = None
+            lost = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(dsn, timeout=10)
+                connection.add_termination_listener(lambda conn: lost.set())
+                await connection.add_listener(CHANNEL, lambda conn, pid, channel, payload: self._dispatch(payload))
+                self.available = True
+                self._wake()  # Всё, что пришло до подписки, ожидающие увидят при перечитывании
+
+                while not lost.is_set():
+                    await wait_event(lost, self.ping_interval)
+                    if not lost.is_set():
+                        # Обрыв сети без закрытия соединения виден только по неответу сервера
+                        await connection.fetchval("SELECT 1", timeout=10)
+            except Exception as e:
+                logging.getLogger("RemoteLogger").warning(f"LISTEN {CHANNEL}: {e}")
+            finally:
+                self.available = False
+                self._wake()
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(self.retry_interval)
+
+
+class AsyncDbConnection:
+    """
+    Подключение к базе данных для asyncio (SQLAlchemy asyncio и asyncpg): методы DbConnection в виде корутин.
+
+    Для оркестратора, который ведёт десятки авторизаций в одном цикле событий. Ожидание свободного номера
+    и кода не занимает ни поток, ни соединение: каждая проверка — короткая сессия, между проверками задача
+    ждёт уведомления LISTEN. Поэтому небольшого пула хватает на всех ожидающих.
+    Создаётся и используется в одном цикле событий, по завершении — await close().
+    Требует пакеты asyncpg и greenlet (SQLAlchemy[asyncio], см. requirements.txt).
+    """
+
+    def __init__(self, echo: bool = False) -> None:
+        self.engine = create_async_engine(url=make_url(DB_URL).set(drivername='postgresql+asyncpg'),
+                                          echo=echo,
+                                          pool_size=5,
+                                          max_overflow=5,
+                                          pool_timeout=60,  # Очередь за соединением вместо ошибки при всплеске
+                                          pool_recycle=1800,
+                                          pool_pre_ping=True,
+                                          poolclass=MeteredAsyncQueuePool,
+                                          connect_args={"timeout": 10,
+                                                        # keepalive задаётся на стороне сервера для сессии
+                                                        "server_settings": {"tcp_keepalives_idle": "180",
+                                                                            "tcp_keepalives_interval": "60",
+                                                                            "tcp_keepalives_count": "20"}})
+        event.listen(self.engine.sync_engine, 'checkout', lambda *args: POOL_CHECKOUTS.inc())
+        ENGINES[self.engine.sync_engine] = 'async'
+
+        # Объекты остаются читаемыми после commit и закрытия сессии
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        # Общий предохранитель: при недоступной БД методы сразу завершаются DbUnavailable
+        self.breaker = CircuitBreaker(driver='async')
+
+        # Уведомления о пришедших кодах, запускается при первом ожидании кода
+        self.listener = AsyncPhoneMessageListener(self.engine)
+
+    async def close(self) -> None:
+        self.listener.stop()
+        await self.engine.dispose()
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        """Сессия на одну операцию: commit при успехе, rollback при ошибке, соединение возвращается в пул"""
+
+        session = self.session_factory()
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def get_server_time(self) -> datetime:
+        """Текущее время сервера БД (без повторных попыток)"""
+
+        async with self.engine.connect() as conn:
+            return await conn.scalar(select(f.now()))
+
+    @staticmethod
+    def _markets():
+        return select(Market).options(joinedload(Market.marketplace_info), joinedload(Market.connect_info))
+
+    @traced()
+    @retry_on_exception(budget=5)
+    async def info(self, group: str) -> list[MarketSnapshot]:
+        """Получение доступных рынков по группе пользователя"""
+
+        async with self.session_scope() as session:
+            markets = await session.scalars(DbConnection._group_markets(self._markets(), group))
+            return [MarketSnapshot.from_market(market) for market in markets]
+
+    @traced()
+    @retry_on_exception()
+    async def catalog_changes(self, group: str, since: datetime = None
+                              ) -> tuple[list[MarketSnapshot], set[tuple[str, str]], datetime]:
+        """Изменения каталога рынков группы для локальной копии (см. DbConnection.catalog_changes)"""
+
+        async with self.session_scope() as session:
+            stamp = await session.scalar(select(f.now()))
+
+            query = DbConnection._group_markets(self._markets(), group)
+            if since is not None:
+                query = DbConnection._changed_since(query, since)
+            changed = [MarketSnapshot.from_market(market) for market in await session.scalars(query)]
+
+            keys = await session.execute(
+                DbConnection._group_markets(select(Market.marketplace, Market.name_company), group))
+            return changed, {tuple(key) for key in keys}, stamp
+
+    @traced()
+    @retry_on_exception(budget=5)
+    async def get_market(self, marketplace: str, name_company: str) -> MarketSnapshot | None:
+        """Получение конкретного рынка по маркетплейсу и названию компании"""
+
+        async with self.session_scope() as session:
+            market = await session.scalar(
+                self._markets().filter_by(marketplace=marketplace, name_company=name_company).limit(1))
+            return MarketSnapshot.from_market(market) if market is not None else None
+
+    @traced()
+    @retry_on_exception()
+    async def get_marketplaces(self) -> list[Marketplace]:
+        """Получение списка всех маркетплейсов"""
+
+        async with self.session_scope() as session:
+            return list(await session.scalars(select(Marketplace)))
+
+    @traced()
+    @retry_on_exception(budget=5)
+    async def check_user(self, login: str, password: str) -> str:
+        """Проверка пользователя по логину и паролю"""
+
+        async with self.session_scope() as session:
+            user = await session.scalar(select(User).where(f.lower(User.user) == login.lower(),
+                                                           User.password == password).limit(1))
+            if user is not None:
+                return user.group
+
+    @traced()
+    @retry_on_exception()
+    async def get_key(self) -> str:
+        """Получение ключа шифрования"""
+
+        async with self.session_scope() as session:
+            key = await session.scalar(select(SecretKey).limit(1))
+            return key.key
+
+    @traced()
+    @retry_on_exception()
+    async def get_version(self) -> Version:
+        """Получение текущей версии приложения"""
+
+        async with self.session_scope() as session:
+            return await session.scalar(select(Version).limit(1))
+
+    @retry_on_exception(budget=30)
+    async def _claim_attempt(self, user: str, phone: str, marketplace: str, time_request: datetime) -> int | None:
+        """Одна попытка занять номер (транзакция как у DbConnection._claim_attempt): id заявки или None"""
+
+        async with self.session_scope() as session:
+            locked = await session.scalar(
+                select(Connect.phone).where(Connect.phone == phone).with_for_update(skip_locked=True))
+            if locked is None:
+                return None
+
+            pending = (await session.execute(select(PhoneMessage.user).where(
+                PhoneMessage.phone == phone,
+                PhoneMessage.time_request >= time_request - timedelta(minutes=2),
+                # только недавние запросы (до 2 мин назад)
+                PhoneMessage.time_response.is_(None)
+            ))).all()
+
+            if any([row.user.lower() == user.lower() for row in pending]):
+                raise Exception("Предыдущая аторизация не завершена.")
+            if pending:
+                return None
+
+            owner = await session.scalar(select(User.user).where(f.lower(User.user) == user.lower()))
+            if owner is None:
+                raise Exception("Такого пользователя не существует")
+
+            new = PhoneMessage(user=owner,
+                               phone=phone,
+                               marketplace=marketplace,
+                               time_request=time_request)
+            session.add(new)
+            await session.flush()
+            return new.id
+
+    @traced()
+    async def claim_phone_message(self, user: str, phone: str, marketplace: str, time_request: datetime) -> int:
+        """
+        Занятие номера под запрос кода (ожидание свободного номера до 100 секунд). Возвращает id заявки.
+        При ошибке подключения повторяется только очередная попытка, отсчёт ожидания не начинается заново.
+        """
+
+        self.listener.start()
+        event = self.listener.subscribe(('phone', phone))
+        try:
+            deadline = time.monotonic() + 100
+            while True:
+                event.clear()
+                request_id = await self._claim_attempt(user, phone, marketplace, time_request)
+                if request_id is not None:
+                    return request_id
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("Превышен лимит ожидания очереди на авторизацию")
+                # Номер освобождается записью кода (NOTIFY) или удалением просроченной заявки — опрос каждые 5 секунд
+                await wait_event(event, min(remaining, 5))
+        finally:
+            self.listener.unsubscribe(('phone', phone), event)
+
+    @retry_on_exception(budget=30)
+    async def _read_phone_message(self, request_id: int) -> PhoneMessage | None:
+        # Новая сессия на каждую проверку: свежие данные, соединение не занято во время ожидания
+        async with self.session_scope() as session:
+            return await session.get(PhoneMessage, request_id)
+
+    @retry_on_exception(budget=30)
+    async def _delete_phone_message(self, request_id: int) -> None:
+        async with self.session_scope() as session:
+            await session.execute(delete(PhoneMessage).where(PhoneMessage.id == request_id))
+
+    @traced()
+    async def get_phone_message(self, request_id: int) -> str:
+        """
+        Получение кода по заявке claim_phone_message (ожидание до 100 секунд).
+        Если код не получен (тайм-аут или ошибка), заявка удаляется и не занимает номер.
+        """
+
+        self.listener.start()
+        event = self.listener.subscribe(('id', request_id))
+        try:
+            deadline = time.monotonic() + 100
+            while True:
+                event.clear()
+                check = await self._read_phone_message(request_id)
+
+                if check is None:
+                    raise Exception('Ошибка получения сообщения')
+
+                if check.message is not None:
+                    return check.message  # код получен
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("Превышен лимит ожидания сообщения")
+                # При работающем LISTEN редкий контрольный опрос, иначе — опрос каждые 5 секунд
+                await wait_event(event, min(remaining, 30 if self.listener.available else 5))
+        except Exception:
+            with suppress(Exception):
+                await self._delete_phone_message(request_id)
+            raise
+        finally:
+            self.listener.unsubscribe(('id', request_id), event)
+
+    @traced()
+    @retry_on_exception(budget=30)
+    async def update_phone_message(self, user: str, phone: str, marketplace: str, message: str,
+                                   time_response: datetime) -> None:
+        """Обновление сообщения с кодом подтверждения"""
+
+        async with self.session_scope() as session:
+            mes = await session.scalar(select(PhoneMessage).where(
+                f.lower(PhoneMessage.user) == user.lower(),
+                PhoneMessage.phone == phone,
+                PhoneMessage.marketplace == marketplace,
+                PhoneMessage.time_response.is_(None),
+                PhoneMessage.message.is_(None),
+                PhoneMessage.time_request <= time_response + timedelta(seconds=2),
+                # допустимая задержка на пару секунд вперёд
+                PhoneMessage.time_request >= time_response - timedelta(minutes=2)
+                # только недавние запросы (до 2 мин назад)
+            ).order_by(PhoneMessage.time_request.asc()).limit(1).with_for_update())
+
+            if mes:
+                mes.time_response = time_response
+                mes.message = message
+            else:
+                raise Exception("Нет запроса")
@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+import logging
+
+from datetime import datetime
+from cryptography.fernet import Fernet, InvalidToken
+
+from database.snapshot import MarketSnapshot
+
+# Отметки изменений для синхронизации каталога рынков: столбец updated_at обновляется триггером
+# при любом UPDATE (в том числе правках вручную), новые строки получают now() по умолчанию.
+# Применяется миграцией (database/migrations.py), индексы по updated_at строятся там же
+CHANGE_STAMP_TABLES = ('markets', 'marketplaces', 'connects', 'group_market')
+
+CHANGE_STAMPS = """
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+""" + "".join(f"""
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now();
+DROP TRIGGER IF EXISTS {table}_touch_trg ON {table};
+CREATE TRIGGER {table}_touch_trg BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+""" for table in CHANGE_STAMP_TABLES)
+
+
+class MarketCatalog:
+    """
+    Локальная копия каталога рынков группы пользователя.
+
+    Хранится в cache/ зашифрованной ключом из secret_key (в снимках есть прокси и доступы к почте).
+    Окно запуска строится из копии сразу, затем sync() в фоне получает из БД только строки,
+    изменённые после прошлой синхронизации, и список ключей рынков группы (для удалённых рынков).
+    Если копии нет или её не удалось прочитать, первая синхронизация загружает каталог целиком.
+    """
+
+    VERSION = 1
+
+    def __init__(self, group: str, key: str, directory: str = "cache") -> None:
+        self.group = group
+        self.fernet = Fernet(key)
+        self.path = os.path.join(directory, f"markets_{hashlib.sha1(group.lower().encode()).hexdigest()[:16]}.bin")
+
+        self.markets = {}  # (marketplace, name_company) -> MarketSnapshot
+        self.stamp = None  # Время сервера БД на момент прошлой синхронизации
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(self.fernet.decrypt(f.read()))
+            if data.get('version') != self.VERSION or data.get('group') != self.group:
+                return
+            markets = [MarketSnapshot(**fields) for fields in data['markets']]
+            stamp = datetime.fromisoformat(data['stamp'])
+        except FileNotFoundError:
+            return
+        except (OSError, InvalidToken, ValueError, KeyError, TypeError) as e:
+            logging.getLogger("RemoteLogger").warning(f"Локальный каталог рынков не прочитан: {e}")
+            return
+
+        self.markets = {(market.marketplace, market.name_company): market for market in markets}
+        self.stamp = stamp
+
+    def save(self) -> None:
+        data = {'version': self.VERSION,
+                'group': self.group,
+                'stamp': self.stamp.isoformat(),
+                'markets': [market.as_dict() for market in self.markets.values()]}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", 'wb') as f:
+                f.write(self.fernet.encrypt(json.dumps(data, ensure_ascii=False).encode('utf-8')))
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            logging.getLogger("RemoteLogger").warning(f"Локальный каталог рынков не сохранён: {e}")
+
+    def sync(self, db_conn) -> bool:
+        """Сверка с БД (db_conn: DbConnection). True — каталог изменился"""
+
+        changed, keys, stamp = db_conn.catalog_changes(self.group, since=self.stamp)
+
+        markets = {key: market for key, market in self.markets.items() if key in keys}
+        markets.update({(market.marketplace, market.name_company): market for market in changed})
+        updated = markets.keys() != self.markets.keys() or any(
+            market.as_dict() != self.markets[key].as_dict() for key, market in markets.items() if key in self.markets)
+
+        self.markets = markets
+        self.stamp = stamp
+        self.save()
+        return updated
+
+    def snapshots(self) -> list[MarketSnapshot]:
+        return list(self.markets.values())
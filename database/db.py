@@ -1,41 +1,140 @@
 import time
+import asyncio
+import inspect
+import weakref
 
 from functools import wraps
-from typing import Type, List
-from sqlalchemy.orm import Session
+from contextlib import contextmanager, suppress
+from typing import Type, List, Iterator
+from sqlalchemy.orm import Session, sessionmaker, joinedload, aliased
 from pyodbc import Error as PyodbcError
 from datetime import datetime, timedelta
-from sqlalchemy.exc import OperationalError
-from sqlalchemy import create_engine, func as f, and_
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import create_engine, event, select, delete, func as f, and_, or_
 
 from config import DB_URL
-from log_api import logger
+from log_api import logger, traced, metrics
 from database.models import *
+from database.notify import PhoneMessageListener
+from database.snapshot import MarketSnapshot
+from database.resilience import CircuitBreaker, backoff, fast_fail
 
+DB_RETRIES = metrics.counter('proxybrowser_db_retries_total', "Повторные попытки запросов к БД (retry_on_exception)",
+                             ('function', 'error'))
+POOL_CHECKOUTS = metrics.counter('proxybrowser_db_pool_checkouts_total', "Выдачи соединений из пула SQLAlchemy")
+POOL_WAIT = metrics.histogram('proxybrowser_db_pool_wait_seconds', "Ожидание соединения из пула SQLAlchemy")
 
-def retry_on_exception(retries: int = 3, delay: int = 5):
-    """Декоратор для повторной попытки подключения к БД при ошибках"""
+# Движки подключений процесса -> драйвер (sync — DbConnection, async — AsyncDbConnection)
+ENGINES = weakref.WeakKeyDictionary()
+
+
+def pool_checked_out() -> dict:
+    values = {}
+    for engine, driver in list(ENGINES.items()):
+        values[(driver,)] = values.get((driver,), 0) + engine.pool.checkedout()
+    return values
+
+
+POOL_CHECKED_OUT = metrics.gauge('proxybrowser_db_pool_checked_out', "Соединения пулов, выданные в работу, по драйверу",
+                                 ('driver',), callback=pool_checked_out)
+
+# Ошибки подключения asyncpg: обрыв соединения — InterfaceError, отказ сервера — OSError, тайм-аут — asyncio.TimeoutError
+ASYNC_CONNECTION_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+# Перекрытие окон сверки локального каталога рынков
+CATALOG_SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class MeteredQueuePool(QueuePool):
+    """Пул соединений с учётом времени ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def retry_on_exception(retries: int = 3, budget: float = 10):
+    """
+    Декоратор повторных попыток запросов к БД при ошибках подключения.
+
+    Паузы между попытками растут экспоненциально со случайным разбросом (backoff), чтобы приложения
+    не повторяли запросы в такт; суммарное ожидание метода ограничено budget секунд. Ошибки подключения
+    учитывает общий предохранитель self.breaker: пока БД недоступна, вызовы сразу завершаются DbUnavailable.
+    Каждая ошибка попытки засчитывается предохранителю, поэтому retries не больше его failure_threshold (3):
+    лишние попытки после открытия предохранителя всё равно были бы отклонены.
+    Методы-корутины (AsyncDbConnection) ждут паузу через asyncio.sleep, не занимая поток.
+    """
 
     def decorator(func):
+        def failed(self, attempt: int, e: Exception, deadline: float) -> float | None:
+            """Учёт ошибки подключения. Пауза перед следующей попыткой или None, если попытки исчерпаны"""
+
+            self.breaker.failure()
+            DB_RETRIES.inc(func.__name__, type(e).__name__)
+            logger.error(description=f"База данных. Произошла ошибка: {str(e)}. "
+                                     f"Попытка {attempt + 1}/{retries}")
+            pause = backoff(attempt)
+            if attempt + 1 == retries or time.monotonic() + pause > deadline:
+                return None
+            return pause
+
+        def unexpected(self, e: Exception) -> None:
+            self.breaker.success()  # Сервер ответил, ошибка не связана с подключением
+            logger.error(description=f"База данных. Произошла непредвиденая ошибка: {str(e)}.")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                if not self.breaker.allow():
+                    raise fast_fail(self.breaker, func.__name__)
+
+                deadline = time.monotonic() + budget
+                for attempt in range(retries):
+                    try:
+                        result = await func(self, *args, **kwargs)
+                    except ASYNC_CONNECTION_ERRORS as e:
+                        pause = failed(self, attempt, e, deadline)
+                        if pause is None:
+                            break
+                        await asyncio.sleep(pause)
+                        if not self.breaker.allow():
+                            raise fast_fail(self.breaker, func.__name__)
+                    except Exception as e:
+                        unexpected(self, e)
+                        raise e
+                    else:
+                        self.breaker.success()
+                        return result
+                raise RuntimeError("База данных. Попытки подключения исчерпаны")
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            attempt = 0
-            while attempt < retries:
+            if not self.breaker.allow():
+                raise fast_fail(self.breaker, func.__name__)
+
+            deadline = time.monotonic() + budget
+            for attempt in range(retries):
                 try:
                     result = func(self, *args, **kwargs)
-                    return result
                 except (OperationalError, PyodbcError) as e:
-                    attempt += 1
-                    logger.error(description=f"База данных. Произошла ошибка: {str(e)}. "
-                                             f"Повторная попытка {attempt}/{retries}")
-                    time.sleep(delay)
-                    if hasattr(self, 'session'):
-                        self.session.rollback()
+                    pause = failed(self, attempt, e, deadline)
+                    if pause is None:
+                        break
+                    time.sleep(pause)
+                    if not self.breaker.allow():
+                        raise fast_fail(self.breaker, func.__name__)
                 except Exception as e:
-                    logger.error(description=f"База данных. Произошла непредвиденая ошибка: {str(e)}.")
-                    if hasattr(self, 'session'):
-                        self.session.rollback()
+                    unexpected(self, e)
                     raise e
+                else:
+                    self.breaker.success()
+                    return result
             raise RuntimeError("База данных. Попытки подключения исчерпаны")
 
         return wrapper
@@ -44,7 +143,13 @@ def retry_on_exception(retries: int = 3, delay: int = 5):
 
 
 class DbConnection:
-    """Подключение к базе данных"""
+    """
+    Подключение к базе данных.
+
+    Общий пул соединений и короткая сессия на каждую операцию (session_scope): потоки окна входа,
+    запуска браузеров и параллельных авторизаций не делят одну сессию и не копят карту объектов.
+    Возвращаемые объекты отсоединены от сессии, связи рынков загружаются сразу.
+    """
 
     def __init__(self, echo: bool = False) -> None:
         self.engine = create_engine(url=DB_URL,
@@ -54,153 +159,290 @@ class DbConnection:
                                     pool_timeout=30,
                                     pool_recycle=1800,
                                     pool_pre_ping=True,
+                                    poolclass=MeteredQueuePool,
                                     connect_args={"keepalives": 1,
                                                   "keepalives_idle": 180,
                                                   "keepalives_interval": 60,
                                                   "keepalives_count": 20,
                                                   "connect_timeout": 10})
-        self.session = Session(self.engine)
+        event.listen(self.engine, 'checkout', lambda *args: POOL_CHECKOUTS.inc())
+        ENGINES[self.engine] = 'sync'
 
-    @retry_on_exception()
-    def info(self, group: str) -> list[Type[Market]]:
-        """Получение доступных рынков по группе пользователя"""
+        # Объекты остаются читаемыми после commit и закрытия сессии
+        self.session_factory = sessionmaker(self.engine, expire_on_commit=False)
+
+        # Общий предохранитель: при недоступной БД методы сразу завершаются DbUnavailable
+        self.breaker = CircuitBreaker(driver='sync')
+
+        # Уведомления о пришедших кодах (LISTEN phone_message), запускается при первом ожидании кода
+        self.listener = PhoneMessageListener(self.engine)
+
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """Сессия на одну операцию: commit при успехе, rollback при ошибке, соединение возвращается в пул"""
+
+        session = self.session_factory()
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_server_time(self) -> datetime:
+        """Текущее время сервера БД (источник для синхронизации часов, без повторных попыток)"""
+
+        with self.engine.connect() as conn:
+            return conn.scalar(select(f.now()))
+
+    @staticmethod
+    def _group_markets(query, group: str):
+        """Ограничение запроса рынков группой пользователя"""
 
         if group.lower().strip() == 'all':
-            markets = self.session.query(Market).all()
+            return query
         elif group.lower().strip() == 'manager ozon':
-            markets = self.session.query(Market).filter_by(marketplace='Ozon').all()
+            return query.filter(Market.marketplace == 'Ozon')
         elif group.lower().strip() == 'manager wb':
-            markets = self.session.query(Market).filter_by(marketplace='WB').all()
+            return query.filter(Market.marketplace == 'WB')
         elif group.lower().strip() == 'manager yandex':
-            markets = self.session.query(Market).filter_by(marketplace='Yandex').all()
-        else:
-            # Через таблицу связей групп и рынков
-            markets = (self.session.query(Market).join(GroupMarket, and_(
-                Market.marketplace == GroupMarket.marketplace,
-                Market.name_company == GroupMarket.name_company
-            )).filter(GroupMarket.group == group)).all()
-        return markets
-
+            return query.filter(Market.marketplace == 'Yandex')
+        # Через таблицу связей групп и рынков
+        return query.join(GroupMarket, and_(
+            Market.marketplace == GroupMarket.marketplace,
+            Market.name_company == GroupMarket.name_company
+        )).filter(GroupMarket.group == group)
+
+    @staticmethod
+    def _changed_since(query, since: datetime):
+        """Ограничение запроса рынков изменёнными после since (строки markets, marketplaces, connects, group_market)"""
+
+        # Запас на транзакции, начатые до прошлой сверки и зафиксированные после неё
+        since = since - CATALOG_SYNC_OVERLAP
+        group_market = aliased(GroupMarket)  # Внешний запрос группы уже соединён с group_market
+        return query.filter(or_(
+            Market.updated_at > since,
+            Market.marketplace.in_(select(Marketplace.marketplace).where(Marketplace.updated_at > since)),
+            Market.phone.in_(select(Connect.phone).where(Connect.updated_at > since)),
+            select(group_market.group).where(group_market.marketplace == Market.marketplace,
+                                             group_market.name_company == Market.name_company,
+                                             group_market.updated_at > since).exists()
+        ))
+
+    @traced()
+    @retry_on_exception(budget=5)
+    def info(self, group: str) -> list[MarketSnapshot]:
+        """Получение доступных рынков по группе пользователя (один запрос, снимки без привязки к сессии)"""
+
+        with self.session_scope() as session:
+            query = session.query(Market).options(joinedload(Market.marketplace_info), joinedload(Market.connect_info))
+            return [MarketSnapshot.from_market(market) for market in self._group_markets(query, group).all()]
+
+    @traced()
     @retry_on_exception()
-    def get_market(self, marketplace: str, name_company: str) -> Type[Market]:
+    def catalog_changes(self, group: str, since: datetime = None
+                        ) -> tuple[list[MarketSnapshot], set[tuple[str, str]], datetime]:
+        """
+        Изменения каталога рынков группы для локальной копии (MarketCatalog).
+
+        Возвращает рынки, у которых после since изменились строки markets, marketplaces, connects или group_market
+        (без since — все), ключи (маркетплейс, компания) всех рынков группы и время сервера для следующей сверки.
+        """
+
+        with self.session_scope() as session:
+            stamp = session.scalar(select(f.now()))
+
+            query = session.query(Market).options(joinedload(Market.marketplace_info), joinedload(Market.connect_info))
+            query = self._group_markets(query, group)
+            if since is not None:
+                query = self._changed_since(query, since)
+            changed = [MarketSnapshot.from_market(market) for market in query.all()]
+
+            keys = self._group_markets(session.query(Market.marketplace, Market.name_company), group).all()
+            return changed, {tuple(key) for key in keys}, stamp
+
+    @traced()
+    @retry_on_exception(budget=5)
+    def get_market(self, marketplace: str, name_company: str) -> MarketSnapshot | None:
         """Получение конкретного рынка по маркетплейсу и названию компании"""
 
-        market = self.session.query(Market).filter_by(marketplace=marketplace, name_company=name_company).first()
-        return market
+        with self.session_scope() as session:
+            market = session.query(Market).options(
+                joinedload(Market.marketplace_info), joinedload(Market.connect_info)
+            ).filter_by(marketplace=marketplace, name_company=name_company).first()
+            return MarketSnapshot.from_market(market) if market is not None else None
 
+    @traced()
     @retry_on_exception()
     def get_marketplaces(self) -> List[Type[Marketplace]]:
         """Получение списка всех маркетплейсов"""
-        marketplaces = self.session.query(Marketplace).all()
-        return marketplaces
 
-    @retry_on_exception()
+        with self.session_scope() as session:
+            return session.query(Marketplace).all()
+
+    @traced()
+    @retry_on_exception(budget=5)
     def check_user(self, login: str, password: str) -> str:
         """Проверка пользователя по логину и паролю"""
 
-        user = self.session.query(User).filter(f.lower(User.user) == login.lower(),
-                                               User.password == password).first()
-        if user is not None:
-            return user.group
+        with self.session_scope() as session:
+            user = session.query(User).filter(f.lower(User.user) == login.lower(),
+                                              User.password == password).first()
+            if user is not None:
+                return user.group
 
+    @traced()
     @retry_on_exception()
     def get_key(self) -> str:
         """Получение ключа шифрования"""
 
-        key = self.session.query(SecretKey).first()
-        return key.key
+        with self.session_scope() as session:
+            key = session.query(SecretKey).first()
+            return key.key
 
+    @traced()
     @retry_on_exception()
     def get_version(self) -> Type[Version]:
         """Получение текущей версии приложения"""
 
-        version = self.session.query(Version).first()
-        return version
-
-    @retry_on_exception()
-    def get_phone_message(self, user: str, phone: str, marketplace: str) -> str:
-        """Получение кода авторизации по телефону"""
-
-        check = None
-        for _ in range(20):  # до 20 попыток
-            check = self.session.query(PhoneMessage).filter(
-                f.lower(PhoneMessage.user) == user.lower(),
-                PhoneMessage.phone == phone,
-                PhoneMessage.marketplace == marketplace
-            ).order_by(PhoneMessage.time_request.desc()).first()
-
-            if check is None:
-                raise Exception('Ошибка получения сообщения')
-
-            if check.message is not None:
-                return check.message  # код получен
+        with self.session_scope() as session:
+            return session.query(Version).first()
 
-            self.session.expire(check)  # сброс кэша
-            time.sleep(5)
+    @retry_on_exception(budget=30)
+    def _claim_attempt(self, user: str, phone: str, marketplace: str, time_request: datetime) -> int | None:
+        """
+        Одна попытка занять номер: id заявки или None, если номер занят.
 
-        # Если сообщение не пришло — удалить запрос
-        self.session.delete(check)
-        self.session.commit()
-        raise Exception("Превышен лимит ожидания сообщения")
+        Проверка незавершённых запросов и создание заявки идут в одной транзакции под блокировкой строки
+        номера в connects: параллельные запросы на тот же номер не ждут блокировку (SKIP LOCKED),
+        а повторяют попытку после освобождения номера.
+        """
 
-    @retry_on_exception()
-    def check_phone_message(self, user: str, phone: str, time_request: datetime) -> None:
-        """Проверка, не идёт ли уже авторизация с этим номером"""
+        with self.session_scope() as session:
+            locked = session.query(Connect.phone).filter(
+                Connect.phone == phone
+            ).with_for_update(skip_locked=True).first()
+            if locked is None:
+                return None
 
-        for _ in range(20):  # до 20 попыток
-            check = self.session.query(PhoneMessage).filter(
+            pending = session.query(PhoneMessage.user).filter(
                 PhoneMessage.phone == phone,
                 PhoneMessage.time_request >= time_request - timedelta(minutes=2),
                 # только недавние запросы (до 2 мин назад)
                 PhoneMessage.time_response.is_(None)
             ).all()
 
-            if any([row.user.lower() == user.lower() for row in check]):
+            if any([row.user.lower() == user.lower() for row in pending]):
                 raise Exception("Предыдущая аторизация не завершена.")
-
-            if not check:
-                break
-
-            self.session.expire(check)  # сброс кэша
-            time.sleep(5)
-        else:
-            raise Exception("Превышен лимит ожидания очереди на авторизацию")
-
-    @retry_on_exception()
-    def add_phone_message(self, user: str, phone: str, marketplace: str, time_request: datetime) -> None:
-        """Создание записи-запроса на получение кода"""
-
-        user = self.session.query(User).filter(f.lower(User.user) == user.lower()).first()
-        if user is None:
-            raise Exception("Такого пользователя не существует")
-
-        new = PhoneMessage(user=user.user,
-                           phone=phone,
-                           marketplace=marketplace,
-                           time_request=time_request)
-        self.session.add(new)
-        self.session.commit()
-
-    @retry_on_exception()
+            if pending:
+                return None
+
+            owner = session.query(User.user).filter(f.lower(User.user) == user.lower()).first()
+            if owner is None:
+                raise Exception("Такого пользователя не существует")
+
+            new = PhoneMessage(user=owner.user,
+                               phone=phone,
+                               marketplace=marketplace,
+                               time_request=time_request)
+            session.add(new)
+            session.flush()
+            return new.id
+
+    @traced()
+    def claim_phone_message(self, user: str, phone: str, marketplace: str, time_request: datetime) -> int:
+        """
+        Занятие номера под запрос кода (ожидание свободного номера до 100 секунд). Возвращает id заявки.
+        При ошибке подключения повторяется только очередная попытка (_claim_attempt), отсчёт ожидания
+        не начинается заново.
+        """
+
+        self.listener.start()
+        event = self.listener.subscribe(('phone', phone))
+        try:
+            deadline = time.monotonic() + 100
+            while True:
+                event.clear()
+                request_id = self._claim_attempt(user, phone, marketplace, time_request)
+                if request_id is not None:
+                    return request_id
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("Превышен лимит ожидания очереди на авторизацию")
+                # Номер освобождается записью кода (NOTIFY) или удалением просроченной заявки — опрос каждые 5 секунд
+                event.wait(min(remaining, 5))
+        finally:
+            self.listener.unsubscribe(('phone', phone), event)
+
+    @retry_on_exception(budget=30)
+    def _read_phone_message(self, request_id: int) -> PhoneMessage | None:
+        # Новая сессия на каждую проверку: свежие данные, соединение не занято во время ожидания
+        with self.session_scope() as session:
+            return session.get(PhoneMessage, request_id)
+
+    @retry_on_exception(budget=30)
+    def _delete_phone_message(self, request_id: int) -> None:
+        with self.session_scope() as session:
+            session.execute(delete(PhoneMessage).where(PhoneMessage.id == request_id))
+
+    @traced()
+    def get_phone_message(self, request_id: int) -> str:
+        """
+        Получение кода по заявке claim_phone_message (ожидание до 100 секунд).
+        Заявка перечитывается по уведомлению NOTIFY о записи кода, без уведомлений — каждые 5 секунд.
+        Если код не получен (тайм-аут или ошибка), заявка удаляется и не занимает номер.
+        """
+
+        self.listener.start()
+        event = self.listener.subscribe(('id', request_id))
+        try:
+            deadline = time.monotonic() + 100
+            while True:
+                event.clear()
+                check = self._read_phone_message(request_id)
+
+                if check is None:
+                    raise Exception('Ошибка получения сообщения')
+
+                if check.message is not None:
+                    return check.message  # код получен
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("Превышен лимит ожидания сообщения")
+                # При работающем LISTEN редкий контрольный опрос, иначе — прежний опрос каждые 5 секунд
+                event.wait(min(remaining, 30 if self.listener.available else 5))
+        except Exception:
+            with suppress(Exception):
+                self._delete_phone_message(request_id)
+            raise
+        finally:
+            self.listener.unsubscribe(('id', request_id), event)
+
+    @traced()
+    @retry_on_exception(budget=30)
     def update_phone_message(self, user: str, phone: str, marketplace: str, message: str,
                              time_response: datetime) -> None:
         """Обновление сообщения с кодом подтверждения"""
 
-        mes = self.session.query(PhoneMessage).filter(
-            f.lower(PhoneMessage.user) == user.lower(),
-            PhoneMessage.phone == phone,
-            PhoneMessage.marketplace == marketplace,
-            PhoneMessage.time_response.is_(None),
-            PhoneMessage.message.is_(None),
-            PhoneMessage.time_request <= time_response + timedelta(seconds=2),
-            # допустимая задержка на пару секунд вперёд
-            PhoneMessage.time_request >= time_response - timedelta(minutes=2)
-            # только недавние запросы (до 2 мин назад)
-        ).order_by(PhoneMessage.time_request.asc()).first()
-
-        if mes:
-            mes.time_response = time_response
-            mes.message = message
-            self.session.commit()
-        else:
-            raise Exception("Нет запроса")
+        with self.session_scope() as session:
+            mes = session.query(PhoneMessage).filter(
+                f.lower(PhoneMessage.user) == user.lower(),
+                PhoneMessage.phone == phone,
+                PhoneMessage.marketplace == marketplace,
+                PhoneMessage.time_response.is_(None),
+                PhoneMessage.message.is_(None),
+                PhoneMessage.time_request <= time_response + timedelta(seconds=2),
+                # допустимая задержка на пару секунд вперёд
+                PhoneMessage.time_request >= time_response - timedelta(minutes=2)
+                # только недавние запросы (до 2 мин назад)
+            ).order_by(PhoneMessage.time_request.asc()).with_for_update().first()
+
+            if mes:
+                mes.time_response = time_response
+                mes.message = message
+            else:
+                raise Exception("Нет запроса")
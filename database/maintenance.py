@@ -0,0 +1,257 @@
+from datetime import date, timedelta
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Engine
+
+from database.models import LOG_LOGIN_SUCCESS, LOG_LOGIN_UNCONFIRMED, LOG_AUTOMATION_ERROR
+
+
+def _count(condition: str) -> str:
+    """Число событий с учётом склеенных повторов (repeat)"""
+
+    return f"COALESCE(SUM(COALESCE(repeat, 1)) FILTER (WHERE {condition}), 0)"
+
+
+def _like(message: str) -> str:
+    """Строковый литерал SQL для шаблона LIKE"""
+
+    return "'" + message.replace("'", "''").replace('%', r'\%').replace('_', r'\_') + "'"
+
+
+# Счётчики суточной статистики (одинаковые в триггере и при пересчёте). Группировка по log.marketplace и учёт
+# log.repeat требуют, чтобы клиенты писали эти столбцы (LOG_TRANSPORT = "db" или LOG_HTTP_BATCH = True),
+# записи прежнего HTTP-формата попадают в маркетплейс '' и считаются один раз
+LOG_DAILY_COUNTS = f"""
+           {_count(f"description LIKE '%' || {_like(LOG_LOGIN_SUCCESS)}")},
+           {_count(f"description LIKE '%' || {_like(LOG_LOGIN_UNCONFIRMED)}")},
+           {_count(f"action = 'ERROR' AND description LIKE '%' || {_like(LOG_AUTOMATION_ERROR)} || '%'")}
+"""
+
+# Триггер инкрементально обновляет суточные счётчики одной вставкой на пакет (transition table)
+LOG_DAILY_STATS_TRIGGER = f"""
+CREATE OR REPLACE FUNCTION log_daily_stats_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO log_daily_stats AS s (day, marketplace, logins, failures, automation_errors)
+    SELECT "timestamp"::date,
+           COALESCE(marketplace, ''),{LOG_DAILY_COUNTS}    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (day, marketplace) DO UPDATE
+    SET logins = s.logins + EXCLUDED.logins,
+        failures = s.failures + EXCLUDED.failures,
+        automation_errors = s.automation_errors + EXCLUDED.automation_errors;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS log_daily_stats_trg ON log;
+CREATE TRIGGER log_daily_stats_trg
+    AFTER INSERT ON log
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_daily_stats_update();
+"""
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    """Первое число месяца со сдвигом на shift месяцев"""
+
+    index = day.year * 12 + day.month - 1 + shift
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date, table: str = 'log') -> str:
+    return f"{table}_{month.year}_{month.month:02d}"
+
+
+def is_log_partitioned(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        return bool(conn.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                     "WHERE partrelid = to_regclass('log'))")))
+
+
+def create_month_partitions(conn, table: str, first: date, last: date) -> list[str]:
+    """Создаёт недостающие месячные секции table с месяца first по месяц last и секцию по умолчанию"""
+
+    created = []
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    month, end = month_start(first), month_start(last, 1)
+    while month < end:
+        name = partition_name(month, table)
+        exists = conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+        if not exists:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} "
+                              f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"))
+            created.append(name)
+        month = month_start(month, 1)
+    return created
+
+
+def ensure_log_partitions(engine: Engine, months_ahead: int = 2) -> list[str]:
+    """Создаёт секции log на текущий и months_ahead следующих месяцев и секцию по умолчанию"""
+
+    with engine.begin() as conn:
+        return create_month_partitions(conn, 'log', date.today(), month_start(date.today(), months_ahead))
+
+
+def install_log_rollups(engine: Engine) -> None:
+    """Создаёт (пересоздаёт) функцию и триггер обновления log_daily_stats"""
+
+    with engine.begin() as conn:
+        conn.execute(text(LOG_DAILY_STATS_TRIGGER))
+
+
+def rebuild_log_rollups(engine: Engine, since: date) -> None:
+    """Пересчёт log_daily_stats по таблице log начиная с даты since (например, после переноса старых данных)"""
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM log_daily_stats WHERE day >= :since"), {"since": since})
+        conn.execute(text(f"""
+            INSERT INTO log_daily_stats (day, marketplace, logins, failures, automation_errors)
+            SELECT "timestamp"::date,
+                   COALESCE(marketplace, ''),{LOG_DAILY_COUNTS}            FROM log
+            WHERE "timestamp" >= :since
+            GROUP BY 1, 2
+        """), {"since": since})
+
+
+def drop_old_partitions(engine: Engine, table: str, keep_months: int = 12, detach_only: bool = False) -> list[str]:
+    """
+    Удаляет (или только отсоединяет, detach_only) месячные секции table старше keep_months месяцев.
+    Отсоединённая секция остаётся обычной таблицей и может быть выгружена и удалена вручную.
+    """
+
+    oldest_kept = month_start(date.today(), -keep_months)
+    removed = []
+    with engine.begin() as conn:
+        rows = conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:table) AND c.relname ~ ('^' || :table || '_[0-9]{4}_[0-9]{2}$')
+            ORDER BY c.relname
+        """), {"table": table}).scalars().all()
+        for name in rows:
+            year, month = int(name[-7:-3]), int(name[-2:])
+            if date(year, month, 1) >= oldest_kept:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if not detach_only:
+                conn.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+    return removed
+
+
+def drop_old_log_partitions(engine: Engine, keep_months: int = 12, detach_only: bool = False) -> list[str]:
+    """Ретеншн секций log (см. drop_old_partitions). Суточные счётчики log_daily_stats при этом сохраняются"""
+
+    return drop_old_partitions(engine, 'log', keep_months, detach_only)
+
+
+def archive_phone_messages(engine: Engine, older_than: timedelta = timedelta(hours=24),
+                           batch_size: int = 1000) -> int:
+    """
+    Перенос запросов кода старше older_than из phone_message в phone_message_archive.
+
+    Переносятся завершённые запросы и брошенные (код не пришёл, а запрос не удалён из-за сбоя программы):
+    за пределами двухминутного окна они уже не участвуют в очереди на номер. Перенос идёт пачками
+    по batch_size строк, каждая пачка — отдельная короткая транзакция (DELETE ... RETURNING в INSERT),
+    строки, заблокированные работающей авторизацией, пропускаются. Возвращает число перенесённых строк.
+    """
+
+    if older_than < timedelta(minutes=5):
+        raise ValueError("Запросы моложе 5 минут ещё могут ожидать код")
+
+    with engine.begin() as conn:
+        # Время запросов — московское время приложения, граница считается по часам сервера БД
+        cutoff = conn.scalar(text("SELECT LOCALTIMESTAMP")) - older_than
+        first = conn.scalar(text("SELECT min(time_request) FROM phone_message WHERE time_request < :cutoff"),
+                            {"cutoff": cutoff})
+        if first is None:
+            return 0
+        # Секции создаются заранее: строки месяца, попавшие в секцию по умолчанию, не дадут создать его секцию
+        create_month_partitions(conn, 'phone_message_archive', first.date(), cutoff.date())
+
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text("""
+                WITH moved AS (
+                    DELETE FROM phone_message WHERE id IN (
+                        SELECT id FROM phone_message
+                        WHERE time_request < :cutoff
+                        ORDER BY id
+                        LIMIT :batch_size
+                        FOR UPDATE SKIP LOCKED)
+                    RETURNING id, "user", phone, marketplace, time_request, time_response, message
+                )
+                INSERT INTO phone_message_archive (id, "user", phone, marketplace, time_request, time_response, message)
+                SELECT id, "user", phone, marketplace, time_request, time_response, message FROM moved
+            """), {"cutoff": cutoff, "batch_size": batch_size}).rowcount
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def convert_log_to_partitioned(engine: Engine, create_log) -> None:
+    """
+    Перевод существующей несекционированной таблицы log в секционированную (короткая транзакция):
+    старая таблица переименовывается в log_legacy, создаются новая таблица (create_log) и секции
+    на весь диапазон данных. Последовательность log_id_seq продолжает нумерацию старой таблицы.
+    Строки копирует copy_legacy_log.
+    """
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE log RENAME TO log_legacy"))
+
+        # Имена ограничений и их индексов уникальны в схеме — освобождаем их для новой таблицы
+        constraints = conn.execute(text("SELECT conname FROM pg_constraint "
+                                        "WHERE conrelid = 'log_legacy'::regclass AND contype IN ('p', 'u')"))
+        for name in constraints.scalars().all():
+            conn.execute(text(f'ALTER TABLE log_legacy RENAME CONSTRAINT "{name}" TO "{name}_legacy"'))
+
+        # Столбец id старой таблицы — IDENTITY (или serial) с последовательностью log_id_seq,
+        # которая при переименовании таблицы сохраняет имя: освобождаем его для новой таблицы
+        conn.execute(text("ALTER TABLE log_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS"))
+        if conn.scalar(text("SELECT to_regclass('log_id_seq') IS NOT NULL")):
+            conn.execute(text("ALTER SEQUENCE log_id_seq RENAME TO log_legacy_id_seq"))
+        create_log(conn)
+        conn.execute(text("SELECT setval('log_id_seq', (SELECT COALESCE(max(id), 0) FROM log_legacy) + 1, false)"))
+
+        first, last = conn.execute(text('SELECT min("timestamp"), max("timestamp") FROM log_legacy')).one()
+        if first is not None:
+            create_month_partitions(conn, 'log', first.date(), last.date())
+        else:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS log_default PARTITION OF log DEFAULT"))
+
+
+def has_legacy_log(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        return bool(conn.scalar(text("SELECT to_regclass('log_legacy') IS NOT NULL")))
+
+
+def copy_legacy_log(engine: Engine, report=print) -> int:
+    """
+    Копирование строк log_legacy в секционированную log по месяцам, каждый месяц — отдельной транзакцией.
+    Уже скопированные строки пропускаются (ON CONFLICT DO NOTHING): прерванное копирование можно повторить.
+    Возвращает число скопированных строк.
+    """
+
+    with engine.connect() as conn:
+        legacy_columns = {column['name'] for column in inspect(conn).get_columns('log_legacy')}
+        log_columns = [column['name'] for column in inspect(conn).get_columns('log')]
+        first, last = conn.execute(text('SELECT min("timestamp"), max("timestamp") FROM log_legacy')).one()
+    if first is None:
+        return 0
+
+    columns = ', '.join(f'"{name}"' for name in log_columns if name in legacy_columns)
+    copied = 0
+    month, end = month_start(first.date()), month_start(last.date(), 1)
+    while month < end:
+        with engine.begin() as conn:
+            count = conn.execute(text(f"""
+                INSERT INTO log ({columns})
+                SELECT {columns} FROM log_legacy
+                WHERE "timestamp" >= :month AND "timestamp" < :next_month
+                ON CONFLICT DO NOTHING
+            """), {"month": month, "next_month": month_start(month, 1)}).rowcount
+        report(f"➡️ {partition_name(month)}: {count}")
+        copied += count
+        month = month_start(month, 1)
+    return copied
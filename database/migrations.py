@@ -0,0 +1,178 @@
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, Connection
+
+from database.catalog import CHANGE_STAMPS
+from database.notify import PHONE_MESSAGE_NOTIFY_TRIGGER
+from database.models import PhoneMessageArchive
+from database.maintenance import create_month_partitions, LOG_DAILY_STATS_TRIGGER
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version integer PRIMARY KEY,
+    description text NOT NULL,
+    applied_at timestamp NOT NULL DEFAULT now()
+)
+"""
+
+# Ключ pg_advisory_lock: миграции с нескольких машин одновременно выполняются по очереди
+MIGRATION_LOCK = 7_318_204_551
+
+# Ожидание блокировки таблицы для DDL в транзакции: на работающей базе шаг лучше повторить позже,
+# чем встать в очередь за долгой транзакцией и остановить все запросы к таблице
+LOCK_TIMEOUT = '5s'
+
+
+def execute(engine: Engine, sql: str) -> None:
+    """DDL в одной транзакции с ограничением ожидания блокировок"""
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        conn.exec_driver_sql(sql)
+
+
+def create_index_concurrently(engine: Engine, name: str, definition: str, unique: bool = False) -> None:
+    """
+    CREATE INDEX CONCURRENTLY вне транзакции: запись в таблицу не блокируется на время построения.
+    Недостроенный (INVALID) индекс после прерванной попытки удаляется и строится заново.
+    """
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        valid = conn.scalar(text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                            {'name': name})
+        if valid is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+def log_columns(engine: Engine) -> None:
+    """Столбцы склейки повторов и доставки без дублей (без значения по умолчанию — без перезаписи таблицы)"""
+
+    execute(engine, """
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS repeat integer;
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS timestamp_last timestamp;
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS client_id varchar(64);
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS seq bigint;
+    """)
+
+
+def log_client_seq_unique(engine: Engine) -> None:
+    """
+    Ограничение log_client_seq_unique (ON CONFLICT при отправке логов).
+    Индексы строятся заранее CONCURRENTLY: у секций — по одному, ограничение секционированной таблицы
+    присоединяет готовые индексы секций; у обычной таблицы ограничение создаётся по готовому индексу.
+    """
+
+    with engine.connect() as conn:
+        if conn.scalar(text("SELECT 1 FROM pg_constraint WHERE conname = 'log_client_seq_unique'")):
+            return
+        partitions = conn.execute(text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                                       "WHERE i.inhparent = to_regclass('log') ORDER BY c.relname")).scalars().all()
+
+    columns = 'client_id, seq, "timestamp"'
+    if partitions:
+        for name in partitions:
+            create_index_concurrently(engine, f"{name}_client_seq_key", f"{name} ({columns})", unique=True)
+        execute(engine, f"ALTER TABLE log ADD CONSTRAINT log_client_seq_unique UNIQUE ({columns})")
+    else:
+        create_index_concurrently(engine, 'log_client_seq_unique', f"log ({columns})", unique=True)
+        execute(engine, "ALTER TABLE log ADD CONSTRAINT log_client_seq_unique UNIQUE USING INDEX log_client_seq_unique")
+
+
+def phone_message_notify(engine: Engine) -> None:
+    execute(engine, PHONE_MESSAGE_NOTIFY_TRIGGER)
+
+
+def change_stamps(engine: Engine) -> None:
+    execute(engine, CHANGE_STAMPS)
+    for table in ('markets', 'connects', 'group_market'):
+        create_index_concurrently(engine, f"ix_{table}_updated_at", f"{table} (updated_at)")
+
+
+def phone_message_pending(engine: Engine) -> None:
+    """Незавершённые запросы кода по номеру (claim_phone_message, update_phone_message)"""
+
+    create_index_concurrently(engine, 'ix_phone_message_pending',
+                              'phone_message (phone, time_request) INCLUDE ("user") WHERE time_response IS NULL')
+
+
+def users_user_lower(engine: Engine) -> None:
+    """Поиск пользователя без учёта регистра (check_user, claim_phone_message)"""
+
+    create_index_concurrently(engine, 'ix_users_user_lower', 'users (lower("user"))')
+
+
+def markets_phone(engine: Engine) -> None:
+    """Рынки по номеру: каскад из connects и сверка каталога по изменённым подключениям"""
+
+    create_index_concurrently(engine, 'ix_markets_phone', 'markets (phone)')
+
+
+def phone_message_archive(engine: Engine) -> None:
+    """Секционированный архив запросов кода (таблица и секции текущего месяца)"""
+
+    with engine.begin() as conn:
+        PhoneMessageArchive.__table__.create(conn, checkfirst=True)
+        create_month_partitions(conn, 'phone_message_archive', date.today(), date.today())
+
+
+def log_proxy_ip_marketplace(engine: Engine) -> None:
+    """Столбцы log, которые пишет DbTransport и читает триггер log_daily_stats"""
+
+    execute(engine, """
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS proxy_ip varchar(255);
+        ALTER TABLE log ADD COLUMN IF NOT EXISTS marketplace varchar(255);
+    """)
+
+
+def log_daily_stats_repeat(engine: Engine) -> None:
+    """Триггер log_daily_stats с учётом склеенных повторов (repeat); только там, где триггер уже установлен"""
+
+    with engine.connect() as conn:
+        installed = conn.scalar(text("SELECT 1 FROM pg_trigger WHERE tgname = 'log_daily_stats_trg'"))
+    if installed:
+        execute(engine, LOG_DAILY_STATS_TRIGGER)
+
+
+# Шаги по возрастанию версии. Каждый шаг можно безопасно повторить (IF NOT EXISTS, CREATE OR REPLACE):
+# если выполнение прервалось, при следующем запуске шаг выполнится заново целиком
+MIGRATIONS = (
+    (1, "Столбцы log: repeat, timestamp_last, client_id, seq", log_columns),
+    (2, "Ограничение log_client_seq_unique", log_client_seq_unique),
+    (3, "Триггер NOTIFY phone_message", phone_message_notify),
+    (4, "Отметки изменений updated_at каталога рынков", change_stamps),
+    (5, "Индекс незавершённых запросов кода phone_message", phone_message_pending),
+    (6, "Индекс lower(users.user)", users_user_lower),
+    (7, "Индекс markets.phone", markets_phone),
+    (8, "Архив phone_message_archive", phone_message_archive),
+    (9, "Столбцы log: proxy_ip, marketplace", log_proxy_ip_marketplace),
+    (10, "Счётчики log_daily_stats с учётом repeat", log_daily_stats_repeat),
+)
+
+
+def applied_versions(conn: Connection) -> dict[int, tuple]:
+    conn.execute(text(SCHEMA_VERSION_TABLE))
+    rows = conn.execute(text("SELECT version, description, applied_at FROM schema_version")).all()
+    return {row.version: (row.description, row.applied_at) for row in rows}
+
+
+def migrate(engine: Engine, report=print) -> list[int]:
+    """Применяет недостающие шаги MIGRATIONS по порядку, возвращает версии применённых шагов"""
+
+    applied = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK})
+        try:
+            done = applied_versions(conn)
+            for version, description, step in MIGRATIONS:
+                if version in done:
+                    continue
+                report(f"➡️ {version}. {description}")
+                step(engine)
+                conn.execute(text("INSERT INTO schema_version (version, description) VALUES (:version, :description) "
+                                  "ON CONFLICT (version) DO NOTHING"),
+                             {'version': version, 'description': description})
+                applied.append(version)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK})
+    return applied
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, DateTime, Text, String, Integer
-from sqlalchemy import UniqueConstraint, MetaData, ForeignKeyConstraint, Identity, ForeignKey
+from sqlalchemy import Column, DateTime, Date, Text, String, Integer, BigInteger, Sequence, Index, func, text
+from sqlalchemy import UniqueConstraint, MetaData, ForeignKeyConstraint, Identity, ForeignKey, PrimaryKeyConstraint
 
 
 metadata = MetaData()
@@ -17,6 +17,7 @@ class Market(Base):
     - phone: номер телефона РФ без кода страны, используемый для входа
     - entrepreneur: ФИО владельца или ИП
     - client_id: идентификатор клиента на платформе
+    - updated_at: время последнего изменения (обновляется триггером, для синхронизации локального каталога)
 
     Связи:
     - marketplace_info: отношение к Marketplace
@@ -33,9 +34,10 @@ class Market(Base):
                          ForeignKey('marketplaces.marketplace', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
     name_company = Column(String(length=255), nullable=False)
     phone = Column(String(length=255), ForeignKey('connects.phone', ondelete='CASCADE', onupdate='CASCADE'),
-                   nullable=False)
+                   nullable=False, index=True)
     entrepreneur = Column(String(length=255), nullable=True)
     client_id = Column(String(length=255), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
 
     marketplace_info = relationship("Marketplace", back_populates="markets")
     connect_info = relationship("Connect", back_populates="markets")
@@ -54,6 +56,7 @@ class Marketplace(Base):
     - marketplace: название маркетплейса (WB, Ozon, Yandex)
     - link: ссылка на сайт
     - domain: домен для определения успешной авторизации
+    - updated_at: время последнего изменения
 
     Связи:
     - markets: список связанных компаний (Market)
@@ -63,6 +66,7 @@ class Marketplace(Base):
     marketplace = Column(String(length=255), primary_key=True, nullable=False)
     link = Column(String(length=1000), nullable=False)
     domain = Column(String(length=255), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     markets = relationship("Market", back_populates="marketplace_info")
 
@@ -77,6 +81,7 @@ class Connect(Base):
     - mail: Yandex-почта для получения кодов на Ozon и для подключенния к Yandex market <email>@yandex.ru
     - token: token доступа к почте Yandex, для получения кодов на Ozon
     - pass_mail: пароль к Яндекс аккаунту, для авторизации на Yandex
+    - updated_at: время последнего изменения
 
     Связи:
     - markets: компании, использующие это подключение
@@ -91,6 +96,7 @@ class Connect(Base):
     mail = Column(String(length=255), nullable=False)
     token = Column(String(length=255), nullable=False)
     pass_mail = Column(String(length=255), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
 
     markets = relationship("Market", back_populates="connect_info")
 
@@ -108,6 +114,9 @@ class User(Base):
     - password: пароль
     - name: имя пользователя (опционально)
     - group: принадлежность к группе (определяет доступные компании)
+
+    Индексы:
+    - lower(user) — поиск логина без учёта регистра
     """
     __tablename__ = 'users'
 
@@ -117,6 +126,10 @@ class User(Base):
     group = Column(String(length=255), ForeignKey('group_table.group', ondelete='CASCADE', onupdate='CASCADE'),
                    nullable=False)
 
+    __table_args__ = (
+        Index('ix_users_user_lower', func.lower(text('"user"'))),
+    )
+
 
 class SecretKey(Base):
     """
@@ -154,6 +167,9 @@ class PhoneMessage(Base):
     - message: сам код (если получен)
 
     Используется для синхронизации кода подтверждения с автоматизацией входа.
+
+    Индексы:
+    - phone + time_request по незавершённым запросам (time_response IS NULL)
     """
     __tablename__ = 'phone_message'
 
@@ -168,6 +184,38 @@ class PhoneMessage(Base):
     time_response = Column(DateTime, default=None, nullable=True)
     message = Column(String(length=255), default=None, nullable=True)
 
+    __table_args__ = (
+        Index('ix_phone_message_pending', 'phone', 'time_request', postgresql_include=['user'],
+              postgresql_where=text('time_response IS NULL')),
+    )
+
+
+class PhoneMessageArchive(Base):
+    """
+    Таблица phone_message_archive — завершённые запросы кода, перенесённые из phone_message.
+    Секционирована по месяцам по time_request (секции phone_message_archive_YYYY_MM и phone_message_archive_default,
+    см. database/maintenance.py). Поля как у phone_message, без внешних ключей (история сохраняется
+    после удаления пользователя или подключения).
+
+    Ограничения:
+    - первичный ключ id + time_request (ключ секционирования обязан входить в уникальные ограничения)
+    """
+    __tablename__ = 'phone_message_archive'
+
+    id = Column(Integer, nullable=False)
+    user = Column(String(length=255), nullable=False)
+    phone = Column(String(length=255), nullable=False)
+    marketplace = Column(String(length=255), nullable=False)
+    time_request = Column(DateTime, nullable=False)
+    time_response = Column(DateTime, default=None, nullable=True)
+    message = Column(String(length=255), default=None, nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'time_request', name='phone_message_archive_pkey'),
+        Index('phone_message_archive_phone_idx', 'phone', 'time_request'),
+        {'postgresql_partition_by': 'RANGE (time_request)'},
+    )
+
 
 class Group(Base):
     """
@@ -193,6 +241,7 @@ class GroupMarket(Base):
     - group: группа пользователей
     - marketplace: платформа
     - name_company: компания на платформе
+    - updated_at: время добавления или изменения привязки
 
     Внешний ключи:
     - (marketplace, name_company) → Market
@@ -205,6 +254,7 @@ class GroupMarket(Base):
                    primary_key=True)
     marketplace = Column(String(length=255), nullable=False, primary_key=True)
     name_company = Column(String(length=255), nullable=False, primary_key=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
 
     __table_args__ = (
         ForeignKeyConstraint(
@@ -215,12 +265,16 @@ class GroupMarket(Base):
     )
 
 
+log_id_seq = Sequence('log_id_seq', metadata=metadata)
+
+
 class Log(Base):
     """
     Таблица log — журнал действий пользователей и системы.
+    Секционирована по месяцам по timestamp (секции log_YYYY_MM и log_default, см. database/maintenance.py).
 
     Поля:
-    - id: уникальный идентификатор лога
+    - id: уникальный идентификатор лога (из последовательности log_id_seq)
     - timestamp: серверное время события
     - timestamp_user: локальное время пользователя (если передано)
     - action: тип действия (INFO, ERROR, WARNING и т.д.)
@@ -229,11 +283,24 @@ class Log(Base):
     - city: определённый по IP город
     - country: определённая по IP страна
     - proxy: использованный прокси (если есть)
+    - proxy_ip: внешний IP прокси на момент события (если есть)
     - description: текстовое описание события или ошибки
+    - marketplace: маркетплейс, к которому относится событие (если есть)
+    - repeat: число одинаковых событий, склеенных в одну запись (NULL — одиночное событие)
+    - timestamp_last: время последнего из склеенных событий
+    - client_id: идентификатор установки приложения, отправившей запись
+    - seq: порядковый номер записи в установке
+
+    Ограничения:
+    - первичный ключ id + timestamp (ключ секционирования обязан входить в уникальные ограничения)
+    - уникальность по client_id + seq + timestamp (повторная доставка не создаёт дублей)
+
+    Индексы:
+    - user + timestamp, action + timestamp
     """
     __tablename__ = 'log'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(BigInteger, log_id_seq, server_default=log_id_seq.next_value(), nullable=False)
     timestamp = Column(DateTime, nullable=False)
     timestamp_user = Column(DateTime, default=None, nullable=True)
     action = Column(String(length=255), nullable=False)
@@ -243,4 +310,51 @@ class Log(Base):
     city = Column(String(length=255), nullable=False)
     country = Column(String(length=255), nullable=False)
     proxy = Column(String(length=255), nullable=True)
+    proxy_ip = Column(String(length=255), default=None, nullable=True)
     description = Column(Text, nullable=False)
+    marketplace = Column(String(length=255), default=None, nullable=True)
+    repeat = Column(Integer, default=None, nullable=True)
+    timestamp_last = Column(DateTime, default=None, nullable=True)
+    client_id = Column(String(length=64), default=None, nullable=True)
+    seq = Column(BigInteger, default=None, nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'timestamp', name='log_pkey'),
+        UniqueConstraint('client_id', 'seq', 'timestamp', name='log_client_seq_unique'),
+        Index('log_user_timestamp_idx', 'user', 'timestamp'),
+        Index('log_action_timestamp_idx', 'action', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+
+# Сообщения лога, по которым считаются счётчики log_daily_stats (пишутся в web_driver/wd.py).
+# Текст меняется только здесь: триггер счётчиков строится из этих констант (после изменения —
+# python maintenance.py log-rollups для пересоздания триггера и пересчёта)
+LOG_LOGIN_SUCCESS = 'Вход в ЛК выполнен'
+LOG_LOGIN_UNCONFIRMED = 'Автоматизация завершена, вход не подтверждён'
+LOG_AUTOMATION_ERROR = 'Ошибка автоматизации'
+
+
+class LogDailyStats(Base):
+    """
+    Таблица log_daily_stats — суточные счётчики по маркетплейсам для отчётов без сканирования log.
+
+    Поля:
+    - day: дата (по timestamp записи лога)
+    - marketplace: маркетплейс ('' — событие без маркетплейса)
+    - logins: успешные входы в ЛК
+    - failures: автоматизация завершена без подтверждения входа
+    - automation_errors: ошибки автоматизации
+
+    Записи, склеенные в одну (repeat = N), считаются N раз. Обновляется триггером на вставку в log (см. database/maintenance.py).
+    Разбивка по маркетплейсам и учёт повторов верны только для записей со столбцами marketplace и repeat:
+    при LOG_TRANSPORT = "db" или LOG_HTTP_BATCH = True. Прежний HTTP-формат этих полей не передаёт
+    (маркетплейс попадает в '', повторы — только в текст описания).
+    """
+    __tablename__ = 'log_daily_stats'
+
+    day = Column(Date, primary_key=True, nullable=False)
+    marketplace = Column(String(length=255), primary_key=True, nullable=False)
+    logins = Column(Integer, default=0, nullable=False)
+    failures = Column(Integer, default=0, nullable=False)
+    automation_errors = Column(Integer, default=0, nullable=False)
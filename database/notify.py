@@ -0,0 +1,121 @@
+import json
+import select
+import logging
+import threading
+
+from sqlalchemy.engine import Engine
+
+CHANNEL = 'phone_message'
+
+# Уведомление при записи кода в phone_message (почтой из приложения или внешним SMS-шлюзом)
+PHONE_MESSAGE_NOTIFY_TRIGGER = """
+CREATE OR REPLACE FUNCTION phone_message_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('phone_message', json_build_object(
+        'id', NEW.id, 'phone', NEW.phone, 'marketplace', NEW.marketplace)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS phone_message_notify_trg ON phone_message;
+CREATE TRIGGER phone_message_notify_trg
+    AFTER INSERT OR UPDATE OF message ON phone_message
+    FOR EACH ROW WHEN (NEW.message IS NOT NULL)
+    EXECUTE FUNCTION phone_message_notify();
+"""
+
+
+class PhoneMessageListener:
+    """
+    Одно соединение LISTEN phone_message на приложение.
+
+    Ожидающий код поток подписывается на ключ ('id', id заявки), ожидающий свободный номер — на ('phone', телефон),
+    и ждёт события вместо частого опроса.
+    Соединение берётся у движка и отсоединяется от пула. При обрыве выполняется переподключение,
+    а все ожидающие будятся (уведомления за время обрыва могли потеряться) и перечитывают таблицу.
+    Пока соединения нет, available = False и вызывающий код опрашивает таблицу как раньше.
+    """
+
+    def __init__(self, engine: Engine, retry_interval: float = 30) -> None:
+        self.engine = engine
+        self.retry_interval = retry_interval
+        self.available = False
+
+        self._waiters = {}  # Ключ -> множество threading.Event
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Запуск потока прослушивания (повторный вызов ничего не делает). Только для PostgreSQL"""
+
+        with self._lock:
+            if self._thread is not None or self.engine.dialect.name != 'postgresql':
+                return
+            self._thread = threading.Thread(target=self._run, name="PhoneMessageListener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def subscribe(self, key: tuple) -> threading.Event:
+        """Подписка до проверки таблицы, чтобы не пропустить уведомление между проверкой и ожиданием"""
+
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(event)
+        return event
+
+    def unsubscribe(self, key: tuple, event: threading.Event) -> None:
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[key]
+
+    def _wake(self, keys=None) -> None:
+        with self._lock:
+            for key, waiters in self._waiters.items():
+                if keys is None or key in keys:
+                    for event in waiters:
+                        event.set()
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            self._wake()
+            return
+        self._wake({('id', data.get('id')), ('phone', data.get('phone'))})
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                connection.detach()  # Соединение живёт всё время работы и не должно занимать место в пуле
+                dbapi = connection.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self.available = True
+                self._wake()  # Всё, что пришло до подписки, ожидающие увидят при перечитывании
+
+                while not self._stop.is_set():
+                    if select.select([dbapi], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        self._dispatch(dbapi.notifies.pop(0).payload)
+            except Exception as e:
+                logging.getLogger("RemoteLogger").warning(f"LISTEN {CHANNEL}: {e}")
+            finally:
+                self.available = False
+                self._wake()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.retry_interval)
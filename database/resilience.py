@@ -0,0 +1,124 @@
+import time
+import random
+import weakref
+import threading
+
+from log_api import logger, metrics
+
+CIRCUIT_STATES = ('closed', 'open', 'half_open')
+
+CIRCUIT_TRANSITIONS = metrics.counter('proxybrowser_db_circuit_transitions_total',
+                                      "Переходы предохранителя БД по новому состоянию", ('state',))
+FAST_FAILS = metrics.counter('proxybrowser_db_fast_fail_total',
+                             "Вызовы БД, отклонённые открытым предохранителем", ('function',))
+
+# Предохранители всех подключений процесса
+BREAKERS = weakref.WeakSet()
+
+
+def circuit_states() -> dict:
+    values = {}
+    for breaker in list(BREAKERS):
+        for state in CIRCUIT_STATES:
+            key = breaker.driver, state
+            values[key] = values.get(key, 0) + int(breaker.state == state)
+    return values
+
+
+CIRCUIT_STATE = metrics.gauge('proxybrowser_db_circuit_state',
+                              "Предохранители БД в каждом состоянии по драйверу (при одном подключении 1 — текущее)",
+                              ('driver', 'state'), callback=circuit_states)
+
+
+class DbUnavailable(RuntimeError):
+    """БД известна как недоступная: вызов отклонён без обращения к серверу"""
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 8) -> float:
+    """Экспоненциальная пауза с полным джиттером: случайная в [0, min(cap, base * 2^attempt)]"""
+
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Предохранитель подключения к БД, общий для всех методов DbConnection.
+
+    closed — вызовы идут как обычно. После failure_threshold ошибок подключения подряд — open:
+    вызовы сразу отклоняются DbUnavailable, интерфейс не ждёт повторов. Через reset_timeout — half_open:
+    пропускается один пробный вызов, остальные отклоняются; успех пробы закрывает предохранитель,
+    ошибка открывает снова. Методы с долгим ожиданием (claim_phone_message, get_phone_message) сами
+    предохранителем не проверяются: он проверяет и получает исход каждого короткого обращения к БД
+    внутри ожидания (_claim_attempt, _read_phone_message) отдельно, поэтому проба не держит
+    предохранитель на всё ожидание.
+    Смена состояния пишется в лог, метрики и передаётся подписчикам listeners.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30, driver: str = 'sync') -> None:
+        self.driver = driver  # Метка метрики состояния: sync — DbConnection, async — AsyncDbConnection
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.listeners = []  # Функции от нового состояния, вызываются из потока, сменившего состояние
+
+        self._probing = False
+        self._lock = threading.Lock()
+        BREAKERS.add(self)
+
+    def allow(self) -> bool:
+        """Можно ли обращаться к БД. В half_open разрешает ровно одну пробу"""
+
+        changed = None
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                changed = self.state = 'half_open'
+            allowed = self.state == 'closed' or (self.state == 'half_open' and not self._probing)
+            if self.state == 'half_open' and allowed:
+                self._probing = True
+        self._announce(changed)
+        return allowed
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def success(self) -> None:
+        changed = None
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != 'closed':
+                changed = self.state = 'closed'
+        self._announce(changed)
+
+    def failure(self) -> None:
+        changed = None
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != 'open':
+                    changed = self.state = 'open'
+        self._announce(changed)
+
+    def _announce(self, state: str | None) -> None:
+        """Лог, метрика и подписчики — вне блокировки"""
+
+        if state is None:
+            return
+        CIRCUIT_TRANSITIONS.inc(state)
+        if state == 'open':
+            logger.error(description=f"База данных недоступна, запросы приостановлены на {self.reset_timeout:.0f} с")
+        elif state == 'closed':
+            logger.info(description="Подключение к базе данных восстановлено")
+        for listener in list(self.listeners):
+            listener(state)
+
+
+def fast_fail(breaker: CircuitBreaker, function: str) -> DbUnavailable:
+    FAST_FAILS.inc(function)
+    return DbUnavailable(f"База данных недоступна. Повторная попытка через {breaker.retry_in():.0f} с")
+
@@ -0,0 +1,52 @@
+from database.models import Market
+
+
+class MarketSnapshot:
+    """
+    Неизменяемый снимок рынка с данными маркетплейса и подключения.
+
+    Создаётся внутри сессии из Market с загруженными связями и дальше не зависит от сессии:
+    окно запуска хранит каталог на всё время работы, браузер читает поля без запросов к БД.
+
+    Поля:
+    - marketplace, link, domain: маркетплейс, ссылка входа и домен личного кабинета
+    - name_company, entrepreneur, client_id: компания
+    - phone, proxy, mail, token, pass_mail: подключение
+    """
+
+    __slots__ = ('marketplace', 'link', 'domain',
+                 'name_company', 'entrepreneur', 'client_id',
+                 'phone', 'proxy', 'mail', 'token', 'pass_mail')
+
+    def __init__(self, **fields) -> None:
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} неизменяем")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} неизменяем")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.marketplace!r}, {self.name_company!r})"
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_market(cls, market: Market) -> 'MarketSnapshot':
+        """Снимок рынка (связи marketplace_info и connect_info должны быть загружены)"""
+
+        marketplace, connect = market.marketplace_info, market.connect_info
+        return cls(marketplace=market.marketplace,
+                   link=marketplace.link,
+                   domain=marketplace.domain,
+                   name_company=market.name_company,
+                   entrepreneur=market.entrepreneur,
+                   client_id=market.client_id,
+                   phone=connect.phone,
+                   proxy=connect.proxy,
+                   mail=connect.mail,
+                   token=connect.token,
+                   pass_mail=connect.pass_mail)
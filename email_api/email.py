@@ -1,12 +1,40 @@
 import re
+import time
 import email
 import imaplib
 
+from functools import wraps
 from bs4 import BeautifulSoup
 from email.header import decode_header
 from datetime import datetime, timedelta, timezone
 
 from database.db import DbConnection
+from log_api import traced, metrics
+
+IMAP_CALLS = metrics.counter('proxybrowser_imap_calls_total', "Операции IMAP (подключение, опрос ящика) по результату",
+                             ('operation', 'result'))
+IMAP_SECONDS = metrics.histogram('proxybrowser_imap_seconds', "Длительность операций IMAP", ('operation',))
+
+
+def metered(operation: str):
+    """Декоратор: число и длительность операций IMAP в метриках"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = 'error'
+            try:
+                value = func(*args, **kwargs)
+                result = 'ok'
+                return value
+            finally:
+                IMAP_SECONDS.observe(time.perf_counter() - started, operation)
+                IMAP_CALLS.inc(operation, result)
+
+        return wrapper
+
+    return decorator
 
 
 class YandexMailClient:
@@ -21,6 +49,8 @@ class YandexMailClient:
         self.password = token      # Пароль приложения (токен)
         self.mail = None           # IMAP-сессия
 
+    @traced()
+    @metered('connect')
     def connect(self) -> None:
         """Подключение к почтовому серверу и авторизация"""
 
@@ -68,10 +98,13 @@ class YandexMailClient:
 
             return text
 
+    @traced()
     def delete_email(self, email_id: str) -> None:
         """Помечает письмо как удалённое"""
         self.mail.store(email_id, '+FLAGS', '\\Deleted')
 
+    @traced()
+    @metered('poll')
     def fetch_emails(self, user: str, phone: str, time_request: datetime) -> None:
         """
         Поиск и обработка последних писем (до 10) из входящих.
@@ -1 +1,6 @@
+from .clock import clock
+from .metrics import metrics
+from .context import log_context
 from .log import logger, get_moscow_time
+from .trace import span, traced, trace_flow
+from .profiling import profiler
@@ -0,0 +1,118 @@
+import time
+import logging
+import threading
+
+import requests
+
+from typing import Callable, Optional
+from datetime import datetime, timezone, timedelta
+
+MOSCOW_TZ = timezone(timedelta(hours=3))
+SYNC_URL = "https://yandex.com/time/sync.json?geo=213"
+
+
+class MoscowClock:
+    """
+    Процессный источник московского времени.
+
+    Смещение относительно time.monotonic() измеряется один раз (по серверу БД или yandex.com/time),
+    после чего время вычисляется локально без сетевых запросов. Пересинхронизация идёт в фоновом потоке.
+    """
+
+    def __init__(self, resync_interval: int = 1800, retry_interval: int = 60, timeout: int = 5) -> None:
+        self.resync_interval = resync_interval  # Плановая пересинхронизация, сек
+        self.retry_interval = retry_interval    # Повтор после неудачной синхронизации, сек
+        self.timeout = timeout
+
+        self._offset = None     # epoch-секунды = time.monotonic() + offset
+        self._source = None     # Источник последней успешной синхронизации
+        self._db_source = None  # Функция, возвращающая now() сервера БД
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def synced(self) -> bool:
+        return self._offset is not None
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._source
+
+    def now(self) -> datetime:
+        """Текущее московское время без часового пояса. До первой синхронизации — локальные часы в UTC+3"""
+
+        offset = self._offset
+        if offset is None:
+            offset = time.time() - time.monotonic()
+        return datetime.fromtimestamp(time.monotonic() + offset, tz=MOSCOW_TZ).replace(tzinfo=None)
+
+    def to_moscow(self, timestamp: float) -> datetime:
+        """Перевод локальной метки time.time() (например, LogRecord.created) в московское время с учётом смещения"""
+
+        offset = self._offset
+        correction = 0 if offset is None else time.monotonic() + offset - time.time()
+        return datetime.fromtimestamp(timestamp + correction, tz=MOSCOW_TZ).replace(tzinfo=None)
+
+    def set_db_source(self, source: Callable[[], datetime]) -> None:
+        """Подключение сервера БД как приоритетного источника времени и внеочередная синхронизация"""
+
+        self._db_source = source
+        self._wake.set()
+
+    def sync(self) -> bool:
+        """Измерение смещения. Возвращает True при успешной синхронизации"""
+
+        sources = []
+        if self._db_source is not None:
+            sources.append(('db', self._db_source))
+        sources.append(('yandex', self._fetch_yandex))
+
+        for name, source in sources:
+            try:
+                start = time.monotonic()
+                server_time = source()
+                end = time.monotonic()
+            except Exception as e:
+                logging.getLogger("RemoteLogger").warning(f"Синхронизация времени ({name}): {e}")
+                continue
+
+            if server_time.tzinfo is None:
+                server_time = server_time.replace(tzinfo=MOSCOW_TZ)
+
+            # Ответ относим к середине запроса, чтобы компенсировать сетевую задержку
+            with self._lock:
+                self._offset = server_time.timestamp() - (start + end) / 2
+                self._source = name
+            return True
+        return False
+
+    def start(self) -> None:
+        """Запуск фоновой пересинхронизации (повторный вызов ничего не делает)"""
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="MoscowClock", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            interval = self.resync_interval if self.sync() else self.retry_interval
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def _fetch_yandex(self) -> datetime:
+        response = requests.get(SYNC_URL, timeout=self.timeout, verify=False)
+        response.raise_for_status()
+        data = response.json()
+        return datetime.fromtimestamp(data.get('time') / 1000, tz=MOSCOW_TZ)
+
+
+# Глобальные часы процесса
+clock = MoscowClock()
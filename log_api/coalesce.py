@@ -0,0 +1,77 @@
+import re
+import time
+import threading
+
+from typing import Callable, Optional
+
+NUMBER = re.compile(r'\d+')
+
+
+def message_template(description: Optional[str]) -> str:
+    """Шаблон сообщения: числа заменяются на #, чтобы 'попытка 1/3' и 'попытка 2/3' считались одинаковыми"""
+
+    return NUMBER.sub('#', description or '')
+
+
+class LogCoalescer:
+    """
+    Подавление шторма одинаковых логов.
+
+    Первая запись с ключом (уровень, пользователь, прокси, шаблон сообщения) проходит сразу.
+    Повторы в течение window секунд не отправляются, а по закрытии окна уходят одной записью
+    с полями repeat (число повторов), timestamp (первый повтор) и timestamp_last (последний).
+    """
+
+    def __init__(self, emit: Callable[[dict], None], window: float = 60) -> None:
+        self.emit = emit  # Куда передавать пропущенные и итоговые записи
+        self.window = window
+
+        self._windows = {}  # Ключ -> {'opened', 'summary'}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="LogCoalescer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _key(record: dict) -> tuple:
+        return record.get('action'), record.get('user'), record.get('proxy'), message_template(record.get('description'))
+
+    def submit(self, record: dict) -> None:
+        key = self._key(record)
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None:
+                self._windows[key] = {'opened': time.monotonic(), 'summary': None}
+            else:
+                summary = state['summary']
+                if summary is None:
+                    state['summary'] = dict(record, repeat=1, timestamp_last=record.get('timestamp'))
+                else:
+                    summary['repeat'] += 1
+                    summary['timestamp_last'] = record.get('timestamp')
+                    summary['description'] = record.get('description')
+                return
+        self.emit(record)
+
+    def flush(self, force: bool = False) -> None:
+        """Закрытие истёкших окон (или всех при force) с отправкой итоговых записей"""
+
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for key, state in list(self._windows.items()):
+                if force or now - state['opened'] >= self.window:
+                    del self._windows[key]
+                    if state['summary'] is not None:
+                        summaries.append(state['summary'])
+        for summary in summaries:
+            self.emit(summary)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(5)
+        self.flush(force=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(1):
+            self.flush()
@@ -0,0 +1,23 @@
+import contextvars
+
+from contextlib import contextmanager
+
+_context = contextvars.ContextVar('log_context', default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Контекст логирования текущего потока: marketplace, company, flow_id и т.д.
+    Поля добавляются ко всем записям логгера внутри блока with.
+    """
+
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context() -> dict:
+    return _context.get()
@@ -0,0 +1,218 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import logging
+import threading
+
+from datetime import timedelta
+
+from .clock import clock
+from .identity import route_key
+
+DAY_FILE = re.compile(r'^(\d{4}-\d{2}-\d{2})\.(log|jsonl)(\.gz)?$')
+JSONL_FIELDS = ('user', 'proxy', 'marketplace', 'company', 'flow_id')
+
+
+class MoscowDailyFileHandler(logging.FileHandler):
+    """Запись в log/YYYY-MM-DD.log с переключением файла в полночь по Москве"""
+
+    suffix = '.log'
+
+    def __init__(self, log_dir: str, on_rotate=None, encoding: str = 'utf-8') -> None:
+        self.log_dir = log_dir
+        self.on_rotate = on_rotate  # Вызывается после перехода на новый файл
+        self.day = clock.now().strftime('%Y-%m-%d')
+        super().__init__(self._path(self.day), encoding=encoding, delay=True)
+
+    def _path(self, day: str) -> str:
+        return os.path.abspath(os.path.join(self.log_dir, f"{day}{self.suffix}"))
+
+    def _rollover(self, record: logging.LogRecord) -> None:
+        day = clock.to_moscow(record.created).strftime('%Y-%m-%d')
+        if day > self.day:
+            # Новые сутки — закрываем вчерашний файл и пишем в новый
+            self.acquire()
+            try:
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+                self.day = day
+                self.baseFilename = self._path(day)
+            finally:
+                self.release()
+            if self.on_rotate is not None:
+                self.on_rotate()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._rollover(record)
+        super().emit(record)
+
+
+class JsonLinesHandler(MoscowDailyFileHandler):
+    """
+    Структурированный лог log/YYYY-MM-DD.jsonl: одна JSON-запись на строку с полями
+    ts, level, user, proxy (host:port), marketplace, company, flow_id, message.
+
+    Рядом ведётся разреженный индекс YYYY-MM-DD.jsonl.idx: строка "YYYY-MM-DDTHH:MM смещение"
+    на первую запись каждой минуты. По нему query_logs.py сразу переходит к нужному времени.
+    При сжатии архиватор переводит индекс в YYYY-MM-DD.jsonl.gz.idx (см. LogArchiver).
+    """
+
+    suffix = '.jsonl'
+
+    def __init__(self, log_dir: str, on_rotate=None) -> None:
+        super().__init__(log_dir, on_rotate=on_rotate, encoding=None)
+        self.minute = None  # Последняя минута, записанная в индекс
+
+    def _open(self):
+        self.minute = self._last_indexed_minute()
+        return open(self.baseFilename, 'ab')
+
+    def _last_indexed_minute(self):
+        try:
+            with open(f"{self.baseFilename}.idx", 'r', encoding='utf-8') as f:
+                lines = f.read().split()
+            return lines[-2] if len(lines) >= 2 else None
+        except OSError:
+            return None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._rollover(record)
+            ts = clock.to_moscow(record.created)
+            data = {'ts': ts.isoformat(), 'level': record.levelname}
+            for field in JSONL_FIELDS:
+                data[field] = getattr(record, field, None)
+            if data['proxy']:
+                data['proxy'] = route_key(data['proxy'])  # Без логина и пароля прокси
+            data['message'] = record.getMessage()
+            line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+            self.acquire()
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                minute = ts.strftime('%Y-%m-%dT%H:%M')
+                if minute != self.minute:
+                    with open(f"{self.baseFilename}.idx", 'a', encoding='utf-8') as idx:
+                        idx.write(f"{minute} {self.stream.tell()}\n")
+                    self.minute = minute
+                self.stream.write(line)
+                self.stream.flush()
+            finally:
+                self.release()
+        except Exception:
+            self.handleError(record)
+
+
+class LogArchiver:
+    """
+    Обслуживание каталога логов в фоне: сжатие дней раньше вчерашнего (.log, .jsonl) в .gz
+    и удаление старых архивов сверх лимита по возрасту или суммарному размеру.
+
+    Структурированный лог сжимается отдельным членом gzip на каждую минуту индекса, а индекс
+    YYYY-MM-DD.jsonl.gz.idx хранит смещения членов в сжатом файле: query_logs.py распаковывает
+    архив с нужной минуты, а не с начала дня.
+    """
+
+    def __init__(self, log_dir: str, max_age_days: int = 90, max_bytes: int = 500 * 1024 * 1024) -> None:
+        self.log_dir = log_dir
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def run_async(self) -> None:
+        """Запуск обслуживания в отдельном потоке (не блокирует запись логов)"""
+
+        threading.Thread(target=self.run, name="LogArchiver", daemon=True).start()
+
+    def run(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return  # Обслуживание уже идёт
+        try:
+            self._compress()
+            self._enforce_retention()
+        except Exception as e:
+            logging.getLogger("RemoteLogger").warning(f"Обслуживание каталога логов: {e}")
+        finally:
+            self._lock.release()
+
+    def _day_files(self) -> list[tuple[str, str, bool]]:
+        """[(дата, имя файла, сжат ли)] по возрастанию даты"""
+
+        files = []
+        for file_name in os.listdir(self.log_dir):
+            match = DAY_FILE.match(file_name)
+            if match:
+                files.append((match.group(1), file_name, bool(match.group(3))))
+        return sorted(files)
+
+    def _compress(self) -> None:
+        # Вчерашний файл ещё может быть открыт обработчиком, который не получил записей после полуночи
+        # (в Windows открытый файл не удаляется), поэтому сжимаются дни не позже позавчерашнего
+        yesterday = (clock.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        for day, file_name, compressed in self._day_files():
+            if compressed or day >= yesterday:
+                continue
+            path = os.path.join(self.log_dir, file_name)
+            tmp_path = f"{path}.gz.tmp"
+            idx_tmp_path = f"{path}.gz.idx.tmp"
+            try:
+                if os.path.exists(f"{path}.idx"):
+                    self._compress_indexed(path, tmp_path, idx_tmp_path)
+                    os.replace(tmp_path, f"{path}.gz")
+                    os.replace(idx_tmp_path, f"{path}.gz.idx")
+                else:
+                    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(tmp_path, f"{path}.gz")
+                os.remove(path)
+                if os.path.exists(f"{path}.idx"):
+                    os.remove(f"{path}.idx")
+            except OSError as e:
+                # Файл занят — повтор при следующем обслуживании, остальные файлы обрабатываются
+                logging.getLogger("RemoteLogger").warning(f"Сжатие {file_name}: {e}")
+                for leftover in (tmp_path, idx_tmp_path, f"{path}.gz", f"{path}.gz.idx"):
+                    if os.path.exists(leftover) and os.path.exists(path):
+                        os.remove(leftover)
+
+    @staticmethod
+    def _compress_indexed(path: str, tmp_path: str, idx_tmp_path: str) -> None:
+        """Сжатие .jsonl по минутам индекса: один член gzip на минуту, индекс смещений членов"""
+
+        entries = []
+        with open(f"{path}.idx", 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    entries.append((parts[0], int(parts[1])))
+
+        size = os.path.getsize(path)
+        bounds = sorted({offset for _, offset in entries if 0 < offset < size})
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst, \
+                open(idx_tmp_path, 'w', encoding='utf-8') as idx:
+            members = {}  # Смещение в исходном файле -> смещение члена в архиве
+            for start, end in zip([0] + bounds, bounds + [size]):
+                members[start] = dst.tell()
+                src.seek(start)
+                dst.write(gzip.compress(src.read(end - start)))
+            for minute, offset in entries:
+                if offset in members:
+                    idx.write(f"{minute} {members[offset]}\n")
+
+    def _enforce_retention(self) -> None:
+        oldest_allowed = (clock.now() - timedelta(days=self.max_age_days)).strftime('%Y-%m-%d')
+        archives = [(day, os.path.join(self.log_dir, file_name))
+                    for day, file_name, compressed in self._day_files() if compressed]
+
+        total = sum(os.path.getsize(path) for _, path in archives)
+        for day, path in archives:
+            if day >= oldest_allowed and total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+            for idx_path in (f"{path}.idx", f"{path[:-3]}.idx"):
+                if path.endswith('.jsonl.gz') and os.path.exists(idx_path):
+                    os.remove(idx_path)
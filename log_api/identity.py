@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import requests
+
+from typing import Optional
+from urllib.parse import urlsplit
+
+DIRECT = 'direct'
+IPINFO_URL = 'https://ipinfo.io/json'
+
+
+def route_key(proxy: Optional[str]) -> str:
+    """Ключ сетевого маршрута: 'direct' или host:port прокси (без логина и пароля)"""
+
+    if not proxy:
+        return DIRECT
+    parts = urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+    return f"{parts.hostname}:{parts.port}"
+
+
+class NetworkIdentityCache:
+    """
+    Кэш внешнего IP, города и страны по маршруту выхода в интернет (напрямую или через прокси).
+
+    get() никогда не ходит в сеть: возвращает то, что есть в кэше, а устаревшие и отсутствующие
+    записи обновляются в фоновом потоке. Кэш сохраняется на диск и переживает перезапуск.
+    """
+
+    def __init__(self, path: str = os.path.join('log', 'identity.json'), ttl: int = 3600,
+                 timeout: int = 10) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self._entries = self._load()  # Ключ маршрута -> {'ip', 'city', 'country', 'updated'}
+        self._proxies = {}            # Ключ маршрута -> строка прокси для запроса
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+
+        self._thread = threading.Thread(target=self._run, name="NetworkIdentity", daemon=True)
+        self._thread.start()
+
+    def get(self, proxy: Optional[str] = None) -> dict:
+        """Данные маршрута из кэша (пустой словарь, если ещё не получены). Не блокирует"""
+
+        key = route_key(proxy)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry.get('updated', 0) > self.ttl:
+                self._schedule(key, proxy)
+            return dict(entry) if entry else {}
+
+    def _schedule(self, key: str, proxy: Optional[str]) -> None:
+        if key in self._queued:
+            return
+        self._proxies[key] = proxy
+        self._queued.add(key)
+        self._wake.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._queued:
+                    self._wake.wait()
+                key = next(iter(self._queued))
+                proxy = self._proxies.get(key)
+
+            entry = self._fetch(proxy)
+
+            with self._lock:
+                self._queued.discard(key)
+                if entry:
+                    self._entries[key] = entry
+                    self._save()
+
+            if not entry:
+                # Не долбим ipinfo при отсутствии сети
+                time.sleep(self.timeout)
+
+    def _fetch(self, proxy: Optional[str]) -> dict:
+        proxies = {'http': proxy, 'https': proxy} if proxy else None
+        try:
+            response = requests.get(IPINFO_URL, proxies=proxies, timeout=self.timeout, verify=False)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logging.getLogger("RemoteLogger").warning(f"get_info ({route_key(proxy)}): {e}")
+            return {}
+        return {
+            'ip': data.get('ip'),
+            'city': data.get('city'),
+            'country': data.get('country'),
+            'updated': time.time()
+        }
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        # Атомарная запись: сначала во временный файл, затем замена
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.getLogger("RemoteLogger").warning(f"Сохранение кэша сетевых данных: {e}")
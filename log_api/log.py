@@ -1,43 +1,41 @@
 import os
+import queue
 import logging
-
-import requests
 import warnings
 
-from contextlib import suppress
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone, timedelta
+from logging.handlers import QueueHandler, QueueListener
+
+from datetime import datetime
 from urllib3.exceptions import InsecureRequestWarning
 
-from config import LOG_SERVER_URL
+from config import DB_URL, LOG_SERVER_URL
+from settings import LOG_TRANSPORT, LOG_HTTP_BATCH, LOG_QUEUE_SIZE, LOG_QUEUE_POLICY, LOG_JSONL, LOG_FLOW_SAMPLING
+from .clock import clock
+from .shipper import LogShipper
+from .transport import create_transport
+from .coalesce import LogCoalescer
+from .identity import NetworkIdentityCache
+from .context import current_context
+from .sampling import auth_flow, capture
+from .metrics import metrics
+from .handlers import MoscowDailyFileHandler, JsonLinesHandler, LogArchiver
 
 # Отключение предупреждений об SSL-сертификатах (используется verify=False)
 warnings.simplefilter("ignore", InsecureRequestWarning)
 
 
-def get_moscow_time(timeout: int = 60, log_api: bool = False) -> datetime:
-    """Получение текущего времени по Москве с внешнего API. При сбое возвращается локальное время с UTC+3"""
+def get_moscow_time() -> datetime:
+    """Текущее время по Москве из процессных часов (без сетевого запроса)"""
 
-    try:
-        response = requests.get("https://yandex.com/time/sync.json?geo=213",
-                                timeout=timeout, verify=False)
-        response.raise_for_status()
-        data = response.json()
-        moscow_time = datetime.fromtimestamp((data.get('time') / 1000),
-                                             tz=timezone(timedelta(hours=3))).replace(tzinfo=None)
-        return moscow_time
-    except Exception as e:
-        if not log_api:
-            with suppress(Exception):
-                logger.error(description=f"Ошибка при получении времени: {e}")
-        return datetime.now(tz=timezone(timedelta(hours=3))).replace(tzinfo=None)
+    return clock.now()
 
 
 class MoscowFormatter(logging.Formatter):
     """Кастомный форматтер логов, использующий московское время вместо UTC"""
 
     def formatTime(self, record, date_fmt=None):
-        moscow_time = get_moscow_time(timeout=5, log_api=True)
+        # Время создания записи, а не вывода (запись может полежать в очереди)
+        moscow_time = clock.to_moscow(record.created)
         if date_fmt:
             return moscow_time.strftime(date_fmt)
         else:
@@ -53,13 +51,24 @@ class RemoteLogger:
     """
     def __init__(self) -> None:
         self.server_url = LOG_SERVER_URL
-        self.executor = ThreadPoolExecutor(max_workers=10)  # Асинхронная отправка логов
 
         log_dir = "log"
         os.makedirs(log_dir, exist_ok=True)
 
-        # Путь к лог-файлу с датой в названии
-        log_file = os.path.join(log_dir, f"{get_moscow_time(timeout=5, log_api=True).strftime('%Y-%m-%d')}.log")
+        # Кэш IP/города/страны по маршрутам (напрямую и через каждый прокси)
+        self.identity = NetworkIdentityCache()
+
+        # Пакетная асинхронная отправка логов (не блокирует UI) на API-сервер или напрямую в БД
+        transport = create_transport(LOG_TRANSPORT, server_url=self.server_url, db_url=DB_URL,
+                                     http_batch=LOG_HTTP_BATCH)
+        self.shipper = LogShipper(transport, max_queue=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY,
+                                  enrich=self._enrich)
+
+        metrics.gauge('proxybrowser_log_shipper', "Очередь отправки логов: глубина, ожидающие на диске и счётчики",
+                      ('stat',), callback=lambda: {(name,): value for name, value in self.shipper.stats().items()})
+
+        # Склейка повторяющихся записей (ретраи, циклы ожидания) перед отправкой
+        self.coalescer = LogCoalescer(emit=self.shipper.submit)
 
         self.logger = logging.getLogger("RemoteLogger")
         self.logger.setLevel(logging.INFO)
@@ -68,8 +77,9 @@ class RemoteLogger:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
 
-        # Запись логов в файл
-        file_handler = logging.FileHandler(log_file)
+        # Запись логов в файл с датой в названии, смена файла в полночь по Москве
+        self.archiver = LogArchiver(log_dir)
+        file_handler = MoscowDailyFileHandler(log_dir, on_rotate=self.archiver.run_async)
         file_handler.setLevel(logging.INFO)
 
         # Формат логов с московским временем
@@ -77,12 +87,26 @@ class RemoteLogger:
         console_handler.setFormatter(formatter)
         file_handler.setFormatter(formatter)
 
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        handlers = [console_handler, file_handler]
+
+        # Структурированный лог с индексом по времени (для query_logs.py)
+        if LOG_JSONL:
+            jsonl_handler = JsonLinesHandler(log_dir, on_rotate=self.archiver.run_async)
+            jsonl_handler.setLevel(logging.INFO)
+            handlers.append(jsonl_handler)
+
+        # Диск и консоль обслуживает отдельный поток, вызывающий поток только кладёт запись в очередь
+        log_queue = queue.SimpleQueue()
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.logger.addHandler(QueueHandler(log_queue))
+
+        # Сжатие прошлых дней и очистка по лимитам
+        self.archiver.run_async()
 
     def error(self, user: str = None, description: str = '', proxy: str = None) -> None:
         # Лог уровня ERROR
-        self.logger.error(f"{description}")
+        self.logger.error(f"{description}", extra=self._extra(user, proxy))
         self.log_action('ERROR', user=user, description=description, proxy=proxy)
 
     def waring(self, user: str = None, description: str = '', proxy: str = None):
@@ -91,58 +115,62 @@ class RemoteLogger:
 
     def info(self, user: str = None, description: str = None, proxy: str = None) -> None:
         # Лог уровня INFO
-        self.logger.info(f"{description}")
+        self.logger.info(f"{description}", extra=self._extra(user, proxy))
         self.log_action('INFO', user=user, description=description, proxy=proxy)
 
-    def log_action(self, action: str, user: str, description: str = '', proxy: str = None) -> None:
-        # Отложенная отправка лога на сервер (не блокирует UI)
-        self.executor.submit(self._send_log, action, user, description, proxy)
-
-    def _send_log(self, action: str, user: str, description: str = '', proxy: str = None) -> None:
-        # Формирование и отправка JSON-лога на сервер
-        info = self.get_info()
+    @staticmethod
+    def _extra(user: str, proxy: str) -> dict:
+        # Поля для структурированного лога: пользователь, прокси и контекст потока (маркетплейс, компания, flow_id)
+        return {**current_context(), 'user': user, 'proxy': proxy}
 
-        log_data = {
-            "timestamp": get_moscow_time(timeout=5, log_api=True).isoformat(),
+    def log_action(self, action: str, user: str, description: str = '', proxy: str = None) -> None:
+        # Постановка лога в очередь отправки на сервер (не блокирует UI)
+        record = {
+            "timestamp": get_moscow_time().isoformat(),
             "timestamp_user": datetime.now().isoformat(),
             "action": action,
             "user": user,
-            "ip_address": info.get('ip') or 'Unknown',
-            "city":  info.get('city') or 'Unknown',
-            "country": info.get('country') or 'Unknown',
             "proxy": proxy,
+            "marketplace": current_context().get('marketplace'),
             "description": description
         }
+        if not capture(record):
+            self.coalescer.submit(record)
 
-        try:
-            response = requests.post(self.server_url, json=log_data, timeout=60)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Ошибка отправки лога на сервер: {e}")
-        except Exception as e:
-            self.logger.error(f"log_action: {e}")
+    def auth_flow(self, prefix: str = ''):
+        """
+        Блок потока авторизации: при успехе на сервер уходит одна итоговая запись с длительностью шагов,
+        при ошибке — все записи потока (см. sampling.AuthFlow). При LOG_FLOW_SAMPLING = False записи
+        не буферизуются, учитывается только исход для метрик.
+        """
 
-    def get_info(self) -> dict:
+        return auth_flow(self.coalescer.submit, prefix, sample=LOG_FLOW_SAMPLING)
+
+    def _enrich(self, batch: list[dict]) -> None:
+        # Сетевые данные берутся из кэша, запись никогда не ждёт гео-запроса
+        info = self.get_info()
+        for log_data in batch:
+            log_data["ip_address"] = info.get('ip') or 'Unknown'
+            log_data["city"] = info.get('city') or 'Unknown'
+            log_data["country"] = info.get('country') or 'Unknown'
+            if log_data.get("proxy"):
+                log_data["proxy_ip"] = self.get_info(log_data["proxy"]).get('ip')
+
+    def close(self) -> None:
+        # Отправка оставшихся логов и запись локальной очереди при выходе из приложения
+        self.coalescer.close()
+        self.shipper.close()
+        self.listener.stop()
+
+    def get_info(self, proxy: str = None) -> dict:
         """
-        Получение информации об IP, городе и стране пользователя с ipinfo.io.
-        Используется при отправке логов.
+        Информация об IP, городе и стране для прямого выхода или выхода через прокси.
+        Берётся из кэша, обновляемого в фоне с ipinfo.io. Используется при отправке логов.
         """
 
-        try:
-            response = requests.get('https://ipinfo.io/json', timeout=5, verify=False)
-            response.raise_for_status()
-            data = response.json()
-            return {
-                'ip': data.get('ip'),
-                'city': data.get('city'),
-                'country': data.get('country')
-            }
-        except requests.RequestException as e:
-            self.logger.error(f"get_info: {e}")
-            return {}
-        except Exception as e:
-            self.logger.error(f"get_info: {e}")
-
-
-# Глобальный экземпляр логгера
+        return self.identity.get(proxy)
+
+
+# Глобальный экземпляр логгера и фоновая синхронизация часов
+clock.start()
 logger = RemoteLogger()
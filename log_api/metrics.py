@@ -0,0 +1,199 @@
+import os
+import bisect
+import getpass
+import logging
+import threading
+
+from typing import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм по умолчанию, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: dict = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in (extra or {}).items()]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            for label_values, value in self._values.items():
+                yield self.name, label_values, {}, value
+
+
+class Histogram:
+    """Гистограмма длительностей (секунды) с накопительными корзинами"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # Метки -> [счётчики корзин..., +Inf], сумма
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = counts, total + value
+
+    def samples(self):
+        with self._lock:
+            for label_values, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, '+Inf'), counts):
+                    cumulative += count
+                    yield f"{self.name}_bucket", label_values, {'le': bound}, cumulative
+                yield f"{self.name}_sum", label_values, {}, total
+                yield f"{self.name}_count", label_values, {}, cumulative
+
+
+class Gauge:
+    """Текущее значение, вычисляемое при каждом чтении метрик: callback возвращает {(метки...): значение}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), callback: Callable[[], dict] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+
+    def samples(self):
+        if self.callback is None:
+            return
+        try:
+            values = self.callback()
+        except Exception as e:
+            logging.getLogger("RemoteLogger").warning(f"Метрика {self.name}: {e}")
+            return
+        for label_values, value in values.items():
+            yield self.name, label_values, {}, value
+
+
+class MetricsRegistry:
+    """
+    Метрики приложения в текстовом формате Prometheus.
+
+    Экспорт (по настройкам): HTTP на 127.0.0.1:METRICS_PORT (/metrics) и/или файл в каталоге
+    METRICS_TEXTFILE_DIR для textfile-коллектора node-exporter/windows_exporter, перезаписываемый раз в interval секунд.
+    Ко всем рядам добавляется метка os_user — на терминальном сервере приложение запускают несколько пользователей.
+    Метрики регистрируются один раз (обычно на уровне модуля); значения нескольких объектов одного вида
+    различаются метками.
+    """
+
+    def __init__(self) -> None:
+        self.metrics = {}
+        self.constant_labels = {'os_user': getpass.getuser()}
+        self._stop = threading.Event()
+        self._server = None
+
+    def _register(self, metric):
+        """Имя метрики уникально: повторная регистрация — ошибка, иначе одна из метрик молча пропала бы"""
+
+        if self.metrics.setdefault(metric.name, metric) is not metric:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = (), callback: Callable[[], dict] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, label_values, extra, value in metric.samples():
+                lines.append(f"{name}{_labels(metric.labels, label_values, {**extra, **self.constant_labels})} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def start(self, port: int = None, textfile_dir: str = None, interval: float = 15) -> None:
+        """Запуск экспорта. Без port и textfile_dir метрики только собираются в памяти"""
+
+        self._stop.clear()
+        if port:
+            try:
+                self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+            except OSError as e:
+                # Порт занят (например, второй пользователь терминального сервера) — остаётся экспорт в файл
+                logging.getLogger("RemoteLogger").warning(f"Метрики: порт {port} недоступен: {e}")
+            else:
+                threading.Thread(target=self._server.serve_forever, name="MetricsHTTP", daemon=True).start()
+
+        if textfile_dir:
+            path = os.path.join(textfile_dir, f"proxybrowser_{self.constant_labels['os_user']}.prom")
+            threading.Thread(target=self._write_loop, args=(path, interval), name="MetricsFile", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()  # Освобождение порта для повторного start()
+            self._server = None
+
+    def _handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _write_loop(self, path: str, interval: float) -> None:
+        while True:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                    f.write(self.render())
+                os.replace(f"{path}.tmp", path)  # Коллектор не должен увидеть недописанный файл
+            except OSError as e:
+                logging.getLogger("RemoteLogger").warning(f"Метрики: запись {path}: {e}")
+            if self._stop.wait(interval):
+                return
+
+
+# Глобальный реестр метрик приложения
+metrics = MetricsRegistry()
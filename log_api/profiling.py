@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+
+from collections import Counter
+from typing import Callable, Optional
+
+PROFILE_DIR = os.path.join("log", "profiles")
+UNSAFE = re.compile(r'[^\w.-]+')
+
+
+class AppProfiler:
+    """
+    Профилирование работающего приложения по запросу (переменная окружения PB_PROFILE или горячие клавиши).
+
+    - cProfile главного (Qt) потока: запуск окна входа, обработчики интерфейса
+    - выборка стеков всех потоков с частотой interval (запуск браузера, отправка и запись логов и т.д.)
+    - tracemalloc: снимок при старте и разница с ним при остановке, промежуточные снимки по запросу во время профилирования
+
+    Результаты пишутся в log/profiles/ с пользователем, открытыми рынками и числом браузеров в имени файла.
+    """
+
+    def __init__(self, interval: float = 0.005, top: int = 30) -> None:
+        self.interval = interval
+        self.top = top
+        self.describe: Optional[Callable[[], tuple[str, list[str], int]]] = None  # (пользователь, рынки, браузеров)
+
+        self._profile = None
+        self._samples = Counter()  # (поток, стек) -> число выборок
+        self._stop = threading.Event()
+        self._sampler = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self) -> None:
+        """Запуск профилирования. Вызывается из главного потока"""
+
+        with self._lock:
+            if self.running:
+                return
+            self._samples.clear()
+            self._stop.clear()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+            self._snapshot = tracemalloc.take_snapshot()
+            self._sampler = threading.Thread(target=self._sample, name="ProfilerSampler", daemon=True)
+            self._sampler.start()
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        logging.getLogger("RemoteLogger").info("Профилирование запущено")
+
+    def stop(self) -> Optional[str]:
+        """Остановка и запись результатов. Возвращает общий префикс путей файлов"""
+
+        with self._lock:
+            if not self.running:
+                return None
+            self._profile.disable()
+            profile, self._profile = self._profile, None
+            self._stop.set()
+            self._sampler.join(5)
+
+            base = self._base_path()
+            profile.dump_stats(f"{base}_main.pstats")
+            with open(f"{base}_main.txt", 'w', encoding='utf-8') as f:
+                pstats.Stats(profile, stream=f).sort_stats('cumulative').print_stats(self.top)
+            self._write_samples(base)
+            self._write_memory(base, tracemalloc.take_snapshot())
+            tracemalloc.stop()
+            self._snapshot = None
+        logging.getLogger("RemoteLogger").info(f"Профилирование остановлено: {base}_*")
+        return base
+
+    def toggle(self) -> None:
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def memory_snapshot(self) -> Optional[str]:
+        """
+        Снимок памяти и разница с предыдущим (top-N строк кода по приросту).
+        Только во время профилирования: tracemalloc запускает и останавливает start()/stop()
+        """
+
+        with self._lock:
+            if not self.running:
+                logging.getLogger("RemoteLogger").info("Снимок памяти доступен во время профилирования (Ctrl+Shift+P)")
+                return None
+            snapshot = tracemalloc.take_snapshot()
+            path = self._base_path()
+            self._write_memory(path, snapshot)
+            self._snapshot = snapshot
+        return path
+
+    def _base_path(self) -> str:
+        user, markets, drivers = self.describe() if self.describe is not None else ('', [], 0)
+        parts = [time.strftime('%Y-%m-%d_%H-%M-%S'), user or 'nouser', '+'.join(markets) or 'nomarkets', f"{drivers}wd"]
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        return os.path.join(PROFILE_DIR, UNSAFE.sub('-', '_'.join(parts))[:150])
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._samples[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+
+    def _write_samples(self, base: str) -> None:
+        # Свёрнутые стеки (speedscope.app, flamegraph.pl) и топ функций по потокам
+        with open(f"{base}_threads.folded", 'w', encoding='utf-8') as f:
+            for (thread, stack), count in self._samples.items():
+                f.write(f"{';'.join((thread, *stack))} {count}\n")
+
+        own, total = Counter(), Counter()
+        for (thread, stack), count in self._samples.items():
+            own[(thread, stack[-1] if stack else '?')] += count
+            for function in set(stack):
+                total[(thread, function)] += count
+        with open(f"{base}_threads.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Выборок: {sum(self._samples.values())}, интервал {self.interval * 1000:.0f} мс\n\n")
+            f.write("Собственное время (поток, функция):\n")
+            for (thread, function), count in own.most_common(self.top):
+                f.write(f"{count:>8}  {thread}  {function}\n")
+            f.write("\nВключая вложенные вызовы:\n")
+            for (thread, function), count in total.most_common(self.top):
+                f.write(f"{count:>8}  {thread}  {function}\n")
+
+    def _write_memory(self, base: str, snapshot) -> None:
+        with open(f"{base}_memory.txt", 'w', encoding='utf-8') as f:
+            current, peak = tracemalloc.get_traced_memory()
+            f.write(f"Отслеживается: {current / 2 ** 20:.1f} МБ, пик {peak / 2 ** 20:.1f} МБ\n\n")
+            if self._snapshot is not None:
+                f.write("Прирост с предыдущего снимка:\n")
+                for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+                f.write("\n")
+            f.write("Крупнейшие размещения:\n")
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{stat}\n")
+
+
+# Глобальный профилировщик приложения
+profiler = AppProfiler()
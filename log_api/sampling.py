@@ -0,0 +1,119 @@
+import time
+import contextvars
+
+from contextlib import contextmanager
+from typing import Callable
+
+from .metrics import metrics
+from .context import current_context
+from database.models import LOG_LOGIN_SUCCESS
+
+_flow = contextvars.ContextVar('log_flow', default=None)
+
+AUTH_TOTAL = metrics.counter('proxybrowser_auth_total', "Завершённые автоавторизации по исходу",
+                             ('marketplace', 'outcome'))
+AUTH_SECONDS = metrics.histogram('proxybrowser_auth_duration_seconds', "Длительность автоавторизации",
+                                 ('marketplace', 'outcome'))
+
+
+class AuthFlow:
+    """
+    Буфер удалённых логов одного потока авторизации (tail-based sampling).
+
+    Записи INFO копятся в памяти. Если поток завершился входом в ЛК без ошибок, на сервер уходит
+    одна итоговая запись с длительностью шагов. При ошибке, исключении или незавершённом входе
+    отправляются все накопленные записи, а дальнейшие записи потока идут без буферизации.
+    Локальные логи (консоль, файлы) пишутся как обычно. При sample=False записи не буферизуются,
+    определяется только исход потока (для метрик).
+    """
+
+    def __init__(self, emit: Callable[[dict], None], prefix: str = '', sample: bool = True) -> None:
+        self.emit = emit
+        self.sample = sample
+        self.prefix = prefix  # Начало сообщений потока ("Ozon - Компания: "), в итоговой записи убирается из шагов
+        self.records = []  # [(time.monotonic(), запись)]
+        self.started = time.monotonic()
+        self.success = None  # Запись о входе в ЛК
+        self.failed = False
+
+    def capture(self, record: dict) -> bool:
+        """Забирает запись в буфер. False — запись нужно отправить сразу"""
+
+        if record.get('action') != 'INFO':
+            self.fail()
+            return False
+        if (record.get('description') or '').endswith(LOG_LOGIN_SUCCESS):
+            self.success = record
+        if self.failed or not self.sample:
+            return False
+
+        self.records.append((time.monotonic(), record))
+        return True
+
+    def fail(self) -> None:
+        """Поток неуспешен: отправка всей накопленной детализации"""
+
+        self.failed = True
+        records, self.records = self.records, []
+        for _, record in records:
+            self.emit(record)
+
+    @property
+    def outcome(self) -> str:
+        if self.failed:
+            return 'error'
+        return 'success' if self.success is not None else 'unconfirmed'
+
+    def finish(self) -> None:
+        marketplace = current_context().get('marketplace') or ''
+        AUTH_TOTAL.inc(marketplace, self.outcome)
+        AUTH_SECONDS.observe(time.monotonic() - self.started, marketplace, self.outcome)
+
+        if not self.sample:
+            return  # Все записи, включая вход в ЛК, уже отправлены без буферизации
+        if self.failed or self.success is None:
+            self.fail()
+            return
+        self.emit(self.summary())
+
+    def summary(self) -> dict:
+        """Итоговая запись: шаги с длительностью и исходное сообщение о входе в конце"""
+
+        finished = time.monotonic()
+        steps = []
+        for index, (started, record) in enumerate(self.records):
+            if record is self.success:
+                break
+            ended = self.records[index + 1][0] if index + 1 < len(self.records) else finished
+            name = (record.get('description') or '').removeprefix(self.prefix)
+            steps.append(f"{name} {ended - started:.1f} с")
+
+        total = finished - self.started
+        description = self.success.get('description') or ''
+        if steps:
+            description = (f"{self.prefix}Шаги: {'; '.join(steps)}. Всего {total:.1f} с. "
+                           f"{description.removeprefix(self.prefix)}")
+        return dict(self.success, description=description)
+
+
+@contextmanager
+def auth_flow(emit: Callable[[dict], None], prefix: str = '', sample: bool = True):
+    """Блок with, внутри которого удалённые логи текущего потока выполнения буферизуются (см. AuthFlow)"""
+
+    flow = AuthFlow(emit, prefix, sample)
+    token = _flow.set(flow)
+    try:
+        yield flow
+    except BaseException:
+        flow.failed = True
+        raise
+    finally:
+        _flow.reset(token)
+        flow.finish()
+
+
+def capture(record: dict) -> bool:
+    """Передача записи в буфер активного потока авторизации. False — потока нет или запись идёт сразу"""
+
+    flow = _flow.get()
+    return flow is not None and flow.capture(record)
@@ -0,0 +1,222 @@
+import time
+import logging
+import threading
+
+from collections import deque
+from typing import Callable, Optional
+
+from .spool import LogSpool
+from .transport import RejectedBatch
+
+POLICIES = ('drop_oldest', 'drop_newest', 'coalesce')
+
+
+class LogShipper:
+    """
+    Пакетная отправка логов.
+
+    Записи копятся в ограниченной очереди в памяти и пакетами (по batch_size записей или по возрасту
+    flush_interval) переносятся в дисковую очередь LogSpool. Отдельный поток отправляет записи из неё
+    через транспорт (HTTP или напрямую в БД, см. transport.py) и подтверждает отправленное.
+    При недоступности получателя записи остаются на диске и отправляются позже, в том числе после перезапуска.
+    Пакет, отклонённый получателем по содержимому (RejectedBatch), делится пополам до отдельных записей:
+    отклонённые записи переносятся в log/spool/rejected.jsonl, остальные отправляются, очередь не останавливается.
+
+    Политики переполнения очереди:
+    - drop_oldest: отбрасывается самая старая запись
+    - drop_newest: отбрасывается новая запись
+    - coalesce: одинаковые записи склеиваются в одну со счётчиком repeat, иначе — как drop_oldest
+    """
+
+    def __init__(self, transport, spool: LogSpool = None, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_queue: int = 5000, policy: str = 'coalesce', max_backoff: float = 60,
+                 enrich: Optional[Callable[[list[dict]], None]] = None) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика очереди логов: {policy}")
+
+        self.transport = transport  # Объект с методами send(batch) и close()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.policy = policy
+        self.max_backoff = max_backoff
+        self.enrich = enrich  # Дополнение пакета перед записью на диск (IP, город и т.д.)
+        self.spool = spool if spool is not None else LogSpool()
+
+        self._queue = deque()
+        self._pending = {}  # Ключ записи -> запись в очереди (для coalesce)
+        self._oldest = None  # time.monotonic() самой старой записи в очереди
+        self._cond = threading.Condition()
+        self._closed = False
+        self._spooled = threading.Event()  # Сигнал отправителю о новых записях на диске
+        self._counters = {'queued': 0, 'spooled': 0, 'sent': 0, 'dropped': 0, 'coalesced': 0, 'failed_batches': 0,
+                          'rejected': 0}
+
+        self._thread = threading.Thread(target=self._run, name="LogShipper", daemon=True)
+        self._thread.start()
+        self._sender = threading.Thread(target=self._run_sender, name="LogSender", daemon=True)
+        self._sender.start()
+
+    @staticmethod
+    def _key(record: dict) -> tuple:
+        return record.get('action'), record.get('user'), record.get('proxy'), record.get('description')
+
+    def submit(self, record: dict) -> bool:
+        """Постановка записи в очередь. Не блокирует. Возвращает False, если запись отброшена"""
+
+        with self._cond:
+            if self._closed:
+                self._counters['dropped'] += 1
+                return False
+
+            if self.policy == 'coalesce':
+                queued = self._pending.get(self._key(record))
+                if queued is not None:
+                    queued['repeat'] = queued.get('repeat', 1) + record.get('repeat', 1)
+                    queued['timestamp_last'] = record.get('timestamp')
+                    self._counters['coalesced'] += 1
+                    return True
+
+            if len(self._queue) >= self.max_queue:
+                if self.policy == 'drop_newest':
+                    self._counters['dropped'] += 1
+                    return False
+                self._forget(self._queue.popleft())
+                self._counters['dropped'] += 1
+
+            self._queue.append(record)
+            if self.policy == 'coalesce':
+                self._pending[self._key(record)] = record
+            self._counters['queued'] += 1
+
+            # Будим поток на первой записи (отсчёт возраста) и на полном пакете
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            elif len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def stats(self) -> dict:
+        """
+        Счётчики: queued, spooled, sent, dropped, coalesced, failed_batches, rejected,
+        глубина очереди в памяти depth и число неотправленных записей на диске pending
+        """
+
+        with self._cond:
+            counters = dict(self._counters, depth=len(self._queue))
+        counters['pending'] = self.spool.pending()
+        counters['dropped'] += self.spool.dropped
+        return counters
+
+    def flush(self) -> None:
+        """Внеочередная отправка накопленных записей"""
+
+        with self._cond:
+            if self._queue:
+                self._oldest = 0
+                self._cond.notify()
+
+    def close(self, timeout: float = 10) -> None:
+        """Остановка: оставшиеся записи сохраняются на диск, отправитель получает timeout на досылку"""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self.spool.close()
+        self._spooled.set()
+        self._sender.join(timeout)
+        self.transport.close()
+
+    def _forget(self, record: dict) -> None:
+        if self.policy == 'coalesce' and self._pending.get(self._key(record)) is record:
+            del self._pending[self._key(record)]
+
+    def _take_batch(self) -> list[dict]:
+        """Ожидание готового пакета (по размеру, возрасту или закрытию)"""
+
+        with self._cond:
+            while True:
+                if self._queue:
+                    age = time.monotonic() - self._oldest
+                    if self._closed or len(self._queue) >= self.batch_size or age >= self.flush_interval:
+                        break
+                    self._cond.wait(self.flush_interval - age)
+                elif self._closed:
+                    return []
+                else:
+                    self._cond.wait()
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            for record in batch:
+                self._forget(record)
+            self._oldest = time.monotonic() if self._queue else None
+            return batch
+
+    def _run(self) -> None:
+        # Перенос записей из памяти на диск
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                if self.enrich is not None:
+                    self.enrich(batch)
+                self.spool.append(batch)
+            except Exception as e:
+                logging.getLogger("RemoteLogger").error(f"Ошибка записи логов в очередь на диске: {e}")
+                with self._cond:
+                    self._counters['dropped'] += len(batch)
+                continue
+            with self._cond:
+                self._counters['spooled'] += len(batch)
+            self._spooled.set()
+
+    def _run_sender(self) -> None:
+        # Отправка с диска на сервер; при ошибке — экспоненциальная пауза, записи остаются в очереди
+        backoff = 1
+        while True:
+            batch = self.spool.read(self.batch_size)
+            if not batch:
+                if self._closed:
+                    return
+                self._spooled.wait()
+                self._spooled.clear()
+                continue
+
+            if self._send(batch):
+                self.spool.ack(batch[-1]['seq'])
+                backoff = 1
+            elif self._closed:
+                return
+            else:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _send(self, batch: list[dict]) -> bool:
+        """True — пакет отправлен или отклонённые записи отложены, False — получатель недоступен, нужен повтор"""
+
+        try:
+            self.transport.send(batch)
+        except RejectedBatch as e:
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                if not self._send(batch[:middle]):
+                    return False
+                self.spool.ack(batch[middle - 1]['seq'])  # При повторе отправленная половина не дублируется
+                return self._send(batch[middle:])
+            logging.getLogger("RemoteLogger").error(f"Запись лога отклонена получателем: {e}")
+            self.spool.reject(batch, str(e))
+            with self._cond:
+                self._counters['rejected'] += len(batch)
+            return True
+        except Exception as e:
+            logging.getLogger("RemoteLogger").error(f"Ошибка отправки логов: {e}")
+            with self._cond:
+                self._counters['failed_batches'] += 1
+            return False
+
+        with self._cond:
+            self._counters['sent'] += len(batch)
+        return True
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+
+SEGMENT_SUFFIX = '.seg'
+REJECTED_FILE = 'rejected.jsonl'
+
+
+class LogSpool:
+    """
+    Надёжная очередь логов на диске (append-only сегменты в log/spool).
+
+    Каждая запись получает возрастающий порядковый номер seq и client_id установки, по которым
+    сервер может отбрасывать дубли. Отправленное подтверждается через ack(); неподтверждённые
+    сегменты остаются на диске и отправляются при следующем запуске.
+
+    fsync выполняется не чаще fsync_interval секунд, чтобы не платить за него на каждой записи.
+    """
+
+    def __init__(self, path: str = os.path.join('log', 'spool'), segment_records: int = 1000,
+                 fsync_interval: float = 1.0, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.path = path
+        self.segment_records = segment_records
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.client_id = self._load_client_id()
+        self._acked = self._read_cursor()  # Последний подтверждённый seq
+        self._segments = self._list_segments()  # [(first_seq, file_path)] по возрастанию
+        self._seq = max(self._acked, self._last_seq_on_disk())
+        self.dropped = 0  # Записей удалено при превышении max_bytes
+
+        self._active = None  # Текущий сегмент для записи (после запуска всегда новый)
+        self._active_count = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, records: list[dict]) -> None:
+        """Дописывает записи в сегмент, присваивая им client_id и seq"""
+
+        with self._lock:
+            for record in records:
+                if self._active is None or self._active_count >= self.segment_records:
+                    self._roll()
+                self._seq += 1
+                record['client_id'] = self.client_id
+                record['seq'] = self._seq
+                self._active.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                self._active_count += 1
+
+            # Сброс в ОС на каждой пачке (переживает падение процесса), fsync — пакетно
+            self._active.flush()
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def sync(self) -> None:
+        """Принудительный сброс активного сегмента на диск"""
+
+        with self._lock:
+            self._sync()
+
+    def read(self, limit: int) -> list[dict]:
+        """Первые limit неподтверждённых записей (в порядке seq)"""
+
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+            segments = list(self._segments)
+            acked = self._acked
+
+        records = []
+        for _, file_path in segments:
+            for record in self._read_segment(file_path):
+                if record.get('seq', 0) <= acked:
+                    continue
+                records.append(record)
+                if len(records) >= limit:
+                    return records
+        return records
+
+    def ack(self, seq: int) -> None:
+        """Подтверждение отправки всех записей до seq включительно; удаление отправленных сегментов"""
+
+        with self._lock:
+            if seq <= self._acked:
+                return
+            self._acked = seq
+            self._write_cursor()
+
+            # Сегмент отправлен целиком, если следующий начинается не позже seq + 1 (активный всегда последний)
+            while len(self._segments) > 1 and self._segments[1][0] <= seq + 1:
+                _, file_path = self._segments.pop(0)
+                self._remove(file_path)
+
+    def reject(self, records: list[dict], reason: str, max_bytes: int = 10 * 1024 * 1024) -> None:
+        """Перенос записей, отклонённых получателем, в rejected.jsonl (для разбора вручную, прежний файл — .1)"""
+
+        file_path = os.path.join(self.path, REJECTED_FILE)
+        with self._lock:
+            try:
+                if os.path.exists(file_path) and os.path.getsize(file_path) > max_bytes:
+                    os.replace(file_path, f"{file_path}.1")
+                with open(file_path, 'a', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps({'reason': reason, 'record': record}, ensure_ascii=False, default=str) + '\n')
+            except OSError as e:
+                logging.getLogger("RemoteLogger").warning(f"Сохранение отклонённых записей логов: {e}")
+
+    def pending(self) -> int:
+        """Количество записей, ожидающих отправки"""
+
+        with self._lock:
+            return self._seq - self._acked
+
+    def close(self) -> None:
+        with self._lock:
+            if self._active is not None:
+                self._sync()
+                self._active.close()
+                self._active = None
+
+    def _roll(self) -> None:
+        if self._active is not None:
+            self._sync()
+            self._active.close()
+        first_seq = self._seq + 1
+        file_path = os.path.join(self.path, f"{first_seq:012d}{SEGMENT_SUFFIX}")
+        self._active = open(file_path, 'a', encoding='utf-8')
+        self._active_count = 0
+        if not self._segments or self._segments[-1][1] != file_path:
+            self._segments.append((first_seq, file_path))
+        self._enforce_budget()
+
+    def _sync(self) -> None:
+        if self._active is not None:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+        self._last_sync = time.monotonic()
+
+    def _enforce_budget(self) -> None:
+        """Удаление самых старых сегментов, если очередь превысила max_bytes (например, сервер недоступен днями)"""
+
+        sizes = [os.path.getsize(file_path) for _, file_path in self._segments]
+        total = sum(sizes)
+        dropped = 0
+        while total > self.max_bytes and len(self._segments) > 1:
+            _, file_path = self._segments.pop(0)
+            last_seq = self._segments[0][0] - 1
+            dropped += max(0, last_seq - self._acked)
+            self._acked = max(self._acked, last_seq)
+            self._remove(file_path)
+            total -= sizes.pop(0)
+        if dropped:
+            self.dropped += dropped
+            self._write_cursor()
+            logging.getLogger("RemoteLogger").warning(f"Очередь логов превысила лимит, удалено записей: {dropped}")
+
+    def _list_segments(self) -> list[tuple[int, str]]:
+        segments = []
+        for file_name in os.listdir(self.path):
+            if file_name.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append((int(file_name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.path, file_name)))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _last_seq_on_disk(self) -> int:
+        if not self._segments:
+            return 0
+        first_seq, file_path = self._segments[-1]
+        last_seq = first_seq - 1
+        for record in self._read_segment(file_path):
+            last_seq = max(last_seq, record.get('seq', 0))
+        return last_seq
+
+    @staticmethod
+    def _read_segment(file_path: str) -> list[dict]:
+        records = []
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # Оборванная запись после аварийного завершения
+        except OSError:
+            pass
+        return records
+
+    def _load_client_id(self) -> str:
+        file_path = os.path.join(self.path, 'client_id')
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                client_id = f.read().strip()
+                if client_id:
+                    return client_id
+        except OSError:
+            pass
+        client_id = uuid.uuid4().hex
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(client_id)
+        return client_id
+
+    def _read_cursor(self) -> int:
+        try:
+            with open(os.path.join(self.path, 'cursor'), 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_cursor(self) -> None:
+        file_path = os.path.join(self.path, 'cursor')
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(self._acked))
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def _remove(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            logging.getLogger("RemoteLogger").warning(f"Удаление сегмента логов {file_path}: {e}")
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import inspect
+import logging
+import threading
+import contextvars
+
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+
+from settings import LOG_TRACE
+from .context import current_context
+
+TRACE_DIR = os.path.join("log", "traces")
+
+_trace = contextvars.ContextVar('log_trace', default=None)
+_disabled = nullcontext()
+
+
+class FlowTrace:
+    """События одного потока авторизации в формате Chrome trace event (открывается в Perfetto / chrome://tracing)"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.events = []
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: int, ended: int, args: dict) -> None:
+        event = {'name': name, 'cat': 'flow', 'ph': 'X', 'ts': started // 1000, 'dur': (ended - started) // 1000,
+                 'pid': self.pid, 'tid': threading.get_native_id()}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def save(self, path: str) -> None:
+        metadata = {'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': self.name}}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': [metadata, *self.events], 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+@contextmanager
+def _span(trace: FlowTrace, name: str, args: dict):
+    started = time.perf_counter_ns()
+    try:
+        yield
+    except BaseException as e:
+        args = {**args, 'error': type(e).__name__}
+        raise
+    finally:
+        trace.add(name, started, time.perf_counter_ns(), args)
+
+
+def span(name: str, **args):
+    """Интервал внутри трассируемого потока (with span('Ввод кода'): ...). Без активной трассы ничего не делает"""
+
+    trace = _trace.get()
+    if trace is None:
+        return _disabled
+    return _span(trace, name, args)
+
+
+def traced(name: str = None):
+    """Декоратор: вызов функции — интервал трассы. При LOG_TRACE = False функция возвращается без обёртки"""
+
+    def decorator(func):
+        if not LOG_TRACE:
+            return func
+        span_name = name or func.__qualname__.replace('.<locals>', '')
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                trace = _trace.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                with _span(trace, span_name, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _span(trace, span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def trace_flow(name: str):
+    """
+    Трассировка потока авторизации: все интервалы внутри блока сохраняются в
+    log/traces/<дата>_<flow_id>.json. При LOG_TRACE = False ничего не делает.
+    """
+
+    if not LOG_TRACE:
+        yield
+        return
+
+    trace = FlowTrace(name)
+    token = _trace.set(trace)
+    try:
+        with _span(trace, name, {}):
+            yield
+    finally:
+        _trace.reset(token)
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            flow_id = current_context().get('flow_id') or f"{os.getpid()}_{threading.get_ident()}"
+            trace.save(os.path.join(TRACE_DIR, f"{time.strftime('%Y-%m-%d_%H-%M-%S')}_{flow_id}.json"))
+        except OSError as e:
+            logging.getLogger("RemoteLogger").warning(f"Сохранение трассы: {e}")
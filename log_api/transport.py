@@ -0,0 +1,127 @@
+import gzip
+import json
+
+import requests
+
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.dialects.postgresql import insert
+
+from database.models import Log
+
+
+class RejectedBatch(Exception):
+    """Получатель отклонил пакет из-за его содержимого: повтор без изменений не поможет"""
+
+
+class HttpTransport:
+    """
+    Отправка логов на LOG_SERVER_URL через keep-alive сессию.
+
+    batch=True — пакет одним gzip-запросом (JSON-массив, Content-Encoding: gzip), сервер должен его поддерживать.
+    batch=False — прежний формат: один JSON-объект с прежним набором полей на запрос. Склеенные повторы
+    дописываются в описание. При повторе пакета после сбоя уже принятые сервером записи не отправляются снова.
+    В прежнем формате не передаются marketplace и repeat, поэтому log_daily_stats по таким записям
+    не разбивается по маркетплейсам и не учитывает повторы.
+    """
+
+    # Поля записи в прежнем формате (по одной записи на запрос)
+    LEGACY_FIELDS = ('timestamp', 'timestamp_user', 'action', 'user', 'ip_address', 'city', 'country', 'proxy',
+                     'description')
+
+    def __init__(self, url: str, timeout: int = 30, batch: bool = False) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.batch = batch
+        self.session = requests.Session()
+        if batch:
+            self.session.headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+        self._sent_seq = 0  # Последняя принятая запись в прежнем формате
+
+    def send(self, batch: list[dict]) -> None:
+        if self.batch:
+            body = gzip.compress(json.dumps(batch, ensure_ascii=False, default=str).encode('utf-8'))
+            self._post(data=body)
+            return
+
+        for record in batch:
+            if record.get('seq', 0) and record['seq'] <= self._sent_seq:
+                continue
+            log_data = {field: record.get(field) for field in self.LEGACY_FIELDS}
+            if record.get('repeat'):
+                log_data['description'] = f"{log_data['description']} (повторов: {record['repeat']})"
+            self._post(data=json.dumps(log_data, ensure_ascii=False, default=str).encode('utf-8'),
+                       headers={"Content-Type": "application/json"})
+            self._sent_seq = record.get('seq', 0)
+
+    def _post(self, **kwargs) -> None:
+        response = self.session.post(self.url, timeout=self.timeout, **kwargs)
+        # 4xx, кроме тайм-аута и ограничения частоты, — ошибка в самих записях
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise RejectedBatch(f"HTTP {response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class DbTransport:
+    """
+    Запись пакета логов напрямую в таблицу log одним многострочным INSERT.
+    Использует отдельное маленькое подключение, чтобы не конкурировать с пулом приложения.
+    Повторная доставка после перезапуска не создаёт дублей: (client_id, seq) уникальны.
+    Отклоняются (RejectedBatch) только пакеты с ошибками данных (DataError, IntegrityError).
+    """
+
+    def __init__(self, db_url: str) -> None:
+        self.engine = create_engine(url=db_url,
+                                    pool_size=1,
+                                    max_overflow=0,
+                                    pool_recycle=1800,
+                                    pool_pre_ping=True,
+                                    connect_args={"connect_timeout": 10})
+        self.columns = {column.name for column in Log.__table__.columns} - {'id'}
+
+    @staticmethod
+    def _parse_time(value):
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    def _row(self, log_data: dict) -> dict:
+        # Одинаковый набор колонок во всех строках многострочного INSERT
+        row = {column: log_data.get(column) for column in self.columns}
+        row['timestamp'] = self._parse_time(row.get('timestamp'))
+        row['timestamp_user'] = self._parse_time(row.get('timestamp_user'))
+        row['timestamp_last'] = self._parse_time(row.get('timestamp_last'))
+        row['description'] = row.get('description') or ''
+        return row
+
+    def send(self, batch: list[dict]) -> None:
+        rows = [self._row(log_data) for log_data in batch]
+        statement = insert(Log.__table__).values(rows).on_conflict_do_nothing(constraint='log_client_seq_unique')
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(statement)
+        except (IntegrityError, DataError) as e:
+            # Нарушение ограничения или недопустимое значение в строке — повторять бесполезно.
+            # Ошибки схемы и прав (ProgrammingError: нет столбца или ограничения, нет доступа) не относятся
+            # к записям: они исправляются на сервере, поэтому пакет остаётся в очереди и повторяется
+            raise RejectedBatch(str(e.orig)) from e
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+
+def create_transport(name: str, server_url: str, db_url: str, http_batch: bool = False):
+    """
+    Транспорт логов по настройке LOG_TRANSPORT: 'http' (через API-сервер) или 'db' (напрямую в БД).
+    http_batch (LOG_HTTP_BATCH) — пакетный gzip-формат HTTP вместо прежнего.
+    """
+
+    if name == 'http':
+        return HttpTransport(server_url, batch=http_batch)
+    if name == 'db':
+        return DbTransport(db_url)
+    raise ValueError(f"Неизвестный транспорт логов: {name}")
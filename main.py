@@ -1,8 +1,10 @@
+import os
 import sys
 from PyQt5 import QtWidgets
 
-from log_api import logger
-from apps import LoginWindow  # Главное окно авторизации
+from settings import UI_STALL_MS, METRICS_PORT, METRICS_TEXTFILE_DIR
+from log_api import logger, profiler, metrics
+from apps import LoginWindow, UiWatchdog  # Главное окно авторизации, сторож отзывчивости интерфейса
 
 if __name__ == '__main__':
     try:
@@ -24,12 +26,28 @@ if __name__ == '__main__':
             }
         """)
 
+        # Экспорт метрик для Prometheus (если задан порт или каталог textfile-коллектора)
+        metrics.start(port=METRICS_PORT, textfile_dir=METRICS_TEXTFILE_DIR)
+
+        # Профилирование с самого запуска (PB_PROFILE=1), результаты в log/profiles/ при выходе
+        if os.environ.get('PB_PROFILE'):
+            profiler.start()
+
+        # Поиск блокировок главного потока: записи "Зависание интерфейса" со стеком
+        watchdog = UiWatchdog(threshold=UI_STALL_MS / 1000)
+        watchdog.start()
+
         # Запуск окна логина
         login_window = LoginWindow()
         login_window.show()
 
         # Запуск главного цикла приложения
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
+        watchdog.stop()
+        profiler.stop()
+        metrics.stop()
+        logger.close()
+        sys.exit(exit_code)
 
     except Exception as e:
         # Логирование непредвиденных ошибок
@@ -0,0 +1,99 @@
+import argparse
+
+from datetime import date, timedelta
+from sqlalchemy import create_engine
+
+from config import DB_URL
+from database.models import Log
+from database.maintenance import ensure_log_partitions, drop_old_log_partitions, rebuild_log_rollups
+from database.maintenance import is_log_partitioned, convert_log_to_partitioned, install_log_rollups
+from database.maintenance import has_legacy_log, copy_legacy_log
+from database.maintenance import archive_phone_messages, drop_old_partitions
+from database.notify import PhoneMessageListener
+from database.migrations import MIGRATIONS, migrate, applied_versions
+
+
+def main() -> None:
+    """Обслуживание БД: миграции схемы, секции и ретеншн таблицы log, пересчёт суточных счётчиков, архив phone_message"""
+
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных DesktopBrowser")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    partitions = commands.add_parser('log-partitions', help="Создать секции log на ближайшие месяцы")
+    partitions.add_argument('--months-ahead', type=int, default=2)
+
+    retention = commands.add_parser('log-retention', help="Удалить секции log старше N месяцев")
+    retention.add_argument('--keep-months', type=int, default=12)
+    retention.add_argument('--detach-only', action='store_true', help="Только отсоединить, не удалять")
+
+    commands.add_parser('log-convert', help="Перевести существующую таблицу log в секционированную")
+
+    rollups = commands.add_parser('log-rollups', help="Пересоздать триггер и пересчитать log_daily_stats за последние N дней")
+    rollups.add_argument('--days', type=int, default=30)
+
+    migration = commands.add_parser('migrate', help="Применить недостающие шаги схемы (schema_version)")
+    migration.add_argument('--status', action='store_true', help="Только показать применённые и ожидающие шаги")
+
+    archive = commands.add_parser('phone-archive', help="Перенести старые запросы кода в phone_message_archive")
+    archive.add_argument('--older-than-hours', type=float, default=24)
+    archive.add_argument('--batch-size', type=int, default=1000)
+    archive.add_argument('--keep-months', type=int, default=None, help="Удалить секции архива старше N месяцев")
+
+    listen = commands.add_parser('phone-listen', help="Ждать кода по уведомлению (проверка LISTEN/NOTIFY)")
+    listen.add_argument('--phone', required=True)
+    listen.add_argument('--timeout', type=float, default=60)
+
+    args = parser.parse_args()
+    engine = create_engine(DB_URL)
+
+    if args.command == 'log-partitions':
+        created = ensure_log_partitions(engine, months_ahead=args.months_ahead)
+        print(f"🧩 Созданы секции: {', '.join(created) or 'нет (все уже есть)'}")
+    elif args.command == 'log-retention':
+        removed = drop_old_log_partitions(engine, keep_months=args.keep_months, detach_only=args.detach_only)
+        action = "Отсоединены" if args.detach_only else "Удалены"
+        print(f"🧹 {action} секции: {', '.join(removed) or 'нет'}")
+    elif args.command == 'log-convert':
+        if not is_log_partitioned(engine):
+            convert_log_to_partitioned(engine, create_log=lambda conn: Log.__table__.create(conn))
+        elif not has_legacy_log(engine):
+            print("✅ Таблица log уже секционирована")
+            return
+        # Повторный запуск после прерванного копирования продолжает его с пропуском скопированных строк
+        copied = copy_legacy_log(engine)
+        print(f"📋 Скопировано строк из log_legacy: {copied}")
+        ensure_log_partitions(engine)
+        install_log_rollups(engine)
+        rebuild_log_rollups(engine, since=date.min)
+        print("🧩 Таблица log секционирована, старые данные скопированы, исходная таблица — log_legacy")
+    elif args.command == 'log-rollups':
+        install_log_rollups(engine)
+        rebuild_log_rollups(engine, since=date.today() - timedelta(days=args.days))
+        print("📊 Счётчики log_daily_stats пересчитаны")
+    elif args.command == 'migrate' and args.status:
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            applied = f"✅ {done[version][1]:%Y-%m-%d %H:%M}" if version in done else "⏳ не применён"
+            print(f"{version}. {description}: {applied}")
+    elif args.command == 'migrate':
+        applied = migrate(engine)
+        print(f"🧱 Применено шагов схемы: {len(applied)}" if applied else "🧱 Схема в актуальной версии")
+    elif args.command == 'phone-archive':
+        moved = archive_phone_messages(engine, older_than=timedelta(hours=args.older_than_hours),
+                                       batch_size=args.batch_size)
+        print(f"📦 Перенесено в архив запросов кода: {moved}")
+        if args.keep_months is not None:
+            removed = drop_old_partitions(engine, 'phone_message_archive', keep_months=args.keep_months)
+            print(f"🧹 Удалены секции архива: {', '.join(removed) or 'нет'}")
+    elif args.command == 'phone-listen':
+        listener = PhoneMessageListener(engine)
+        event = listener.subscribe(('phone', args.phone))
+        listener.start()
+        received = event.wait(args.timeout) and listener.available
+        listener.stop()
+        print("📨 Уведомление получено" if received else "⌛ Уведомлений нет")
+
+
+if __name__ == "__main__":
+    main()
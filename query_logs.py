@@ -0,0 +1,140 @@
+import os
+import gzip
+import json
+import bisect
+import argparse
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+def parse_time(value: str) -> datetime:
+    """Разбор времени: 'YYYY-MM-DD HH:MM[:SS]' или ISO"""
+
+    return datetime.fromisoformat(value.replace(' ', 'T'))
+
+
+def load_index(path: str) -> tuple[list[str], list[int]]:
+    """Разреженный индекс дня: минуты и смещения первой записи каждой минуты"""
+
+    minutes, offsets = [], []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    minutes.append(parts[0])
+                    offsets.append(int(parts[1]))
+    except OSError:
+        pass
+    return minutes, offsets
+
+
+def find_offset(idx_path: str, start: datetime) -> int:
+    """Смещение по индексу для последней минуты не позже start (0 — читать с начала)"""
+
+    minutes, offsets = load_index(idx_path)
+    position = bisect.bisect_right(minutes, start.strftime('%Y-%m-%dT%H:%M')) - 1
+    return offsets[position] if position >= 0 else 0
+
+
+@contextmanager
+def open_day(log_dir: str, day: str, start: datetime):
+    """
+    Структурированный лог дня, открытый с первой записи минуты start. None — если файла нет.
+
+    Обычный файл читается с позиции из индекса YYYY-MM-DD.jsonl.idx. Архив, сжатый по минутам
+    (индекс YYYY-MM-DD.jsonl.gz.idx), распаковывается с члена gzip нужной минуты. Архив без
+    такого индекса (сжатый прежней версией) распаковывается с начала дня.
+    """
+
+    path = os.path.join(log_dir, f"{day}.jsonl")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            f.seek(find_offset(f"{path}.idx", start))
+            yield f
+    elif os.path.exists(f"{path}.gz.idx"):
+        with open(f"{path}.gz", 'rb') as raw:
+            raw.seek(find_offset(f"{path}.gz.idx", start))
+            with gzip.GzipFile(fileobj=raw, mode='rb') as f:
+                yield f
+    elif os.path.exists(f"{path}.gz"):
+        with gzip.open(f"{path}.gz", 'rb') as f:
+            f.seek(find_offset(f"{path}.idx", start))
+            yield f
+    else:
+        yield None
+
+
+def matches(record: dict, args: argparse.Namespace) -> bool:
+    if args.user and (record.get('user') or '').lower() != args.user.lower():
+        return False
+    if args.marketplace and (record.get('marketplace') or '').lower() != args.marketplace.lower():
+        return False
+    if args.company and args.company.lower() not in (record.get('company') or '').lower():
+        return False
+    if args.flow and record.get('flow_id') != args.flow:
+        return False
+    if args.level and record.get('level') != args.level.upper():
+        return False
+    if args.grep and args.grep.lower() not in (record.get('message') or '').lower():
+        return False
+    return True
+
+
+def query(log_dir: str, start: datetime, end: datetime, args: argparse.Namespace):
+    """Потоковая выдача записей в окне [start, end] с переходом по индексу сразу к нужной минуте"""
+
+    day = start.date()
+    while day <= end.date():
+        with open_day(log_dir, day.isoformat(), start) as f:
+            if f is not None:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        ts = datetime.fromisoformat(record['ts'])
+                    except (ValueError, KeyError):
+                        continue
+                    if ts < start:
+                        continue
+                    if ts > end:
+                        break
+                    if matches(record, args):
+                        yield record
+        day += timedelta(days=1)
+
+
+def format_record(record: dict) -> str:
+    place = ' - '.join(filter(None, [record.get('marketplace'), record.get('company')]))
+    who = record.get('user') or '-'
+    return f"{record['ts']} {record['level']:<7} [{place or '-'}] {who}: {record.get('message')}"
+
+
+def main() -> None:
+    """Поиск по структурированным логам log/YYYY-MM-DD.jsonl"""
+
+    parser = argparse.ArgumentParser(description="Поиск по структурированным логам за интервал времени")
+    parser.add_argument('--from', dest='start', required=True, help="Начало: 'YYYY-MM-DD HH:MM'")
+    parser.add_argument('--to', dest='end', help="Конец (по умолчанию +10 минут от начала)")
+    parser.add_argument('--user', help="Логин пользователя")
+    parser.add_argument('--marketplace', help="Маркетплейс (Ozon, WB, Yandex...)")
+    parser.add_argument('--company', help="Часть названия компании")
+    parser.add_argument('--flow', help="Идентификатор потока авторизации flow_id")
+    parser.add_argument('--level', help="Уровень: INFO, ERROR, WARNING")
+    parser.add_argument('--grep', help="Подстрока в сообщении")
+    parser.add_argument('--json', action='store_true', help="Выводить записи как JSON")
+    parser.add_argument('--dir', default='log', help="Каталог логов")
+    args = parser.parse_args()
+
+    start = parse_time(args.start)
+    end = parse_time(args.end) if args.end else start + timedelta(minutes=10)
+
+    for record in query(args.dir, start, end, args):
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(format_record(record))
+
+
+if __name__ == "__main__":
+    main()
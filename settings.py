@@ -0,0 +1,17 @@
+import config
+
+# Настройки, добавленные после первой версии config.example.py. Читаются со значениями по умолчанию,
+# чтобы существующий config.py продолжал работать без правки. Описание — в config.example.py
+
+LOG_TRANSPORT = getattr(config, 'LOG_TRANSPORT', "http")
+LOG_HTTP_BATCH = getattr(config, 'LOG_HTTP_BATCH', False)
+LOG_QUEUE_SIZE = getattr(config, 'LOG_QUEUE_SIZE', 5000)
+LOG_QUEUE_POLICY = getattr(config, 'LOG_QUEUE_POLICY', "coalesce")
+LOG_JSONL = getattr(config, 'LOG_JSONL', True)
+LOG_FLOW_SAMPLING = getattr(config, 'LOG_FLOW_SAMPLING', True)
+LOG_TRACE = getattr(config, 'LOG_TRACE', False)
+WD_PROFILE = getattr(config, 'WD_PROFILE', False)
+PROXY_TELEMETRY = getattr(config, 'PROXY_TELEMETRY', False)
+UI_STALL_MS = getattr(config, 'UI_STALL_MS', 200)
+METRICS_PORT = getattr(config, 'METRICS_PORT', None)
+METRICS_TEXTFILE_DIR = getattr(config, 'METRICS_TEXTFILE_DIR', None)
@@ -0,0 +1,29 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Без локального config.py тесты используют шаблон config.example.py
+if importlib.util.find_spec('config') is None:
+    spec = importlib.util.spec_from_file_location('config', os.path.join(ROOT, 'config.example.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
+
+_workdir = None
+
+
+def pytest_configure(config):
+    # Логгер при импорте log_api создаёт log/ в текущем каталоге — тесты работают во временном
+    global _workdir
+    _workdir = tempfile.mkdtemp(prefix='proxybrowser-tests-')
+    os.chdir(_workdir)
+
+
+def pytest_unconfigure(config):
+    os.chdir(ROOT)
+    shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,192 @@
+"""
+Слой asyncio для БД: повторы корутин в retry_on_exception, подписки AsyncPhoneMessageListener,
+интервалы трассы корутин и (при заданной PROXYBROWSER_TEST_DB_URL) заявки на код через AsyncDbConnection.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+
+from types import SimpleNamespace
+from datetime import datetime
+
+import pytest
+
+from log_api import trace
+
+TEST_DB_URL = os.environ.get('PROXYBROWSER_TEST_DB_URL')
+
+
+def test_traced_coroutine_is_a_span(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace, 'LOG_TRACE', True)
+    monkeypatch.setattr(trace, 'TRACE_DIR', str(tmp_path))
+
+    @trace.traced('Запрос')
+    async def request():
+        await asyncio.sleep(0.01)
+        return 42
+
+    with trace.trace_flow('Авторизация'):
+        assert asyncio.run(request()) == 42
+
+    [path] = tmp_path.iterdir()
+    with open(path, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events if event['ph'] == 'X'] == ['Запрос', 'Авторизация']
+    assert events[1]['dur'] >= 10_000  # мкс: интервал охватывает await
+
+
+@pytest.fixture
+def db_module(monkeypatch):
+    pytest.importorskip('pyodbc')
+    import database.db as db_module
+
+    monkeypatch.setattr(db_module, 'backoff', lambda attempt: 0)
+    return db_module
+
+
+def fake_connection(db_module, *errors: Exception):
+    """Объект с предохранителем и корутиной call, первые вызовы которой завершаются errors"""
+
+    from database.resilience import CircuitBreaker
+
+    class Connection:
+        def __init__(self) -> None:
+            self.breaker = CircuitBreaker(driver='async')
+            self.errors = list(errors)
+            self.calls = 0
+
+        @db_module.retry_on_exception(budget=5)
+        async def call(self):
+            self.calls += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            return 'ok'
+
+    return Connection()
+
+
+def test_coroutine_is_retried_on_connection_errors(db_module):
+    conn = fake_connection(db_module, OSError("connection refused"), asyncio.TimeoutError())
+
+    assert asyncio.run(conn.call()) == 'ok'
+    assert conn.calls == 3
+    assert conn.breaker.state == 'closed' and conn.breaker.failures == 0
+
+
+def test_exhausted_retries_open_breaker(db_module):
+    from database.resilience import DbUnavailable
+
+    conn = fake_connection(db_module, *[OSError("connection refused")] * 3)
+    with pytest.raises(RuntimeError, match="Попытки подключения исчерпаны"):
+        asyncio.run(conn.call())
+    assert conn.breaker.state == 'open'
+
+    with pytest.raises(DbUnavailable):
+        asyncio.run(conn.call())
+    assert conn.calls == 3  # Отклонено без обращения к БД
+
+
+def test_other_errors_are_not_retried(db_module):
+    conn = fake_connection(db_module, ValueError("нет такого рынка"))
+    with pytest.raises(ValueError):
+        asyncio.run(conn.call())
+    assert conn.calls == 1
+
+
+def test_listener_wakes_subscribed_tasks():
+    pytest.importorskip('pyodbc')
+    from database.async_db import AsyncPhoneMessageListener, wait_event
+
+    engine = SimpleNamespace(sync_engine=SimpleNamespace(dialect=SimpleNamespace(name='sqlite')))
+    listener = AsyncPhoneMessageListener(engine)
+
+    async def scenario():
+        listener.start()  # Не PostgreSQL: задача прослушивания не создаётся
+        by_id, by_phone = listener.subscribe(('id', 7)), listener.subscribe(('phone', '79990000000'))
+        other = listener.subscribe(('id', 8))
+
+        asyncio.get_running_loop().call_later(0.05, listener._dispatch,
+                                              json.dumps({'id': 7, 'phone': '79990000000'}))
+        started = time.monotonic()
+        await wait_event(by_id, 5)
+        assert time.monotonic() - started < 1
+        assert by_phone.is_set() and not other.is_set()
+
+        for event in (by_id, by_phone, other):
+            event.clear()
+        listener.unsubscribe(('id', 7), by_id)
+        listener._dispatch('не JSON')  # Непонятное уведомление будит всех ожидающих
+        assert by_phone.is_set() and other.is_set() and not by_id.is_set()
+        assert listener._task is None
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.skipif(not TEST_DB_URL, reason="PROXYBROWSER_TEST_DB_URL не задан")
+def test_async_claim_and_code_on_postgres(monkeypatch):
+    pytest.importorskip('pyodbc')
+    pytest.importorskip('psycopg2')
+    pytest.importorskip('asyncpg')
+
+    from sqlalchemy import text, delete
+
+    import database.db as db_module
+    import database.async_db as async_db_module
+    from database.db import DbConnection
+    from database.async_db import AsyncDbConnection
+    from database.models import Base, Marketplace, Connect, User, Group, PhoneMessage
+    from database.notify import PHONE_MESSAGE_NOTIFY_TRIGGER
+
+    suffix = uuid.uuid4().hex[:8]
+    names = SimpleNamespace(marketplace=f"test_{suffix}", group=f"test_{suffix}", user=f"test_{suffix}",
+                            phone=f"7{suffix}")
+    monkeypatch.setattr(db_module, 'DB_URL', TEST_DB_URL)
+    monkeypatch.setattr(async_db_module, 'DB_URL', TEST_DB_URL)
+
+    sync = DbConnection()
+    Base.metadata.create_all(sync.engine)
+    with sync.engine.begin() as connection:
+        connection.execute(text(PHONE_MESSAGE_NOTIFY_TRIGGER))
+    with sync.session_scope() as session:
+        session.add(Marketplace(marketplace=names.marketplace, link='https://example.com', domain='https://example.com'))
+        session.add(Group(group=names.group))
+        session.flush()
+        session.add(User(user=names.user, password='secret', group=names.group))
+        session.add(Connect(phone=names.phone, proxy='-', mail='-', token='-'))
+
+    async def scenario():
+        conn = AsyncDbConnection()
+        try:
+            assert await conn.check_user(names.user.upper(), 'secret') == names.group
+
+            request_id = await conn.claim_phone_message(names.user, names.phone, names.marketplace, datetime.now())
+            deadline = time.monotonic() + 10
+            while not conn.listener.available and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            assert conn.listener.available
+
+            async def write_code():
+                await asyncio.sleep(0.5)
+                await conn.update_phone_message(names.user, names.phone, names.marketplace, '4321', datetime.now())
+
+            writer = asyncio.create_task(write_code())
+            started = time.monotonic()
+            assert await conn.get_phone_message(request_id) == '4321'
+            assert time.monotonic() - started < 5  # Разбудило уведомление, а не 30-секундный опрос
+            await writer
+        finally:
+            await conn.close()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        with sync.session_scope() as session:
+            session.execute(delete(PhoneMessage).where(PhoneMessage.phone == names.phone))
+            session.execute(delete(Connect).where(Connect.phone == names.phone))
+            session.execute(delete(User).where(User.user == names.user))
+            session.execute(delete(Group).where(Group.group == names.group))
+            session.execute(delete(Marketplace).where(Marketplace.marketplace == names.marketplace))
+        sync.engine.dispose()
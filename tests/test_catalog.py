@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+from database.catalog import MarketCatalog
+from database.snapshot import MarketSnapshot
+
+KEY = Fernet.generate_key().decode()
+STAMP = datetime(2024, 4, 1, 10, 0)
+
+
+def market(name: str, proxy: str = 'proxy:8080') -> MarketSnapshot:
+    return MarketSnapshot(marketplace='WB', name_company=name, phone='79990000000', proxy=proxy)
+
+
+class FakeDb:
+    """DbConnection.catalog_changes по заданным ответам; since запоминается"""
+
+    def __init__(self, *answers) -> None:
+        self.answers = list(answers)
+        self.since = []
+
+    def catalog_changes(self, group: str, since: datetime = None):
+        self.since.append(since)
+        return self.answers.pop(0)
+
+
+def names(catalog: MarketCatalog) -> list[str]:
+    return sorted(snapshot.name_company for snapshot in catalog.snapshots())
+
+
+def test_first_sync_loads_everything_and_saves_encrypted(tmp_path):
+    catalog = MarketCatalog('group', KEY, str(tmp_path))
+    assert catalog.snapshots() == [] and catalog.stamp is None
+
+    db = FakeDb(([market('А'), market('Б')], {('WB', 'А'), ('WB', 'Б')}, STAMP))
+    assert catalog.sync(db)
+    assert db.since == [None]
+
+    with open(catalog.path, 'rb') as f:
+        assert 'proxy:8080' not in f.read().decode('latin-1')  # Доступы не лежат на диске открытым текстом
+    reloaded = MarketCatalog('group', KEY, str(tmp_path))
+    assert names(reloaded) == ['А', 'Б'] and reloaded.stamp == STAMP
+
+
+def test_delta_sync_updates_changed_and_drops_deleted(tmp_path):
+    catalog = MarketCatalog('group', KEY, str(tmp_path))
+    catalog.sync(FakeDb(([market('А'), market('Б'), market('В')], {('WB', 'А'), ('WB', 'Б'), ('WB', 'В')}, STAMP)))
+
+    later = datetime(2024, 4, 1, 11, 0)
+    db = FakeDb(([market('Б', proxy='other:8080')], {('WB', 'А'), ('WB', 'Б')}, later))
+    assert catalog.sync(db)
+    assert db.since == [STAMP]
+    assert names(catalog) == ['А', 'Б']
+    assert catalog.markets[('WB', 'Б')].proxy == 'other:8080'
+    assert catalog.stamp == later
+
+    # Изменённые строки из окна перекрытия, но без отличий — каталог тот же
+    assert not catalog.sync(FakeDb(([market('А')], {('WB', 'А'), ('WB', 'Б')}, later)))
+
+
+def test_unreadable_copy_is_ignored(tmp_path):
+    catalog = MarketCatalog('group', KEY, str(tmp_path))
+    catalog.sync(FakeDb(([market('А')], {('WB', 'А')}, STAMP)))
+
+    other_key = MarketCatalog('group', Fernet.generate_key().decode(), str(tmp_path))
+    assert other_key.snapshots() == [] and other_key.stamp is None
+
+    with open(catalog.path, 'wb') as f:
+        f.write(b'broken')
+    assert MarketCatalog('group', KEY, str(tmp_path)).stamp is None
+
+
+def test_groups_have_separate_copies(tmp_path):
+    first = MarketCatalog('Group', KEY, str(tmp_path))
+    second = MarketCatalog('other', KEY, str(tmp_path))
+    assert first.path != second.path
@@ -0,0 +1,98 @@
+"""
+Выборка изменений каталога рынков (DbConnection.catalog_changes) на настоящем PostgreSQL.
+
+Запускается при заданной переменной PROXYBROWSER_TEST_DB_URL (см. test_phone_message_pg.py).
+"""
+
+import os
+import time
+import uuid
+
+from types import SimpleNamespace
+
+import pytest
+
+TEST_DB_URL = os.environ.get('PROXYBROWSER_TEST_DB_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DB_URL, reason="PROXYBROWSER_TEST_DB_URL не задан")
+
+if TEST_DB_URL:
+    pytest.importorskip('psycopg2')
+    pytest.importorskip('pyodbc')
+
+    from sqlalchemy import text, delete, update
+
+    import database.db as db_module
+    from database.db import DbConnection
+    from database.catalog import CHANGE_STAMPS
+    from database.models import Base, Marketplace, Connect, Market, Group, GroupMarket
+
+
+@pytest.fixture
+def catalog():
+    """Группа с двумя рынками на отдельных номерах"""
+
+    suffix = uuid.uuid4().hex[:8]
+    names = SimpleNamespace(marketplace=f"test_{suffix}", group=f"test_{suffix}", phones=[f"7{suffix}1", f"7{suffix}2"],
+                            companies=[f"Компания 1 {suffix}", f"Компания 2 {suffix}"])
+
+    previous_url, db_module.DB_URL = db_module.DB_URL, TEST_DB_URL
+    try:
+        conn = DbConnection()
+    finally:
+        db_module.DB_URL = previous_url
+
+    Base.metadata.create_all(conn.engine)
+    with conn.engine.begin() as connection:
+        connection.execute(text(CHANGE_STAMPS))
+    with conn.session_scope() as session:
+        session.add(Marketplace(marketplace=names.marketplace, link='https://example.com', domain='https://example.com'))
+        session.add(Group(group=names.group))
+        session.flush()
+        for phone, company in zip(names.phones, names.companies):
+            session.add(Connect(phone=phone, proxy='proxy:8080', mail='-', token='-'))
+            session.flush()
+            session.add(Market(marketplace=names.marketplace, name_company=company, phone=phone))
+            session.add(GroupMarket(group=names.group, marketplace=names.marketplace, name_company=company))
+
+    yield names, conn
+
+    with conn.session_scope() as session:
+        session.execute(delete(GroupMarket).where(GroupMarket.group == names.group))
+        session.execute(delete(Market).where(Market.marketplace == names.marketplace))
+        session.execute(delete(Connect).where(Connect.phone.in_(names.phones)))
+        session.execute(delete(Group).where(Group.group == names.group))
+        session.execute(delete(Marketplace).where(Marketplace.marketplace == names.marketplace))
+    conn.engine.dispose()
+
+
+def changed_companies(conn: 'DbConnection', group: str, since) -> tuple[list[str], int, object]:
+    changed, keys, stamp = conn.catalog_changes(group, since=since)
+    return sorted(market.name_company for market in changed), len(keys), stamp
+
+
+def test_full_then_only_changed_markets(catalog, monkeypatch):
+    names, conn = catalog
+    monkeypatch.setattr(db_module, 'CATALOG_SYNC_OVERLAP', db_module.timedelta(0))
+
+    changed, count, stamp = changed_companies(conn, names.group, None)
+    assert changed == names.companies and count == 2
+
+    time.sleep(0.1)
+    assert changed_companies(conn, names.group, stamp)[0] == []
+
+    # Правка строки connects (триггер обновляет updated_at) попадает в выборку её рынка
+    with conn.session_scope() as session:
+        session.execute(update(Connect).where(Connect.phone == names.phones[1]).values(proxy='other:8080'))
+    changed, count, _ = changed_companies(conn, names.group, stamp)
+    assert changed == [names.companies[1]] and count == 2
+
+
+def test_removed_market_drops_out_of_keys(catalog):
+    names, conn = catalog
+    _, _, stamp = changed_companies(conn, names.group, None)
+
+    with conn.session_scope() as session:
+        session.execute(delete(GroupMarket).where(GroupMarket.name_company == names.companies[0]))
+    _, keys, _ = conn.catalog_changes(names.group, since=stamp)
+    assert keys == {(names.marketplace, names.companies[1])}
@@ -0,0 +1,65 @@
+import time
+
+from datetime import datetime, timedelta
+
+from log_api.clock import MoscowClock, MOSCOW_TZ
+
+
+def moscow_now() -> datetime:
+    return datetime.now(tz=MOSCOW_TZ).replace(tzinfo=None)
+
+
+def unavailable():
+    raise OSError("нет соединения")
+
+
+def test_unsynced_clock_uses_local_time():
+    clock = MoscowClock()
+    assert not clock.synced
+    assert abs(clock.now() - moscow_now()) < timedelta(seconds=1)
+
+
+def test_db_source_has_priority():
+    clock = MoscowClock()
+    clock._fetch_yandex = unavailable
+    server_time = moscow_now() + timedelta(hours=1)
+    clock.set_db_source(lambda: server_time)
+
+    assert clock.sync()
+    assert clock.synced and clock.source == 'db'
+    assert abs(clock.now() - server_time) < timedelta(seconds=1)
+
+
+def test_to_moscow_applies_offset():
+    clock = MoscowClock()
+    clock._fetch_yandex = unavailable
+    server_time = moscow_now() + timedelta(hours=1)
+    clock.set_db_source(lambda: server_time)
+    assert clock.sync()
+
+    # Локальные метки времени (LogRecord.created) переводятся с тем же смещением, что и now()
+    assert abs(clock.to_moscow(time.time()) - server_time) < timedelta(seconds=1)
+
+
+def test_fallback_to_yandex():
+    clock = MoscowClock()
+    server_time = datetime.now(tz=MOSCOW_TZ) - timedelta(minutes=10)
+    clock._fetch_yandex = lambda: server_time
+    clock.set_db_source(unavailable)
+
+    assert clock.sync()
+    assert clock.source == 'yandex'
+    assert abs(clock.now() - server_time.replace(tzinfo=None)) < timedelta(seconds=1)
+
+
+def test_failed_sync_keeps_previous_offset():
+    clock = MoscowClock()
+    server_time = moscow_now() + timedelta(hours=1)
+    clock.set_db_source(lambda: server_time)
+    clock._fetch_yandex = unavailable
+    assert clock.sync()
+
+    clock.set_db_source(unavailable)
+    assert not clock.sync()
+    assert clock.source == 'db'
+    assert abs(clock.now() - server_time) < timedelta(seconds=1)
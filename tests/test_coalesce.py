@@ -0,0 +1,55 @@
+import time
+
+from log_api.coalesce import LogCoalescer, message_template
+
+
+def record(description: str, timestamp: str = None, user: str = 'user') -> dict:
+    return {'action': 'ERROR', 'user': user, 'proxy': None, 'description': description, 'timestamp': timestamp}
+
+
+def test_message_template_ignores_numbers():
+    assert message_template("Попытка 1/3") == message_template("Попытка 2/3") == "Попытка #/#"
+    assert message_template(None) == ''
+
+
+def test_repeats_are_coalesced_into_summary():
+    emitted = []
+    coalescer = LogCoalescer(emit=emitted.append, window=60)
+
+    coalescer.submit(record("Попытка 1/3", '10:00'))
+    coalescer.submit(record("Попытка 2/3", '10:01'))
+    coalescer.submit(record("Попытка 3/3", '10:02'))
+    assert [item['description'] for item in emitted] == ["Попытка 1/3"]
+
+    coalescer.close()
+    summary = emitted[1]
+    assert summary['repeat'] == 2
+    assert summary['timestamp'] == '10:01'
+    assert summary['timestamp_last'] == '10:02'
+    assert summary['description'] == "Попытка 3/3"
+
+
+def test_different_keys_pass_through():
+    emitted = []
+    coalescer = LogCoalescer(emit=emitted.append, window=60)
+
+    coalescer.submit(record("Ошибка"))
+    coalescer.submit(record("Ошибка", user='other'))
+    coalescer.submit(dict(record("Ошибка"), action='INFO'))
+    assert len(emitted) == 3
+
+    coalescer.close()
+    assert len(emitted) == 3  # Повторов не было — итоговых записей нет
+
+
+def test_expired_window_reopens():
+    emitted = []
+    coalescer = LogCoalescer(emit=emitted.append, window=0.3)
+
+    coalescer.submit(record("Ошибка"))
+    coalescer.submit(record("Ошибка"))
+    time.sleep(0.35)
+    coalescer.flush()
+    coalescer.submit(record("Ошибка"))
+    assert [item.get('repeat') for item in emitted] == [None, 1, None]
+    coalescer.close()
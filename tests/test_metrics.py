@@ -0,0 +1,26 @@
+import pytest
+
+from log_api.metrics import MetricsRegistry
+from database.resilience import CircuitBreaker, circuit_states
+
+
+def test_duplicate_name_is_rejected():
+    registry = MetricsRegistry()
+    registry.gauge('proxybrowser_test_gauge', "Тест", callback=lambda: {(): 1})
+
+    with pytest.raises(ValueError, match="proxybrowser_test_gauge"):
+        registry.gauge('proxybrowser_test_gauge', "Тест", callback=lambda: {(): 2})
+    with pytest.raises(ValueError):
+        registry.counter('proxybrowser_test_gauge', "Тест")
+    assert 'proxybrowser_test_gauge{os_user=' in registry.render()
+    assert registry.render().count('proxybrowser_test_gauge{') == 1
+
+
+def test_circuit_state_counts_breakers_by_driver():
+    sync, async_ = CircuitBreaker(failure_threshold=1, driver='sync'), CircuitBreaker(driver='async')
+    sync.failure()
+
+    values = circuit_states()
+    assert values[('sync', 'open')] >= 1
+    assert values[('async', 'closed')] >= 1
+    assert async_.state == 'closed'
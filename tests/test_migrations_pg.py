@@ -0,0 +1,134 @@
+"""
+Шаги схемы (database/migrations.py) на настоящем PostgreSQL.
+
+Каждый тест работает в своей временной схеме (search_path), которая удаляется после теста.
+Запускается при заданной переменной PROXYBROWSER_TEST_DB_URL (см. test_phone_message_pg.py).
+"""
+
+import os
+import time
+import uuid
+import threading
+
+import pytest
+
+TEST_DB_URL = os.environ.get('PROXYBROWSER_TEST_DB_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DB_URL, reason="PROXYBROWSER_TEST_DB_URL не задан")
+
+if TEST_DB_URL:
+    pytest.importorskip('psycopg2')
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.exc import IntegrityError
+
+    import database.migrations as migrations
+    from database.models import Base
+    from database.maintenance import is_log_partitioned, ensure_log_partitions, install_log_rollups
+
+
+@pytest.fixture
+def engine():
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DB_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(TEST_DB_URL, connect_args={'options': f"-csearch_path={schema}"})
+
+    yield engine
+
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def versions(engine) -> list[int]:
+    with engine.connect() as conn:
+        return sorted(conn.execute(text("SELECT version FROM schema_version")).scalars())
+
+
+def index_valid(engine, name: str):
+    with engine.connect() as conn:
+        return conn.scalar(text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                           {'name': name})
+
+
+def test_steps_run_once_in_order(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(migrations, 'MIGRATIONS', (
+        (1, "Первый", lambda e: calls.append(1)),
+        (2, "Второй", lambda e: calls.append(2)),
+    ))
+    reported = []
+
+    assert migrations.migrate(engine, report=reported.append) == [1, 2]
+    assert calls == [1, 2] and len(reported) == 2
+    assert migrations.migrate(engine, report=reported.append) == []
+    assert calls == [1, 2] and versions(engine) == [1, 2]
+
+
+def test_failed_step_is_repeated_next_time(engine, monkeypatch):
+    broken = [True]
+
+    def second(e):
+        if broken[0]:
+            raise RuntimeError("шаг прерван")
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', ((1, "Первый", lambda e: None), (2, "Второй", second)))
+    with pytest.raises(RuntimeError):
+        migrations.migrate(engine, report=lambda message: None)
+    assert versions(engine) == [1]
+
+    broken[0] = False
+    assert migrations.migrate(engine, report=lambda message: None) == [2]
+
+
+def test_concurrent_runs_wait_for_advisory_lock(engine, monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', ((1, "Первый", lambda e: None),))
+    result = []
+
+    with engine.connect() as holder:
+        holder.execute(text("SELECT pg_advisory_lock(:key)"), {'key': migrations.MIGRATION_LOCK})
+        thread = threading.Thread(target=lambda: result.append(migrations.migrate(engine, report=lambda m: None)),
+                                  daemon=True)
+        thread.start()
+        time.sleep(0.5)
+        assert thread.is_alive() and not result  # Ждёт другую машину
+        holder.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': migrations.MIGRATION_LOCK})
+        holder.commit()
+
+    thread.join(10)
+    assert result == [[1]]
+
+
+def test_invalid_concurrent_index_is_rebuilt(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (value integer)"))
+        conn.execute(text("INSERT INTO items VALUES (1), (1)"))
+
+    # Прерванное построение оставляет INVALID индекс
+    with pytest.raises(IntegrityError):
+        migrations.create_index_concurrently(engine, 'ix_items_value', 'items (value)', unique=True)
+    assert index_valid(engine, 'ix_items_value') is False
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM items"))
+    migrations.create_index_concurrently(engine, 'ix_items_value', 'items (value)', unique=True)
+    assert index_valid(engine, 'ix_items_value') is True
+
+
+def test_full_schema_migrates_from_models(engine):
+    Base.metadata.create_all(engine)
+    if is_log_partitioned(engine):
+        ensure_log_partitions(engine)
+        install_log_rollups(engine)
+
+    applied = migrations.migrate(engine, report=lambda message: None)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(engine, report=lambda message: None) == []
+
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT 1 FROM pg_constraint WHERE conname = 'log_client_seq_unique'"))
+    for name in ('ix_phone_message_pending', 'ix_users_user_lower', 'ix_markets_phone'):
+        assert index_valid(engine, name) is True
@@ -0,0 +1,21 @@
+import os
+import tracemalloc
+
+from log_api import profiling
+from log_api.profiling import AppProfiler
+
+
+def test_memory_snapshot_only_while_profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    profiler = AppProfiler(interval=0.01)
+
+    assert profiler.memory_snapshot() is None
+    assert not tracemalloc.is_tracing()
+
+    profiler.start()
+    try:
+        path = profiler.memory_snapshot()
+        assert path is not None and os.path.exists(f"{path}_memory.txt")
+    finally:
+        profiler.stop()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,95 @@
+import gzip
+import json
+import logging
+
+from argparse import Namespace
+from datetime import datetime, timedelta
+
+import pytest
+
+from log_api.clock import MOSCOW_TZ
+from log_api.handlers import JsonLinesHandler, LogArchiver
+from query_logs import query, load_index
+
+DAY = '2024-04-01'
+START = datetime(2024, 4, 1, 10, 0)
+
+
+def filters(**values) -> Namespace:
+    return Namespace(**dict(dict.fromkeys(('user', 'marketplace', 'company', 'flow', 'level', 'grep')), **values))
+
+
+def make_record(minute: int, second: int, user: str, message: str) -> logging.LogRecord:
+    record = logging.LogRecord("RemoteLogger", logging.INFO, __file__, 0, message, None, None)
+    record.created = (START + timedelta(minutes=minute, seconds=second)).replace(tzinfo=MOSCOW_TZ).timestamp()
+    record.user = user
+    record.marketplace = 'Ozon'
+    return record
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    """Структурированный лог дня DAY: по две записи в минутах 10:00, 10:01 и 10:02"""
+
+    handler = JsonLinesHandler(str(tmp_path))
+    handler.day, handler.baseFilename = DAY, handler._path(DAY)
+    for minute in range(3):
+        handler.emit(make_record(minute, 20, 'manager1', f"шаг {minute}.1"))
+        handler.emit(make_record(minute, 40, 'manager2', f"шаг {minute}.2"))
+    handler.close()
+    return tmp_path
+
+
+def test_index_points_to_first_record_of_each_minute(log_dir):
+    minutes, offsets = load_index(str(log_dir / f"{DAY}.jsonl.idx"))
+    assert minutes == [f"{DAY}T10:00", f"{DAY}T10:01", f"{DAY}T10:02"]
+
+    with open(log_dir / f"{DAY}.jsonl", 'rb') as f:
+        for minute, offset in zip(minutes, offsets):
+            f.seek(offset)
+            assert f.readline().decode('utf-8').startswith(f'{{"ts": "{minute}:20')
+
+
+def test_query_returns_window(log_dir):
+    records = list(query(str(log_dir), START + timedelta(minutes=1), START + timedelta(minutes=1, seconds=59),
+                         filters()))
+    assert [record['message'] for record in records] == ["шаг 1.1", "шаг 1.2"]
+
+
+def test_query_filters(log_dir):
+    records = list(query(str(log_dir), START, START + timedelta(minutes=10), filters(user='MANAGER2', grep='шаг 2')))
+    assert [record['message'] for record in records] == ["шаг 2.2"]
+    assert records[0]['marketplace'] == 'Ozon'
+
+
+def test_missing_day_is_skipped(log_dir):
+    assert list(query(str(log_dir), START - timedelta(days=1), START - timedelta(days=1) + timedelta(hours=1),
+                      filters())) == []
+
+
+def test_archived_day_is_read_from_minute_member(log_dir):
+    LogArchiver(str(log_dir))._compress()
+    assert sorted(path.name for path in log_dir.iterdir()) == [f"{DAY}.jsonl.gz", f"{DAY}.jsonl.gz.idx"]
+
+    # Смещения индекса указывают на отдельные члены gzip, а не на позиции в распакованном файле
+    minutes, offsets = load_index(str(log_dir / f"{DAY}.jsonl.gz.idx"))
+    assert minutes == [f"{DAY}T10:00", f"{DAY}T10:01", f"{DAY}T10:02"]
+    with open(log_dir / f"{DAY}.jsonl.gz", 'rb') as raw:
+        raw.seek(offsets[2])
+        with gzip.GzipFile(fileobj=raw) as f:
+            assert [json.loads(line)['message'] for line in f] == ["шаг 2.1", "шаг 2.2"]
+
+    records = list(query(str(log_dir), START + timedelta(minutes=1), START + timedelta(minutes=1, seconds=59),
+                         filters()))
+    assert [record['message'] for record in records] == ["шаг 1.1", "шаг 1.2"]
+
+
+def test_archive_without_member_index_is_still_searchable(log_dir):
+    # Архив, сжатый прежней версией: один член gzip и индекс смещений распакованного файла
+    path = log_dir / f"{DAY}.jsonl"
+    with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb') as dst:
+        dst.write(src.read())
+    path.unlink()
+
+    records = list(query(str(log_dir), START + timedelta(minutes=2), START + timedelta(minutes=3), filters()))
+    assert [record['message'] for record in records] == ["шаг 2.1", "шаг 2.2"]
@@ -0,0 +1,61 @@
+import time
+
+from database.resilience import CircuitBreaker, backoff
+
+
+def test_backoff_bounds():
+    for attempt in range(10):
+        for _ in range(50):
+            assert 0 <= backoff(attempt) <= min(8, 0.5 * 2 ** attempt)
+    assert max(backoff(20, cap=2) for _ in range(50)) <= 2
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    states = []
+    breaker.listeners.append(states.append)
+
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert 0 < breaker.retry_in() <= 30
+    assert states == ['open']
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    states = []
+    breaker.listeners.append(states.append)
+    breaker.failure()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()  # Проба уже идёт
+
+    breaker.success()
+    assert breaker.state == 'closed' and breaker.allow()
+    assert states == ['open', 'half_open', 'closed']
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+    for _ in range(5):
+        breaker.failure()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    breaker.failure()  # Одной ошибки пробы достаточно
+    assert breaker.state == 'open'
+    assert not breaker.allow()
@@ -0,0 +1,62 @@
+import pytest
+
+from database.models import LOG_LOGIN_SUCCESS
+from log_api.sampling import auth_flow, capture
+
+PREFIX = "Ozon - Компания: "
+
+
+def record(description: str, action: str = 'INFO') -> dict:
+    return {'action': action, 'user': 'user', 'description': f"{PREFIX}{description}"}
+
+
+def test_success_sends_single_summary():
+    emitted = []
+    with auth_flow(emitted.append, PREFIX):
+        assert capture(record("Запуск браузера"))
+        assert capture(record("Ввод телефона"))
+        assert capture(record(LOG_LOGIN_SUCCESS))
+
+    [summary] = emitted
+    description = summary['description']
+    assert description.startswith(f"{PREFIX}Шаги: Запуск браузера ")
+    assert "; Ввод телефона " in description
+    assert description.endswith(LOG_LOGIN_SUCCESS)
+
+
+def test_error_sends_buffered_details_and_passes_later_records():
+    emitted = []
+    with auth_flow(emitted.append, PREFIX):
+        capture(record("Запуск браузера"))
+        capture(record("Ввод телефона"))
+        assert not capture(record("Код не пришёл", action='ERROR'))  # Запись об ошибке уходит сразу
+        assert not capture(record("Повторный запрос кода"))
+
+    assert [item['description'] for item in emitted] == [f"{PREFIX}Запуск браузера", f"{PREFIX}Ввод телефона"]
+
+
+def test_exception_or_unconfirmed_login_sends_all_records():
+    emitted = []
+    with pytest.raises(RuntimeError):
+        with auth_flow(emitted.append, PREFIX):
+            capture(record("Запуск браузера"))
+            raise RuntimeError("браузер закрыт")
+    assert [item['description'] for item in emitted] == [f"{PREFIX}Запуск браузера"]
+
+    emitted.clear()
+    with auth_flow(emitted.append, PREFIX):
+        capture(record("Запуск браузера"))
+    assert [item['description'] for item in emitted] == [f"{PREFIX}Запуск браузера"]
+
+
+def test_without_sampling_records_pass_through():
+    emitted = []
+    with auth_flow(emitted.append, PREFIX, sample=False) as flow:
+        assert not capture(record("Запуск браузера"))
+        assert not capture(record(LOG_LOGIN_SUCCESS))
+    assert flow.outcome == 'success'
+    assert emitted == []  # Записи отправляет вызывающий, итоговой записи нет
+
+
+def test_capture_outside_flow():
+    assert not capture(record("Запуск браузера"))
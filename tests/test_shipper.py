@@ -0,0 +1,113 @@
+import os
+import json
+import time
+
+from log_api.spool import LogSpool, REJECTED_FILE
+from log_api.shipper import LogShipper
+from log_api.transport import RejectedBatch
+
+
+class FakeTransport:
+    """Транспорт, запоминающий отправленные пакеты; errors — исключения первых вызовов send по порядку"""
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.batches = []
+        self.closed = False
+
+    def send(self, batch: list[dict]) -> None:
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        self.batches.append([record['description'] for record in batch])
+
+    def close(self) -> None:
+        self.closed = True
+
+    def sent(self) -> list[str]:
+        return [description for batch in self.batches for description in batch]
+
+
+def record(description: str) -> dict:
+    return {'action': 'INFO', 'user': 'user', 'proxy': None, 'description': description}
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_records_are_sent_in_batches(tmp_path):
+    transport = FakeTransport()
+    shipper = LogShipper(transport, spool=LogSpool(str(tmp_path)), batch_size=2, flush_interval=0.05)
+    for index in range(5):
+        assert shipper.submit(record(f"запись {index}"))
+
+    wait_for(lambda: len(transport.sent()) == 5)
+    shipper.close()
+    assert transport.sent() == [f"запись {index}" for index in range(5)]
+    assert all(len(batch) <= 2 for batch in transport.batches)
+    assert shipper.stats()['sent'] == 5 and shipper.stats()['pending'] == 0
+    assert transport.closed
+
+
+def test_unavailable_receiver_keeps_records_on_disk(tmp_path):
+    transport = FakeTransport(ConnectionError("нет сети"))
+    shipper = LogShipper(transport, spool=LogSpool(str(tmp_path)), flush_interval=0.05)
+    shipper.submit(record("запись"))
+
+    wait_for(lambda: transport.sent() == ["запись"])  # Повтор после паузы
+    shipper.close()
+    assert shipper.stats()['failed_batches'] == 1
+
+
+
+class RejectingTransport(FakeTransport):
+    """Отклоняет любой пакет, содержащий запись из bad"""
+
+    def __init__(self, *bad: str) -> None:
+        super().__init__()
+        self.bad = set(bad)
+
+    def send(self, batch: list[dict]) -> None:
+        if self.errors and (error := self.errors.pop(0)) is not None:
+            raise error
+        descriptions = [record['description'] for record in batch]
+        if self.bad.intersection(descriptions):
+            raise RejectedBatch(f"HTTP 400: {descriptions}")
+        self.batches.append(descriptions)
+
+
+def test_rejected_batch_is_split_down_to_bad_records(tmp_path):
+    transport = RejectingTransport("запись 2", "запись 5")
+    spool = LogSpool(str(tmp_path))
+    shipper = LogShipper(transport, spool=spool, batch_size=8, flush_interval=0.05)
+    for index in range(8):
+        shipper.submit(record(f"запись {index}"))
+
+    wait_for(lambda: shipper.stats()['pending'] == 0 and shipper.stats()['rejected'] == 2)
+    shipper.close()
+
+    assert transport.sent() == [f"запись {index}" for index in (0, 1, 3, 4, 6, 7)]
+    with open(os.path.join(tmp_path, REJECTED_FILE), encoding='utf-8') as f:
+        rejected = [json.loads(line) for line in f]
+    assert [item['record']['description'] for item in rejected] == ["запись 2", "запись 5"]
+    assert rejected[0]['reason'] == "HTTP 400: ['запись 2']"
+    assert shipper.stats()['sent'] == 6
+
+
+def test_receiver_failure_during_split_is_retried(tmp_path):
+    transport = RejectingTransport("запись 3")
+    transport.errors = [None, None, ConnectionError("нет сети")]  # Пакет и первая половина, затем сбой
+    spool = LogSpool(str(tmp_path))
+    shipper = LogShipper(transport, spool=spool, batch_size=4, flush_interval=0.05)
+    for index in range(4):
+        shipper.submit(record(f"запись {index}"))
+
+    wait_for(lambda: shipper.stats()['rejected'] == 1 and shipper.stats()['pending'] == 0)
+    shipper.close()
+    assert shipper.stats()['failed_batches'] == 1
+    assert transport.sent() == ["запись 0", "запись 1", "запись 2"]  # Принятая половина не отправлена повторно
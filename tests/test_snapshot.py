@@ -0,0 +1,42 @@
+import pytest
+
+from types import SimpleNamespace
+
+from database.snapshot import MarketSnapshot
+
+
+def make_market() -> SimpleNamespace:
+    return SimpleNamespace(marketplace='WB', name_company='Компания', entrepreneur='ИП', client_id='42',
+                           marketplace_info=SimpleNamespace(link='https://seller-auth.wildberries.ru',
+                                                            domain='https://seller.wildberries.ru'),
+                           connect_info=SimpleNamespace(phone='79990000000', proxy='proxy:8080', mail='mail@test',
+                                                        token='token', pass_mail=None))
+
+
+def test_from_market_copies_fields():
+    snapshot = MarketSnapshot.from_market(make_market())
+
+    assert snapshot.as_dict() == {
+        'marketplace': 'WB', 'link': 'https://seller-auth.wildberries.ru', 'domain': 'https://seller.wildberries.ru',
+        'name_company': 'Компания', 'entrepreneur': 'ИП', 'client_id': '42',
+        'phone': '79990000000', 'proxy': 'proxy:8080', 'mail': 'mail@test', 'token': 'token', 'pass_mail': None,
+    }
+    assert repr(snapshot) == "MarketSnapshot('WB', 'Компания')"
+
+
+def test_missing_fields_are_none():
+    snapshot = MarketSnapshot(marketplace='Ozon')
+    assert snapshot.phone is None
+    assert set(snapshot.as_dict()) == set(MarketSnapshot.__slots__)
+
+
+def test_snapshot_is_immutable():
+    snapshot = MarketSnapshot(marketplace='WB')
+
+    with pytest.raises(AttributeError):
+        snapshot.marketplace = 'Ozon'
+    with pytest.raises(AttributeError):
+        del snapshot.marketplace
+    with pytest.raises(AttributeError):
+        snapshot.extra = 1
+    assert snapshot.marketplace == 'WB'
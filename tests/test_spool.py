@@ -0,0 +1,83 @@
+import json
+import os
+
+from log_api.spool import LogSpool, SEGMENT_SUFFIX, REJECTED_FILE
+
+
+def records(count: int, start: int = 0) -> list[dict]:
+    return [{'action': 'INFO', 'description': f"запись {index}"} for index in range(start, start + count)]
+
+
+def segments(path) -> list[str]:
+    return sorted(name for name in os.listdir(path) if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_append_assigns_seq_and_client_id(tmp_path):
+    spool = LogSpool(str(tmp_path))
+    spool.append(records(3))
+
+    read = spool.read(10)
+    assert [record['seq'] for record in read] == [1, 2, 3]
+    assert {record['client_id'] for record in read} == {spool.client_id}
+    assert [record['seq'] for record in spool.read(2)] == [1, 2]
+    assert spool.pending() == 3
+    spool.close()
+
+
+def test_ack_cursor_survives_restart(tmp_path):
+    spool = LogSpool(str(tmp_path))
+    spool.append(records(5))
+    spool.ack(3)
+    spool.ack(2)  # Подтверждение назад ничего не меняет
+    spool.close()
+
+    reopened = LogSpool(str(tmp_path))
+    assert reopened.client_id == spool.client_id
+    assert [record['seq'] for record in reopened.read(10)] == [4, 5]
+    assert reopened.pending() == 2
+
+    # Нумерация продолжается после последней записи на диске
+    reopened.append(records(1))
+    assert reopened.read(10)[-1]['seq'] == 6
+    reopened.close()
+
+
+def test_ack_removes_sent_segments(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_records=2)
+    spool.append(records(5))
+    assert len(segments(tmp_path)) == 3
+
+    spool.ack(3)  # Второй сегмент (3, 4) отправлен не целиком
+    assert segments(tmp_path) == [f"{3:012d}{SEGMENT_SUFFIX}", f"{5:012d}{SEGMENT_SUFFIX}"]
+
+    spool.ack(5)  # Активный сегмент остаётся
+    assert segments(tmp_path) == [f"{5:012d}{SEGMENT_SUFFIX}"]
+    assert spool.read(10) == []
+    spool.close()
+
+
+def test_budget_drops_oldest_segments(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_records=1, max_bytes=500)
+    for index in range(20):
+        spool.append(records(1, index))
+
+    read = spool.read(100)
+    assert spool.dropped > 0
+    assert read[-1]['seq'] == 20
+    assert read[0]['seq'] == spool.dropped + 1
+    assert spool.pending() == len(read)
+    spool.close()
+
+    # Удалённые записи считаются подтверждёнными и после перезапуска
+    assert LogSpool(str(tmp_path)).read(100)[0]['seq'] == read[0]['seq']
+
+
+def test_reject_writes_reason(tmp_path):
+    spool = LogSpool(str(tmp_path))
+    spool.append(records(1))
+    spool.reject(spool.read(1), "HTTP 400")
+
+    with open(os.path.join(tmp_path, REJECTED_FILE), encoding='utf-8') as f:
+        rejected = [json.loads(line) for line in f]
+    assert rejected == [{'reason': "HTTP 400", 'record': spool.read(1)[0]}]
+    spool.close()
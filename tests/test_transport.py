@@ -0,0 +1,111 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+from sqlalchemy.exc import DataError, IntegrityError, ProgrammingError
+
+from log_api.transport import HttpTransport, DbTransport, RejectedBatch
+
+
+class FakeSession:
+    """Сессия requests, запоминающая запросы; statuses — коды ответов по порядку (дальше 200)"""
+
+    def __init__(self, *statuses: int) -> None:
+        self.statuses = list(statuses)
+        self.posts = []
+        self.headers = {}
+
+    def post(self, url, timeout=None, data=None, headers=None):
+        self.posts.append(data)
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0) if self.statuses else 200
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+def http_transport(*statuses: int, batch: bool = False) -> HttpTransport:
+    transport = HttpTransport('http://logs.local/api', batch=batch)
+    transport.session = FakeSession(*statuses)
+    return transport
+
+
+class FailingEngine:
+    """Движок, транзакция которого завершается ошибкой error"""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+    def begin(self):
+        raise self.error
+
+
+def db_transport(error: Exception) -> DbTransport:
+    transport = DbTransport.__new__(DbTransport)
+    transport.engine = FailingEngine(error)
+    transport.columns = {'timestamp', 'timestamp_user', 'timestamp_last', 'action', 'description'}
+    return transport
+
+
+def record(seq: int = 0, **fields) -> dict:
+    return {'timestamp': '2024-04-01T10:00:00', 'action': 'INFO', 'description': "запись", 'seq': seq, **fields}
+
+
+def test_legacy_http_posts_one_record_per_request():
+    transport = http_transport()
+    transport.send([record(1, client_id='c1', marketplace='Ozon'), record(2, repeat=3)])
+
+    posts = [json.loads(body) for body in transport.session.posts]
+    assert len(posts) == 2
+    assert set(posts[0]) == set(HttpTransport.LEGACY_FIELDS)  # Без seq, client_id, marketplace
+    assert posts[1]['description'] == "запись (повторов: 3)"
+
+
+def test_legacy_http_retry_skips_accepted_records():
+    transport = http_transport(200, 503)
+    batch = [record(seq, description=f"запись {seq}") for seq in (1, 2, 3)]
+
+    with pytest.raises(requests.HTTPError):
+        transport.send(batch)
+    transport.send(batch)  # Повтор пакета после сбоя: запись 1 уже принята сервером
+
+    descriptions = [json.loads(body)['description'] for body in transport.session.posts]
+    assert descriptions == ["запись 1", "запись 2", "запись 2", "запись 3"]
+
+
+def test_batch_http_sends_gzip_array():
+    transport = http_transport(batch=True)
+    transport.send([record(1, marketplace='Ozon'), record(2)])
+
+    [body] = transport.session.posts
+    assert [item['seq'] for item in json.loads(gzip.decompress(body))] == [1, 2]
+
+
+@pytest.mark.parametrize('status', [400, 413, 422])
+def test_http_client_errors_reject_batch(status):
+    with pytest.raises(RejectedBatch, match=f"HTTP {status}"):
+        http_transport(status).send([record(1)])
+
+
+@pytest.mark.parametrize('status', [408, 429, 500, 503])
+def test_http_timeouts_and_server_errors_are_retried(status):
+    with pytest.raises(requests.HTTPError):
+        http_transport(status, batch=True).send([record(1)])
+
+
+@pytest.mark.parametrize('error', [DataError, IntegrityError])
+def test_row_errors_reject_batch(error):
+    transport = db_transport(error("INSERT", {}, Exception("value too long")))
+    with pytest.raises(RejectedBatch, match="value too long"):
+        transport.send([record()])
+
+
+def test_schema_and_permission_errors_are_retried():
+    # Нет столбца, нет ограничения log_client_seq_unique или нет прав — записи не должны уйти в rejected.jsonl
+    transport = db_transport(ProgrammingError("INSERT", {}, Exception("permission denied for table log")))
+    with pytest.raises(ProgrammingError):
+        transport.send([record()])
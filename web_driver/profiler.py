@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import threading
+
+from collections import defaultdict
+
+# Служебные методы WebDriver: их команды относятся к вызвавшему шагу авторизации
+HELPERS = ('add_overlay', 'remove_overlay', 'is_browser_active', 'sleep')
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def summarize(values: list[float]) -> dict:
+    return {'count': len(values), 'total': round(sum(values), 3),
+            'p50': round(percentile(values, 0.5), 4), 'p95': round(percentile(values, 0.95), 4)}
+
+
+class CommandProfiler:
+    """
+    Профилировщик команд WebDriver одной сессии браузера.
+
+    Каждая команда драйвера (executeScript, getCurrentUrl, findElement, sendKeysToElement...) —
+    HTTP-запрос к geckodriver. Учитываются число, суммарное время и p50/p95 по имени команды
+    и по шагу авторизации, из которого она вызвана. Фиксированные паузы (WebDriver.sleep) считаются отдельно.
+    Остаток времени сессии — ожидание страниц маркетплейса (в том числе опрос в WebDriverWait).
+    """
+
+    def __init__(self, name: str, source: str) -> None:
+        self.name = name  # Идентификатор браузера (телефон_маркетплейс)
+        self.source = os.path.normcase(os.path.abspath(source))  # Файл с шагами авторизации (wd.py)
+        self.started = time.monotonic()
+        self.created = time.strftime('%Y-%m-%d_%H-%M-%S')
+
+        self.commands = defaultdict(list)  # Команда -> [длительность, с]
+        self.steps = defaultdict(lambda: defaultdict(list))  # Шаг -> команда -> [длительность, с]
+        self.sleeps = defaultdict(list)  # Шаг -> [длительность паузы, с]
+        self._lock = threading.Lock()
+
+    def _caller(self) -> tuple[str, str]:
+        """(шаг авторизации, служебный метод или '') по стеку вызова"""
+
+        helper = ''
+        frame = sys._getframe(2)
+        while frame is not None:
+            code = frame.f_code
+            if os.path.normcase(code.co_filename) == self.source:
+                name = getattr(code, 'co_qualname', code.co_name).replace('WebDriver.', '').replace('.<locals>', '')
+                if code.co_name not in HELPERS:
+                    return name, helper
+                helper = helper or code.co_name
+            frame = frame.f_back
+        return 'other', helper
+
+    def wrap(self, execute):
+        """Обёртка метода driver.execute, через который проходят все команды драйвера и элементов"""
+
+        def profiled(driver_command: str, params: dict = None):
+            started = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.record(driver_command, time.perf_counter() - started)
+
+        return profiled
+
+    def record(self, command: str, elapsed: float) -> None:
+        step, helper = self._caller()
+        if helper:
+            command = f"{command} ({helper})"
+        with self._lock:
+            self.commands[command].append(elapsed)
+            self.steps[step][command].append(elapsed)
+
+    def sleep(self, seconds: float) -> None:
+        started = time.perf_counter()
+        time.sleep(seconds)
+        step, _ = self._caller()
+        with self._lock:
+            self.sleeps[step].append(time.perf_counter() - started)
+
+    def report(self) -> dict:
+        with self._lock:
+            wall = time.monotonic() - self.started
+            commands_total = sum(sum(values) for values in self.commands.values())
+            sleeps_total = sum(sum(values) for values in self.sleeps.values())
+            return {
+                'browser': self.name,
+                'wall': round(wall, 3),
+                'commands_total': round(commands_total, 3),
+                'sleeps_total': round(sleeps_total, 3),
+                'other_total': round(wall - commands_total - sleeps_total, 3),
+                'commands': {command: summarize(values) for command, values in
+                             sorted(self.commands.items(), key=lambda item: -sum(item[1]))},
+                'steps': {step: {'commands': {command: summarize(values)
+                                              for command, values in self.steps.get(step, {}).items()},
+                                 'sleeps': summarize(self.sleeps[step]) if step in self.sleeps else None}
+                          for step in dict.fromkeys([*self.steps, *self.sleeps])},
+            }
+
+    def dump(self, directory: str = os.path.join("log", "profiles")) -> str:
+        """Запись отчёта сессии в log/profiles/webdriver_<время>_<браузер>.json"""
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"webdriver_{self.created}_{self.name}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return path
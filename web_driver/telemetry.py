@@ -0,0 +1,107 @@
+import os
+import json
+import logging
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_api import clock, metrics
+from log_api.identity import route_key
+
+LABELS = ('proxy', 'marketplace')
+
+PROXY_REQUESTS = metrics.counter('proxybrowser_proxy_requests_total', "Запросы браузера через прокси по исходу",
+                                 (*LABELS, 'result'))
+PROXY_BYTES = metrics.counter('proxybrowser_proxy_bytes_total', "Трафик браузера через прокси, байт",
+                              (*LABELS, 'direction'))
+PROXY_TIME = metrics.counter('proxybrowser_proxy_time_seconds_total',
+                             "Суммарное время фаз запросов: ttfb, transfer, dns, connect", (*LABELS, 'phase'))
+PROXY_TIMED = metrics.counter('proxybrowser_proxy_timed_total', "Число измерений фаз запросов", (*LABELS, 'phase'))
+
+
+class NetworkTelemetryCollector:
+    """
+    Локальный сборщик сетевой телеметрии расширения прокси (create_extension_proxy.py).
+
+    Каждый браузер получает свой адрес http://127.0.0.1:<порт>/net/<токен>, по токену данные
+    относятся к прокси (host:port, без логина и пароля), маркетплейсу и компании. Токен снимается
+    с регистрации (unregister) при закрытии браузера. Расширение раз в
+    полминуты присылает агрегаты по хостам: число запросов и ошибок, байты, суммы времени фаз (мс).
+    Агрегаты попадают в метрики Prometheus и в log/network/YYYY-MM-DD.jsonl.
+    """
+
+    def __init__(self, directory: str = os.path.join("log", "network")) -> None:
+        self.directory = directory
+        self.sessions = {}  # Токен -> {'proxy', 'marketplace', 'company'}
+        self._server = None
+        self._lock = threading.Lock()
+
+    def register(self, token: str, proxy: str, marketplace: str, company: str) -> str:
+        """Адрес для отправки телеметрии браузера с токеном сессии. Сервер запускается при первом обращении"""
+
+        with self._lock:
+            if self._server is None:
+                self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+                threading.Thread(target=self._server.serve_forever, name="NetworkTelemetry", daemon=True).start()
+            self.sessions[token] = {'proxy': route_key(proxy), 'marketplace': marketplace, 'company': company}
+            return f"http://127.0.0.1:{self._server.server_port}/net/{token}"
+
+    def unregister(self, token: str) -> None:
+        """Браузер закрыт: дальнейшие данные по токену отклоняются"""
+
+        with self._lock:
+            self.sessions.pop(token, None)
+
+    def ingest(self, token: str, payload: dict) -> bool:
+        session = self.sessions.get(token)
+        if session is None:
+            return False
+
+        labels = session['proxy'], session['marketplace']
+        ts = clock.now()
+        lines = []
+        for host, stats in (payload.get('hosts') or {}).items():
+            PROXY_REQUESTS.inc(*labels, 'ok', amount=stats.get('requests', 0))
+            PROXY_REQUESTS.inc(*labels, 'error', amount=stats.get('errors', 0))
+            PROXY_BYTES.inc(*labels, 'in', amount=stats.get('bytes_in', 0))
+            PROXY_BYTES.inc(*labels, 'out', amount=stats.get('bytes_out', 0))
+            for phase, count in (('ttfb', 'requests'), ('transfer', 'requests'), ('dns', 'dns_n'),
+                                 ('connect', 'connect_n')):
+                PROXY_TIME.inc(*labels, phase, amount=stats.get(phase, 0) / 1000)
+                PROXY_TIMED.inc(*labels, phase, amount=stats.get(count, 0))
+            lines.append(json.dumps({'ts': ts.isoformat(), **session, 'host': host, **stats}, ensure_ascii=False))
+
+        if lines:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, f"{ts.strftime('%Y-%m-%d')}.jsonl"), 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                logging.getLogger("RemoteLogger").warning(f"Сетевая телеметрия: {e}")
+        return True
+
+    def _handler(self):
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                except ValueError:
+                    self.send_error(400)
+                    return
+                if len(parts) != 2 or parts[0] != 'net' or not collector.ingest(parts[1], payload):
+                    self.send_error(404)
+                    return
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# Сборщик телеметрии всех браузеров приложения
+collector = NetworkTelemetryCollector()
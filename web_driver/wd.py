@@ -1,17 +1,16 @@
 import os
 import time
+import uuid
 import shutil
 import platform
 import datetime
 from tkinter import messagebox
 import tkinter as tk
 
-from typing import Type
 from selenium import webdriver
 from contextlib import suppress
 
 from sqlalchemy import delete
-from sqlalchemy.exc import IntegrityError
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
@@ -22,11 +21,15 @@ from selenium.common.exceptions import InvalidSessionIdException, WebDriverExcep
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.firefox.service import Service
 
-from database.models import Market
+from database.snapshot import MarketSnapshot
 from database.db import DbConnection
+from database.models import LOG_LOGIN_SUCCESS, LOG_LOGIN_UNCONFIRMED, LOG_AUTOMATION_ERROR
 from email_api import YandexMailClient
-from log_api import logger, get_moscow_time
+from settings import WD_PROFILE, PROXY_TELEMETRY
+from log_api import logger, get_moscow_time, traced, span
+from .profiler import CommandProfiler
 from .create_extension_proxy import create_firefox_proxy_addon
+from .telemetry import collector
 
 TIME_AWAIT = 5
 
@@ -42,23 +45,27 @@ class AuthException(Exception):
 class WebDriver:
     """Управляет браузером Chrome с прокси и автоматизацией входа в маркетплейсы (Ozon, WB, Yandex)."""
 
-    def __init__(self, market: Type[Market], user: str, auto: bool, clear: bool, db_conn: DbConnection) -> None:
+    @traced()
+    def __init__(self, market: MarketSnapshot, user: str, auto: bool, clear: bool, db_conn: DbConnection) -> None:
 
         self.user = user
         self.auto = auto
         self.clear = clear
         self.db_conn = db_conn
         self.client_id = market.client_id
-        self.mail = market.connect_info.mail
-        self.proxy = market.connect_info.proxy
-        self.phone = market.connect_info.phone
-        self.token = market.connect_info.token
+        self.mail = market.mail
+        self.proxy = market.proxy
+        self.phone = market.phone
+        self.token = market.token
         self.name_company = market.name_company
-        self.marketplace = market.marketplace_info
-        self.pass_mail = market.connect_info.pass_mail
+        self.marketplace = market  # Снимок содержит marketplace, link и domain маркетплейса
+        self.pass_mail = market.pass_mail
         self.browser_id = f"{self.phone}_{self.marketplace.marketplace.lower()}"
         self.log_startswith = f"{self.marketplace.marketplace} - {market.name_company}: "
 
+        # Профилирование команд драйвера и пауз (WD_PROFILE), отчёт в log/profiles/
+        self.profiler = CommandProfiler(self.browser_id, __file__) if WD_PROFILE else None
+
         self.profile_path = os.path.join(os.getcwd(), f"profile/{self.browser_id}")
         if clear and os.path.exists(self.profile_path):
             try:
@@ -72,7 +79,13 @@ class WebDriver:
         self.proxy_auth_path = os.path.join(os.getcwd(), f"proxy_auth")
         os.makedirs(self.proxy_auth_path, exist_ok=True)
 
-        ext_path = create_firefox_proxy_addon(self.proxy_auth_path, self.proxy)
+        # Сетевая телеметрия браузера (время и трафик по хостам) относится к прокси и рынку этого запуска.
+        # Токен сессии — и в адресе сборщика, и в имени расширения; оба освобождаются в release()
+        self.session_token = uuid.uuid4().hex
+        telemetry_url = collector.register(self.session_token, self.proxy, self.marketplace.marketplace,
+                                           self.name_company) if PROXY_TELEMETRY else None
+        self.ext_path = create_firefox_proxy_addon(self.proxy_auth_path, self.proxy, telemetry_url=telemetry_url,
+                                                   session=self.session_token)
 
         bit = '64' if platform.machine().endswith('64') else ''
 
@@ -101,11 +114,20 @@ class WebDriver:
 
         self.service = Service(executable_path=str(os.path.join(os.getcwd(), f"browser/geckodriver{bit}.exe")))
 
-        self.driver = webdriver.Firefox(service=self.service, options=self.options)
-        self.driver.install_addon(ext_path, temporary=True)
+        with span('Запуск Firefox'):
+            try:
+                self.driver = webdriver.Firefox(service=self.service, options=self.options)
+                self.driver.install_addon(self.ext_path, temporary=True)
+            except Exception:
+                self.release()
+                raise
+
+        if self.profiler is not None:
+            self.driver.execute = self.profiler.wrap(self.driver.execute)
 
         self.driver.maximize_window()
 
+    @traced()
     def check_auth(self) -> None:
         """
         Проверяет, загружена ли страница, и запускает соответствующую стратегию авторизации
@@ -129,7 +151,7 @@ class WebDriver:
                 WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     lambda driver: driver.execute_script("return document.readyState") == "complete"
                 )
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
             else:
                 Exception("Превышено время загрузки страницы")
 
@@ -152,13 +174,13 @@ class WebDriver:
             # Если уже перешли на личный кабинет — логируем успешный вход
             if self.marketplace.domain in last_url:
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Вход в ЛК выполнен")
+                            description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
 
             # Для Yandex — редирект вручную в ЛК
             if 'https://id.yandex.ru' in last_url:
                 self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Вход в ЛК выполнен")
+                            description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
 
 
 
@@ -169,7 +191,8 @@ class WebDriver:
         except Exception as e:
             self.quit(str(e).splitlines()[0])
 
-    def wb_auth(self, marketplace: Market) -> None:
+    @traced()
+    def wb_auth(self, marketplace: MarketSnapshot) -> None:
         """Авторизация в личный кабинет Wildberries по номеру телефона и СМС-коду"""
 
         logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Ввод номера {self.phone}")
@@ -177,12 +200,12 @@ class WebDriver:
         # Пытаемся найти поле и кнопку ввода телефона (до 3 раз)
         for _ in range(3):
             try:
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 input_phone = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable((By.CSS_SELECTOR, "[data-testid='phone-input']")))
                 input_phone.send_keys(self.phone)
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 button_phone = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable((By.XPATH,
                                                                  '//*[@data-testid="submit-phone-button"]')))
@@ -200,26 +223,16 @@ class WebDriver:
         # Отмечаем время начала запроса кода
         time_request = get_moscow_time()
 
-        # Проверка на незавершённую авторизацию с этим номером
-        self.db_conn.check_phone_message(user=self.user, phone=self.phone, time_request=time_request)
+        # Занимаем номер под запрос кода (с ожиданием, если идёт другая авторизация с этим номером)
+        request_id = self.db_conn.claim_phone_message(user=self.user,
+                                                      phone=self.phone,
+                                                      marketplace=marketplace.marketplace,
+                                                      time_request=time_request)
 
         self.remove_overlay()
         button_phone.click()  # Нажимаем кнопку "Получить код"
         self.add_overlay()
 
-        # Добавляем новую запись о попытке запроса кода (до 3 раз при конфликте)
-        for _ in range(3):
-            try:
-                self.db_conn.add_phone_message(user=self.user,
-                                               phone=self.phone,
-                                               marketplace=marketplace.marketplace,
-                                               time_request=time_request)
-                break
-            except IntegrityError:
-                time.sleep(TIME_AWAIT)
-        else:
-            raise Exception('Ошибка параллельных запросов')
-
         # Если WB вернул сообщение об ошибке — выкидываем исключение с его текстом
         with suppress(TimeoutException):
             timer_element = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
@@ -231,16 +244,14 @@ class WebDriver:
                     description=f"{self.log_startswith}Ожидание кода на номер {self.phone}")
 
         # Получаем код подтверждения из базы
-        mes = self.db_conn.get_phone_message(user=self.user,
-                                             phone=self.phone,
-                                             marketplace=marketplace.marketplace)
+        mes = self.db_conn.get_phone_message(request_id)
 
         logger.info(user=self.user, proxy=self.proxy,
                     description=f"{self.log_startswith}Код на номер {self.phone} получен: {mes}")
         logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Ввод кода {mes}")
 
         try:
-            time.sleep(TIME_AWAIT)
+            self.sleep(TIME_AWAIT)
             # Ждём появления полей ввода кода
             inputs_code = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                 expected_conditions.presence_of_all_elements_located((By.CSS_SELECTOR,
@@ -261,27 +272,29 @@ class WebDriver:
 
         # Проверяем вход по домену личного кабинета (4 попытки)
         for _ in range(4):
-            time.sleep(TIME_AWAIT)
+            self.sleep(TIME_AWAIT)
             if marketplace.domain in self.driver.current_url:
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Вход в ЛК выполнен")
+                            description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                 return
         else:
             logger.info(user=self.user, proxy=self.proxy,
-                        description=f"{self.log_startswith}Автоматизация завершена, вход не подтверждён")
+                        description=f"{self.log_startswith}{LOG_LOGIN_UNCONFIRMED}")
 
-    def ozon_auth(self, marketplace: Market) -> None:
+    @traced()
+    def ozon_auth(self, marketplace: MarketSnapshot) -> None:
         """Авторизация в Ozon: сначала по email, затем при необходимости — по СМС на телефон"""
 
-        def create_phone_message(btn) -> datetime.datetime:
+        @traced()
+        def create_phone_message(btn) -> tuple[datetime.datetime, int]:
             """
-                Проверяет нет ли конфликта авторизации и создаёт в таблице запись в таблице phone_message
+                Занимает номер под запрос кода (заявка в таблице phone_message) и нажимает кнопку отправки
 
                 Параметры:
                     btn: кнопка отправки сообщения
 
                 Результат:
-                    datetime.datetime: Время запроса сообщения
+                    tuple[datetime.datetime, int]: Время запроса сообщения и id заявки
             """
             self.add_overlay()
             logger.info(user=self.user, proxy=self.proxy,
@@ -290,8 +303,10 @@ class WebDriver:
             # Отмечаем время начала запроса кода
             time_request = get_moscow_time()
 
-            # Проверка на незавершённую авторизацию с этим номером
-            self.db_conn.check_phone_message(user=self.user, phone=self.phone, time_request=time_request)
+            # Занимаем номер под запрос кода (с ожиданием, если идёт другая авторизация с этим номером)
+            request_id = self.db_conn.claim_phone_message(user=self.user, phone=self.phone,
+                                                          marketplace=marketplace.marketplace,
+                                                          time_request=time_request)
 
             self.remove_overlay()
             btn.click()  # Нажимаем кнопку "Получить код"
@@ -300,20 +315,9 @@ class WebDriver:
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Ожидание кода")
 
-            # Добавляем новую запись о попытке запроса кода (до 3 раз при конфликте)
-            for _ in range(3):
-                try:
-                    self.db_conn.add_phone_message(user=self.user, phone=self.phone,
-                                                   marketplace=marketplace.marketplace,
-                                                   time_request=time_request)
-                    break
-                except IntegrityError:
-                    time.sleep(5)
-            else:
-                raise Exception('Ошибка параллельных запросов')
-
-            return time_request
+            return time_request, request_id
 
+        @traced()
         def check_login(r: int = 1):
             """
                 Проверка на удачный вход в ЛК
@@ -323,22 +327,24 @@ class WebDriver:
             """
             self.add_overlay()
             for _ in range(r):
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 self.driver.get(marketplace.domain)
                 if marketplace.domain in self.driver.current_url:
                     logger.info(user=self.user, proxy=self.proxy,
-                                description=f"{self.log_startswith}Вход в ЛК выполнен")
+                                description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                     return
             else:
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Автоматизация завершена, вход не подтверждён")
+                            description=f"{self.log_startswith}{LOG_LOGIN_UNCONFIRMED}")
 
-        def email_code(tr: datetime.datetime):
+        @traced()
+        def email_code(tr: datetime.datetime, request_id: int):
             """
                 Проверка кода на email и ввод кода
 
                 Параметры:
                     tr(datetime.datetime): время запроса
+                    request_id(int): id заявки на код
             """
             # Получаем письмо с кодом (до 20 попыток с паузами)
             self.add_overlay()
@@ -350,7 +356,7 @@ class WebDriver:
                     mail_client.fetch_emails(user=self.user, phone=self.phone, time_request=tr)
                     break
                 except Exception as e:
-                    time.sleep(TIME_AWAIT)
+                    self.sleep(TIME_AWAIT)
                     exception = e
                     continue
                 finally:
@@ -359,7 +365,7 @@ class WebDriver:
                 raise Exception(exception)
 
             # Получаем код подтверждения из базы
-            mes = self.db_conn.get_phone_message(user=self.user, phone=self.phone, marketplace=marketplace.marketplace)
+            mes = self.db_conn.get_phone_message(request_id)
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Код на Email {self.mail} получен: {mes}")
             logger.info(user=self.user, proxy=self.proxy,
@@ -367,7 +373,7 @@ class WebDriver:
 
             # Вводим код
             try:
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 input_code = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable((By.CSS_SELECTOR, "input[type='text']")))
                 self.remove_overlay()
@@ -377,23 +383,25 @@ class WebDriver:
             except TimeoutException:
                 raise Exception('Отсутствует поле ввода email кода')
 
-        def phone_code(tr: datetime.datetime):
+        @traced()
+        def phone_code(tr: datetime.datetime, request_id: int):
             """
                 Проверка кода на номер и ввод кода
 
                 Параметры:
                     tr(datetime.datetime): время запроса
+                    request_id(int): id заявки на код
             """
             self.add_overlay()
             # Получаем код подтверждения из базы
-            mes = self.db_conn.get_phone_message(user=self.user, phone=self.phone, marketplace=marketplace.marketplace)
+            mes = self.db_conn.get_phone_message(request_id)
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Код на номер {self.phone} получен: {mes}")
             logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Ввод кода {mes}")
 
             # Вводим код
             try:
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 input_code = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable((By.CSS_SELECTOR, "input[type='text']")))
 
@@ -403,6 +411,7 @@ class WebDriver:
             except TimeoutException:
                 raise Exception('Отсутствует поле ввода Phone кода')
 
+        @traced()
         def selection_func():
             """
                 Выбирается функция в зависимости от запроса
@@ -415,7 +424,7 @@ class WebDriver:
             for _ in range(3):
                 try:
                     select_func = None
-                    time.sleep(TIME_AWAIT)
+                    self.sleep(TIME_AWAIT)
                     spans = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                         expected_conditions.presence_of_all_elements_located((By.TAG_NAME, 'span')))
                     for span in spans:
@@ -437,7 +446,7 @@ class WebDriver:
             if h2:
                 self.driver.get(marketplace.domain)
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Вход в ЛК выполнен")
+                            description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                 return
 
         logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Ввод почты {self.mail}")
@@ -445,7 +454,7 @@ class WebDriver:
         # Пытаемся найти форму ввода email (до 3 попыток)
         for _ in range(3):
             try:
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 button_mail = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.presence_of_all_elements_located((By.CSS_SELECTOR, '.content button')))[-2]
 
@@ -453,7 +462,7 @@ class WebDriver:
                 button_mail.click()
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 input_mail = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable((By.ID, "email")))
                 input_mail.send_keys(Keys.CONTROL, 'a')
@@ -463,7 +472,7 @@ class WebDriver:
                 input_mail.send_keys(self.mail)
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 button_push = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.presence_of_all_elements_located((By.CSS_SELECTOR, '.content button')))[-3]
                 break
@@ -472,11 +481,11 @@ class WebDriver:
         else:
             raise Exception('Страница не получена')
 
-        time_request = create_phone_message(button_push)
+        time_request, request_id = create_phone_message(button_push)
 
         func = selection_func()
 
-        func(tr=time_request)
+        func(tr=time_request, request_id=request_id)
 
         logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Вход в ЛК")
 
@@ -490,7 +499,7 @@ class WebDriver:
                 self.driver.get(marketplace.domain)
 
         # Проверка: загрузился ли личный кабинет
-        time.sleep(TIME_AWAIT)
+        self.sleep(TIME_AWAIT)
         with suppress(TimeoutException):
             WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                 expected_conditions.presence_of_element_located((By.CLASS_NAME, 'csma-ozon-id-page')))
@@ -504,28 +513,31 @@ class WebDriver:
         except (TimeoutException, IndexError) as e:
             raise Exception(f'Нет кнопки подтверждения телефона. {e}')
 
-        time_request = create_phone_message(button_push2)
+        time_request, request_id = create_phone_message(button_push2)
 
         func = selection_func()
 
-        func(tr=time_request)
+        func(tr=time_request, request_id=request_id)
 
         logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Вход в ЛК")
 
         # Финальная проверка перехода в ЛК
         check_login(4)
 
-    def ya_auth(self, marketplace: Market) -> None:
+    @traced()
+    def ya_auth(self, marketplace: MarketSnapshot) -> None:
         """Авторизация в Яндекс.Маркет. Используется логин, пароль и код подтверждения по SMS"""
 
+        @traced()
         def check_login() -> bool:
             if 'https://id.yandex.ru' in self.driver.current_url:
                 self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
                 logger.info(user=self.user,proxy=self.proxy,
-                    description=f"{self.log_startswith}Вход в ЛК выполнен")
+                    description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                 return True
             return False
 
+        @traced()
         def confirm_phone_challenge() -> bool:
             """
             Нажимает кнопку 'Подтвердить' на экране подтверждения входа,
@@ -548,43 +560,33 @@ class WebDriver:
                 # Отмечаем время начала запроса кода
                 time_request = get_moscow_time()
 
-                # Проверка на незавершённую авторизацию с этим номером
-                self.db_conn.check_phone_message(user=self.user,phone=self.phone,time_request=time_request)
+                # Занимаем номер под запрос кода (с ожиданием, если идёт другая авторизация с этим номером)
+                request_id = self.db_conn.claim_phone_message(user=self.user, phone=self.phone,
+                                                              marketplace=marketplace.marketplace,
+                                                              time_request=time_request)
 
                 self.remove_overlay()
                 button_enter.click()
                 self.add_overlay()
 
-                enter(time_request)
+                enter(request_id)
                 return True
 
             return False
 
-        def enter(tr):
+        @traced()
+        def enter(request_id):
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Ожидание кода на номер {self.phone}")
 
-            # Добавляем заявку на получение кода (до 3 раз при конфликте)
-            for _ in range(3):
-                try:
-                    self.db_conn.add_phone_message(user=self.user,
-                                                   phone=self.phone,
-                                                   marketplace=marketplace.marketplace,
-                                                   time_request=tr)
-                    break
-                except IntegrityError:
-                    time.sleep(TIME_AWAIT)
-            else:
-                raise Exception('Ошибка параллельных запросов')
-
             # Получаем код подтверждения из базы
-            mes = self.db_conn.get_phone_message(user=self.user, phone=self.phone, marketplace=marketplace.marketplace)
+            mes = self.db_conn.get_phone_message(request_id)
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Код на номер {self.phone} получен: {mes}")
             logger.info(user=self.user, proxy=self.proxy,
                         description=f"{self.log_startswith}Ввод кода {mes}")
             try:
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 try:
                     # Старый вариант: одно поле ввода
@@ -618,21 +620,22 @@ class WebDriver:
             # Проверка перехода в ЛК
             for _ in range(4):
                 self.add_overlay()
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 if check_login():
                     return
             else:
                 logger.info(user=self.user, proxy=self.proxy,
-                            description=f"{self.log_startswith}Автоматизация завершена, вход не подтверждён")
+                            description=f"{self.log_startswith}{LOG_LOGIN_UNCONFIRMED}")
 
 
 
+        @traced()
         def re_login() -> bool:
             """Проверка сценария с уже выбранным аккаунтом Яндекса"""
 
             with suppress(TimeoutException, NoSuchElementException):
                 self.add_overlay()
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 current_account = WebDriverWait(self.driver, TIME_AWAIT * 2).until(
                     expected_conditions.element_to_be_clickable(
@@ -664,7 +667,7 @@ class WebDriver:
                 button_enter_pass.click()
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 if check_login():
                     return True
@@ -675,6 +678,7 @@ class WebDriver:
 
             return False
 
+        @traced()
         def login_by_mail() -> bool:
             """
             Сценарий входа через 'Ещё' -> вход по логину -> почта/пароль.
@@ -686,13 +690,13 @@ class WebDriver:
 
             # Нажимаем кнопку «Ещё», чтобы выбрать вход по логину
             with suppress(TimeoutException):
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 # Если уже авторизован — переходим в ЛК
                 if 'https://id.yandex.ru' in self.driver.current_url:
                     self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
                     logger.info(user=self.user,proxy=self.proxy,
-                                description=f"{self.log_startswith}Вход в ЛК выполнен")
+                                description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                     return True
 
                 button_more = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
@@ -703,7 +707,7 @@ class WebDriver:
                 button_more.click()
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 button_by_login = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.visibility_of_element_located(
@@ -717,7 +721,7 @@ class WebDriver:
 
             # Ввод логина (email)
             with suppress(TimeoutException):
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 input_mail = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable(
@@ -727,7 +731,7 @@ class WebDriver:
                 input_mail.send_keys(self.mail)
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 button_enter_mail = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable(
@@ -736,8 +740,10 @@ class WebDriver:
                 # Отмечаем время начала запроса кода
                 time_request = get_moscow_time()
 
-                # Проверка на незавершённую авторизацию с этим номером
-                self.db_conn.check_phone_message(user=self.user,phone=self.phone,time_request=time_request)
+                # Занимаем номер под запрос кода (с ожиданием, если идёт другая авторизация с этим номером)
+                request_id = self.db_conn.claim_phone_message(user=self.user, phone=self.phone,
+                                                              marketplace=marketplace.marketplace,
+                                                              time_request=time_request)
 
                 self.remove_overlay()
                 button_enter_mail.click()
@@ -745,14 +751,14 @@ class WebDriver:
 
                 # Если сразу появилось поле SMS-кода
                 with suppress(TimeoutException):
-                    time.sleep(TIME_AWAIT)
+                    self.sleep(TIME_AWAIT)
 
                     WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                         expected_conditions.element_to_be_clickable(
                             (By.XPATH, "//input[@data-testid='field:input-phoneCode']")))
 
                     self.remove_overlay()
-                    enter(time_request)
+                    enter(request_id)
                     self.add_overlay()
                     return True
 
@@ -762,7 +768,7 @@ class WebDriver:
 
             # Ввод пароля от почты
             with suppress(TimeoutException):
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 input_pass = WebDriverWait(self.driver, TIME_AWAIT * 4).until(
                     expected_conditions.element_to_be_clickable(
@@ -780,7 +786,7 @@ class WebDriver:
                 button_enter_pass.click()
                 self.add_overlay()
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 # Если уже авторизован — переходим в ЛК
                 if check_login():
@@ -800,9 +806,11 @@ class WebDriver:
         else:
             raise Exception('Страница не получена')
 
-    def mvideo_auth(self, marketplace: Market) -> bool | None:
+    @traced()
+    def mvideo_auth(self, marketplace: MarketSnapshot) -> bool | None:
         """Авторизация в МВидео по номеру телефона"""
 
+        @traced()
         def check_login() -> bool:
             current_url = self.driver.current_url.rstrip('/')
 
@@ -810,33 +818,20 @@ class WebDriver:
                 self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
                 logger.info(user=self.user,
                             proxy=self.proxy,
-                            description=f"{self.log_startswith}Вход в ЛК выполнен")
+                            description=f"{self.log_startswith}{LOG_LOGIN_SUCCESS}")
                 return True
 
             return False
 
-        def enter(tr):
+        @traced()
+        def enter(request_id):
             self.add_overlay()
 
             logger.info(user=self.user,proxy=self.proxy,
                         description=f"{self.log_startswith}Ожидание кода на номер {self.phone}")
 
-            # Добавляем заявку на получение кода
-            for _ in range(3):
-                try:
-                    self.db_conn.add_phone_message( user=self.user,
-                                                    phone=self.phone,
-                                                    marketplace=marketplace.marketplace,
-                                                    time_request=tr)
-                    break
-                except IntegrityError:
-                    time.sleep(TIME_AWAIT)
-            else:
-                raise Exception('Ошибка параллельных запросов')
-
             # Получаем код подтверждения из базы
-            mes = self.db_conn.get_phone_message(user=self.user,phone=self.phone,
-                                                 marketplace=marketplace.marketplace)
+            mes = self.db_conn.get_phone_message(request_id)
 
             # Оставляем только цифры
             mes = ''.join(ch for ch in mes if ch.isdigit())
@@ -847,13 +842,13 @@ class WebDriver:
                         description=f"{self.log_startswith}Ввод кода {mes}")
 
             with suppress(TimeoutException):
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
 
                 input_code = WebDriverWait(self.driver, TIME_AWAIT * 2).until(
                     expected_conditions.element_to_be_clickable(
                         (By.CSS_SELECTOR, "mpa-ui-input[formcontrolname='code'] input")))
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 self.remove_overlay()
                 input_code.send_keys(mes)
                 self.add_overlay()
@@ -867,7 +862,7 @@ class WebDriver:
 
                 self.remove_overlay()
                 button_confirm.click()
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 check_login()
 
 
@@ -878,7 +873,7 @@ class WebDriver:
         for _ in range(3):
             try:
                 self.add_overlay()
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 logger.info(user=self.user,proxy=self.proxy,
                             description=f"{self.log_startswith}Ввод номера телефона {self.phone}")
 
@@ -903,10 +898,12 @@ class WebDriver:
                     expected_conditions.element_to_be_clickable(
                         (By.XPATH, "//button[contains(., 'Войти')]")))
 
-                # Проверка на незавершённую авторизацию с этим номером
-                self.db_conn.check_phone_message(user=self.user,phone=self.phone,time_request=time_request)
+                # Занимаем номер под запрос кода (с ожиданием, если идёт другая авторизация с этим номером)
+                request_id = self.db_conn.claim_phone_message(user=self.user, phone=self.phone,
+                                                              marketplace=marketplace.marketplace,
+                                                              time_request=time_request)
 
-                time.sleep(TIME_AWAIT)
+                self.sleep(TIME_AWAIT)
                 self.remove_overlay()
                 button_login.click()
                 self.add_overlay()
@@ -915,7 +912,7 @@ class WebDriver:
                             description=f"{self.log_startswith}Номер телефона введён, кнопка Войти нажата")
 
                 # Переходим к ожиданию и вводу кода
-                enter(time_request)
+                enter(request_id)
                 return
 
             except TimeoutException:
@@ -976,6 +973,14 @@ class WebDriver:
             })();
         """)
 
+    def sleep(self, seconds: float) -> None:
+        """Фиксированная пауза между действиями (при профилировании учитывается отдельно от команд драйвера)"""
+
+        if self.profiler is not None:
+            self.profiler.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
     def is_browser_active(self) -> bool:
         """Проверяет, активен ли браузер. Возвращает True, если браузер всё ещё работает, иначе False"""
 
@@ -988,26 +993,32 @@ class WebDriver:
         except (NoSuchWindowException, InvalidSessionIdException, WebDriverException):
             return False
 
+    @traced()
     def load_url(self, url: str) -> None:
         """
         Загружает указанный URL в браузер и, если включена автоавторизация,
         запускает процесс входа. Для Яндекса вручную переходит по клиентскому пути.
         """
 
-        logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Браузер открыт")
-        if self.auto:
-            logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Авторизация")
-            if self.marketplace.marketplace == 'Ozon':
-                self.driver.get('https://sso.ozon.ru/auth')
-            else:
-                self.driver.get(url)
-            self.add_overlay()
-            self.check_auth()
-        else:
-            if self.marketplace.marketplace == 'Yandex':
-                self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
+        try:
+            logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Браузер открыт")
+            if self.auto:
+                logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Авторизация")
+                if self.marketplace.marketplace == 'Ozon':
+                    self.driver.get('https://sso.ozon.ru/auth')
+                else:
+                    self.driver.get(url)
+                self.add_overlay()
+                self.check_auth()
             else:
-                self.driver.get(self.marketplace.domain)
+                if self.marketplace.marketplace == 'Yandex':
+                    self.driver.get(f'{self.marketplace.domain}/{self.client_id}/marketplace')
+                else:
+                    self.driver.get(self.marketplace.domain)
+        finally:
+            if self.profiler is not None:
+                with suppress(OSError):
+                    self.profiler.dump()
 
     def quit(self, text: str = None) -> None:
         """
@@ -1019,9 +1030,22 @@ class WebDriver:
 
         if text:
             logger.error(user=self.user, proxy=self.proxy,
-                         description=f"{self.log_startswith}Ошибка автоматизации: {text}")
-            self.driver.quit()
+                         description=f"{self.log_startswith}{LOG_AUTOMATION_ERROR}: {text}")
+            try:
+                self.driver.quit()
+            finally:
+                self.release()
             raise AuthException(f"{text}\n\nПопробуйте позднее")
         else:
             logger.info(user=self.user, proxy=self.proxy, description=f"{self.log_startswith}Браузер закрыт")
-            self.driver.quit()
+            try:
+                self.driver.quit()
+            finally:
+                self.release()
+
+    def release(self) -> None:
+        """Освобождает ресурсы сессии после закрытия браузера: токен телеметрии и файл расширения"""
+
+        collector.unregister(self.session_token)
+        with suppress(OSError):
+            os.remove(self.ext_path)